@@ -1,5 +1,206 @@
+from django import forms
 from django.contrib import admin
-from .models import Author, Genre, Book, BookInstance, Language
+from django.contrib.admin.utils import unquote
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db.models import Prefetch
+from django.forms.models import BaseInlineFormSet
+from django.http import Http404, JsonResponse
+from django.urls import path, reverse
+
+from .forms import BookInstanceAdminForm
+from .models import Author, Genre, Book, BookInstance, Language, Hold, Job
+from .pagination import CursorPaginator, EstimatedCountPaginator
+
+
+class LoadedModelChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField taking its value from ``objects`` ({str(key): object}),
+    loaded once for a whole formset, rather than with a query per form.
+    Values not found there are looked up (and rejected) as usual.
+    """
+    objects = None
+
+    def to_python(self, value):
+        if self.objects is not None and value not in self.empty_values and str(value) in self.objects:
+            return self.objects[str(value)]
+        return super().to_python(value)
+
+
+class LoadedForeignKeysFormMixin:
+    """
+    ModelForm mixin skipping the model validation of the foreign keys whose
+    object a LoadedModelChoiceField found: it would check again, with a query
+    per form, that the object exists.
+    """
+
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        for name, field in self.fields.items():
+            value = self.cleaned_data.get(name)
+            if isinstance(field, LoadedModelChoiceField) and field.objects and value is not None \
+                    and field.objects.get(str(getattr(value, field.to_field_name or 'pk'))) is value:
+                exclude.append(name)
+        return exclude
+
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """
+    Inline formset editing only the first ``per_page`` related objects in
+    ``ordering``; ``total_count`` and ``next_url`` tell the template how many
+    there are and where to read the others from.
+    """
+    per_page = 20
+    ordering = ('pk',)
+    related_url = None
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            queryset = super().get_queryset().order_by(*self.ordering)
+            self.total_count = queryset.count()
+            self.next_url = None
+            if self.is_bound:
+                # The objects of the posted forms, even if others were added before them meanwhile.
+                pk_field = self.model._meta.pk
+                pks = []
+                for index in range(self.initial_form_count()):
+                    try:
+                        pks.append(pk_field.to_python(self.data.get('%s-%s' % (self.add_prefix(index), pk_field.name))))
+                    except ValidationError:
+                        pass
+                self._queryset = queryset.filter(pk__in=[pk for pk in pks if pk is not None])
+            else:
+                self._queryset = queryset[:self.per_page]
+            shown = list(self._queryset)
+            for obj in shown:
+                # Their parent is known: no query per row for its name (e.g. in __str__).
+                setattr(obj, self.fk.name, self.instance)
+            if not self.is_bound and self.total_count > len(shown) and self.related_url:
+                cursor = CursorPaginator(queryset, self.per_page, self.ordering).encode_cursor(shown[-1])
+                self.next_url = '{0}?cursor={1}'.format(self.related_url, cursor)
+        return self._queryset
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        if not self.is_bound:
+            return
+        # The posted objects and foreign keys are read once for all the forms.
+        pk_name = self._pk_field.name
+        pk_field = form.fields.get(pk_name)
+        if isinstance(pk_field, forms.ModelChoiceField):
+            form.fields[pk_name] = LoadedModelChoiceField(pk_field.queryset, initial=pk_field.initial, required=False,
+                                                          widget=pk_field.widget)
+            form.fields[pk_name].objects = {str(obj.pk): obj for obj in self.get_queryset()}
+        for name, field in form.fields.items():
+            if isinstance(field, LoadedModelChoiceField) and name != pk_name:
+                field.objects = self.posted_objects(name, field)
+
+    def posted_objects(self, name, field):
+        """
+        Returns {str(key): object} for the values posted for the field in all the forms.
+        """
+        if not hasattr(self, '_posted_objects'):
+            self._posted_objects = {}
+        if name not in self._posted_objects:
+            values = {self.data.get('%s-%s' % (self.add_prefix(index), name))
+                      for index in range(self.total_form_count())}
+            values = {value for value in values if value not in field.empty_values}
+            key = field.to_field_name or 'pk'
+            try:
+                objects = list(field.queryset.filter(**{key + '__in': values})) if values else []
+            except (ValueError, ValidationError):
+                # Invalid values: each form reports its own.
+                objects = []
+            self._posted_objects[name] = {str(getattr(obj, key)): obj for obj in objects}
+        return self._posted_objects[name]
+
+
+class PaginatedInline(admin.TabularInline):
+    """
+    Tabular inline editing the first ``per_page`` related objects only. The
+    page shows how many there are, and lists the others on demand, page by
+    page, from the JSON endpoint of the parent admin (see PaginatedInlinesMixin),
+    with the ``list_fields`` values and a link to each object.
+    """
+    formset = PaginatedInlineFormSet
+    template = 'admin/catalog/paginated_tabular.html'
+    per_page = 20
+    ordering = ('pk',)
+    list_fields = ()
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        # Posted values are read once for the whole formset (see PaginatedInlineFormSet.add_fields).
+        kwargs.setdefault('form_class', LoadedModelChoiceField)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_formset(self, request, obj=None, **kwargs):
+        kwargs.setdefault('form', type(self.form.__name__, (LoadedForeignKeysFormMixin, self.form), {}))
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.per_page = self.per_page
+        formset.ordering = self.ordering
+        if obj is not None and obj.pk is not None:
+            opts = self.parent_model._meta
+            formset.related_url = reverse('admin:%s_%s_related' % (opts.app_label, opts.model_name),
+                                          args=[obj.pk, self.model._meta.model_name], current_app=self.admin_site.name)
+        return formset
+
+    def related_page(self, request, obj, cursor):
+        """
+        Returns the JSON body of the page of related objects after ``cursor``.
+        """
+        opts = self.model._meta
+        fk_name = self.get_formset(request, obj).fk.name
+        relations = [name for name in self.list_fields if opts.get_field(name).is_relation]
+        queryset = self.get_queryset(request).filter(**{fk_name: obj}).select_related(*relations)
+        paginator = CursorPaginator(queryset, self.per_page * 5, self.ordering)
+        try:
+            objects, has_next, _ = paginator.page(cursor)
+        except ValueError:
+            raise Http404('Invalid cursor.')
+
+        rows = []
+        for related in objects:
+            row = {'id': str(related.pk), 'url': reverse('admin:%s_%s_change' % (opts.app_label, opts.model_name),
+                                                         args=[related.pk], current_app=self.admin_site.name)}
+            for name in self.list_fields:
+                field = opts.get_field(name)
+                value = getattr(related, 'get_%s_display' % name)() if field.choices else getattr(related, name)
+                row[name] = '' if value is None else str(value)
+            rows.append(row)
+        next_url = None
+        if has_next:
+            next_url = '{0}?cursor={1}'.format(request.path, paginator.encode_cursor(objects[-1]))
+        return {'fields': [str(opts.get_field(name).verbose_name) for name in self.list_fields],
+                'results': rows, 'next': next_url}
+
+
+class PaginatedInlinesMixin:
+    """
+    ModelAdmin mixin serving the pages of its PaginatedInline objects at
+    ``<object id>/related/<model name>/``.
+    """
+
+    def get_urls(self):
+        opts = self.model._meta
+        return [
+            path('<path:object_id>/related/<str:model_name>/', self.admin_site.admin_view(self.related_view),
+                 name='%s_%s_related' % (opts.app_label, opts.model_name)),
+        ] + super().get_urls()
+
+    def related_view(self, request, object_id, model_name):
+        obj = self.get_object(request, unquote(object_id))
+        if obj is None:
+            raise Http404
+        if not self.has_view_or_change_permission(request, obj):
+            raise PermissionDenied
+        # All the declared inlines: get_inline_instances() leaves out those the user may not see.
+        for inline_class in self.inlines:
+            inline = inline_class(self.model, self.admin_site)
+            if isinstance(inline, PaginatedInline) and inline.model._meta.model_name == model_name:
+                # Seeing the parent does not mean seeing its related objects.
+                if not inline.has_view_or_change_permission(request, obj):
+                    raise PermissionDenied
+                return JsonResponse(inline.related_page(request, obj, request.GET.get('cursor')))
+        raise Http404
 
 # Register your models here.
 #admin.site.register(Book)
@@ -9,11 +210,16 @@ admin.site.register(Genre)
 admin.site.register(Language)
 
 # Define the admin class
-class BooksInline(admin.TabularInline):
+class BooksInline(PaginatedInline):
     model = Book
     extra = 0
+    # Selects of genres and languages would be rendered (and queried) for every row.
+    fields = ('title', 'isbn')
+    show_change_link = True
+    ordering = ('title', 'pk')
+    list_fields = ('title', 'isbn')
 
-class AuthorAdmin(admin.ModelAdmin):
+class AuthorAdmin(PaginatedInlinesMixin, admin.ModelAdmin):
     list_display = ('last_name', 'first_name', 'date_of_birth', 'date_of_death')
     fields = ['first_name', 'last_name', ('date_of_birth', 'date_of_death')]
 
@@ -23,28 +229,68 @@ class AuthorAdmin(admin.ModelAdmin):
 admin.site.register(Author, AuthorAdmin)
 
 # Register the Admin classes for Book using the decorator
-class BooksInstanceInline(admin.TabularInline):
+class BooksInstanceInline(PaginatedInline):
     model = BookInstance
+    form = BookInstanceAdminForm
     extra = 0
+    fields = ('imprint', 'status', 'due_back', 'borrower', 'loaded_version')
+    raw_id_fields = ('borrower',)
+    show_change_link = True
+    ordering = ('status', 'pk')
+    list_fields = ('imprint', 'status', 'due_back', 'borrower')
 
 @admin.register(Book)
-class BookAdmin(admin.ModelAdmin):
+class BookAdmin(PaginatedInlinesMixin, admin.ModelAdmin):
     list_display = ('title', 'author', 'display_genre')
     inlines = [BooksInstanceInline]
 
+    # Changelist: one query for the page with its authors, one for all their genres.
+    list_select_related = ('author',)
+    # Large tables: estimated page count, no second COUNT(*) of the whole table.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # display_genre() then reads the prefetched genres.
+        genres = Prefetch('genre', queryset=Genre.objects.order_by('name'))
+        return super().get_queryset(request).prefetch_related(genres)
+
 # Register the Admin classes for BookInstance using the decorator
 
 @admin.register(BookInstance)
 class BookInstanceAdmin(admin.ModelAdmin):
+    form = BookInstanceAdminForm
     list_display = ('book', 'status', 'borrower', 'due_back', 'id')
 
     list_filter = ('status', 'due_back')
+    list_select_related = ('book', 'borrower')
+    # Search popups instead of <select>s listing every book and user.
+    raw_id_fields = ('book', 'borrower')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     fieldsets = (
         (None, {
-            'fields': ('book', 'imprint', 'id')
+            'fields': ('book', 'imprint', 'id', 'loaded_version')
         }),
         ('Availability', {
             'fields': ('status', 'borrower', 'due_back')
         }),
     )
+
+
+@admin.register(Hold)
+class HoldAdmin(admin.ModelAdmin):
+    list_display = ('book', 'borrower', 'status', 'created_at', 'copy')
+    list_filter = ('status',)
+    list_select_related = ('book', 'borrower', 'copy__book')
+    raw_id_fields = ('book', 'borrower', 'copy')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'key', 'status', 'run_after', 'attempts', 'locked_by', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('locked_by', 'locked_at', 'finished_at', 'result', 'last_error', 'created_at')
@@ -0,0 +1,209 @@
+"""
+Read-only JSON API over the catalogue (version 1).
+
+Every resource is read with ``values()``, so no model instance is built and
+no query runs per row:
+
+* ``?fields=title,author`` limits the fields of the listed objects, and
+  ``?fields[authors]=last_name`` those of an included type;
+* ``?include=author,genres`` adds the related objects under "included",
+  fetched with one query per relation;
+* lists are paginated on the primary key with cursors (``?cursor=``, see
+  catalog.pagination), ``?limit=`` objects at a time.
+
+Borrowers are never exposed.
+"""
+from types import SimpleNamespace
+
+from django.core.exceptions import ValidationError
+
+from .models import Author, Book, BookInstance, Genre, Language
+from .pagination import CursorPaginator
+
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+class ApiError(ValueError):
+    """
+    An invalid request, reported to the client with status 400.
+    """
+
+
+class Resource:
+    """
+    How one model is exposed: its public ``fields``, the ``many`` fields
+    holding lists of ids (many-to-many relations, {field: model field name}),
+    and the relations clients may ``include`` ({field: resource name}).
+    """
+
+    def __init__(self, model, fields, many=None, include=None):
+        self.model = model
+        self.fields = fields
+        self.many = many or {}
+        self.include = include or {}
+
+
+RESOURCES = {
+    'books': Resource(Book, ('id', 'title', 'summary', 'isbn', 'author', 'language', 'genres', 'updated_at',
+                             'num_copies', 'num_copies_available', 'num_copies_on_loan', 'num_copies_reserved',
+                             'num_copies_maintenance'),
+                      many={'genres': 'genre'},
+                      include={'author': 'authors', 'language': 'languages', 'genres': 'genres'}),
+    'authors': Resource(Author, ('id', 'first_name', 'last_name', 'date_of_birth', 'date_of_death', 'updated_at')),
+    'copies': Resource(BookInstance, ('id', 'book', 'imprint', 'status', 'due_back', 'updated_at'),
+                       include={'book': 'books'}),
+    'genres': Resource(Genre, ('id', 'name')),
+    'languages': Resource(Language, ('id', 'name')),
+}
+
+
+def get_resource(name):
+    try:
+        return RESOURCES[name]
+    except KeyError:
+        raise ApiError('Unknown resource "%s".' % name)
+
+
+def _split(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def parse_fields(params, name, primary=False, required=()):
+    """
+    Returns the fields of resource ``name`` asked for in ``params``, always
+    with "id" and the ``required`` fields. Plain ``fields`` applies to the
+    ``primary`` resource, the one listed.
+    """
+    resource = get_resource(name)
+    value = params.get('fields[%s]' % name)
+    if value is None and primary:
+        value = params.get('fields')
+    if value is None:
+        return list(resource.fields)
+    fields = _split(value)
+    unknown = [field for field in fields if field not in resource.fields]
+    if unknown:
+        raise ApiError('Unknown fields of %s: %s.' % (name, ', '.join(unknown)))
+    return [field for field in resource.fields if field == 'id' or field in fields or field in required]
+
+
+def parse_include(params, name):
+    resource = get_resource(name)
+    include = _split(params.get('include', ''))
+    unknown = [relation for relation in include if relation not in resource.include]
+    if unknown:
+        raise ApiError('Cannot include %s in %s.' % (', '.join(unknown), name))
+    return include
+
+
+def parse_limit(params):
+    try:
+        limit = int(params.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ApiError('Invalid limit.')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def _columns(resource, fields):
+    return [field for field in fields if field not in resource.many]
+
+
+def _attach_many(resource, rows, fields):
+    """
+    Fills the many-to-many fields of ``rows`` with one query per field.
+    """
+    for field in fields:
+        if field not in resource.many:
+            continue
+        through = getattr(resource.model, resource.many[field]).through
+        source = resource.model._meta.model_name + '_id'
+        target = resource.many[field] + '_id'
+        by_id = {row['id']: row for row in rows}
+        for row in rows:
+            row[field] = []
+        links = through.objects.filter(**{source + '__in': list(by_id)}).order_by(source, target)
+        for source_id, target_id in links.values_list(source, target):
+            by_id[source_id][field].append(target_id)
+
+
+def fetch(name, queryset, fields):
+    """
+    Returns the objects of ``queryset`` as dicts of ``fields``.
+    """
+    resource = get_resource(name)
+    rows = list(queryset.values(*_columns(resource, fields)))
+    _attach_many(resource, rows, fields)
+    return rows
+
+
+def included(name, rows, include, params):
+    """
+    Returns {resource name: [objects]} for the relations in ``include``, one query each.
+    """
+    resource = get_resource(name)
+    result = {}
+    for relation in include:
+        target = resource.include[relation]
+        ids = set()
+        for row in rows:
+            value = row[relation]
+            ids.update(value if isinstance(value, list) else [value])
+        ids.discard(None)
+        model = get_resource(target).model
+        objects = fetch(target, model.objects.filter(pk__in=ids).order_by('pk'), parse_fields(params, target)) \
+            if ids else []
+        result.setdefault(target, []).extend(objects)
+    return result
+
+
+def list_page(name, params, page_url):
+    """
+    Returns the response body for a page of resource ``name``.
+
+    ``params`` is the query dict; ``page_url(cursor)`` builds the URL of another page.
+    """
+    resource = get_resource(name)
+    include = parse_include(params, name)
+    fields = parse_fields(params, name, primary=True, required=include)
+    limit = parse_limit(params)
+
+    queryset = resource.model.objects.values(*_columns(resource, fields))
+    paginator = CursorPaginator(queryset, limit, ('pk',))
+    cursor = params.get('cursor')
+    try:
+        rows, has_next, has_previous = paginator.page(cursor)
+    except ValueError:
+        raise ApiError('Invalid cursor.')
+    _attach_many(resource, rows, fields)
+
+    def link(row, backwards=False):
+        return page_url(paginator.encode_cursor(SimpleNamespace(**{resource.model._meta.pk.attname: row['id']}),
+                                                backwards=backwards))
+
+    return {
+        'data': rows,
+        'included': included(name, rows, include, params),
+        'links': {
+            'next': link(rows[-1]) if has_next else None,
+            'previous': (link(rows[0], backwards=True) if rows else page_url(None)) if has_previous else None,
+        },
+    }
+
+
+def detail(name, pk, params):
+    """
+    Returns the response body for one object of resource ``name``, or None if there is none.
+    """
+    resource = get_resource(name)
+    include = parse_include(params, name)
+    fields = parse_fields(params, name, primary=True, required=include)
+    try:
+        rows = fetch(name, resource.model.objects.filter(pk=pk), fields)
+    except (ValueError, ValidationError):
+        # Not a valid key for this model, e.g. a number for a copy.
+        return None
+    if not rows:
+        return None
+    return {'data': rows[0], 'included': included(name, rows, include, params)}
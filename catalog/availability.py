@@ -0,0 +1,129 @@
+"""
+Copy counters denormalized on Book.
+
+Every Book stores how many copies it has in total and in each status, so
+pages showing availability read them with the book instead of counting
+BookInstance rows. catalog.signals keeps them up to date when a copy is
+created, deleted, changes status or moves to another book; bulk writes that
+bypass signals call copies_moved() themselves, or recompute() afterwards.
+
+Counters are changed with ``F()`` expressions in a single UPDATE, so
+concurrent changes never overwrite each other. The UPDATE also sets
+``updated_at``, since the counters are part of what the book pages show.
+"""
+from django.db.models import Count, F
+from django.utils import timezone
+
+from . import fragments, stats
+from .models import Book, BookInstance
+
+
+STATUS_FIELDS = {
+    'a': 'num_copies_available',
+    'o': 'num_copies_on_loan',
+    'r': 'num_copies_reserved',
+    'm': 'num_copies_maintenance',
+}
+COUNTER_FIELDS = Book.COUNTER_FIELDS
+
+
+def counters(statuses):
+    """
+    Returns {counter field: value} for copies counted as {status: number}.
+    """
+    result = dict.fromkeys(COUNTER_FIELDS, 0)
+    for status, number in statuses.items():
+        result['num_copies'] += number
+        if status in STATUS_FIELDS:
+            result[STATUS_FIELDS[status]] += number
+    return result
+
+
+def adjust(changes):
+    """
+    Applies {(book id, status): change in number of copies} to the counters.
+
+    Books whose counters change by the same amounts share one UPDATE.
+    """
+    by_book = {}
+    for (book_id, status), delta in changes.items():
+        if book_id is not None and delta:
+            by_book.setdefault(book_id, {}).setdefault(status, 0)
+            by_book[book_id][status] += delta
+
+    groups = {}
+    for book_id, statuses in by_book.items():
+        key = tuple((field, delta) for field, delta in counters(statuses).items() if delta)
+        if key:
+            groups.setdefault(key, []).append(book_id)
+
+    now = timezone.now()
+    for key, book_ids in groups.items():
+        Book.objects.filter(pk__in=book_ids).update(
+            updated_at=now, **{field: F(field) + delta for field, delta in key})
+
+
+def copies_moved(moves):
+    """
+    Updates what the signals would have after an ``update()`` of copies: the
+    counters, the home page statistics and the fragment versions of the copies
+    and of their books.
+
+    ``moves`` is {copy id: ((old book id, old status), (new book id, new status))}.
+    """
+    changes = {}
+    available = 0
+    for old, new in moves.values():
+        if old != new:
+            changes[old] = changes.get(old, 0) - 1
+            changes[new] = changes.get(new, 0) + 1
+            available += int(new[1] == 'a') - int(old[1] == 'a')
+    adjust(changes)
+    stats.adjust_stats(num_instances_available=available)
+    fragments.bump(BookInstance, list(moves))
+    fragments.bump_books(book_id for old, new in moves.values() for book_id in (old[0], new[0]))
+
+
+def recompute(book_ids=None, batch_size=900, book_model=Book):
+    """
+    Recounts the copies of the given books (default: all), fixes the counters
+    that are wrong and returns the number of books fixed. The fixed books get
+    new fragment versions, since their cached rows show the counters.
+
+    ``book_model`` lets migrations pass their historical Book model.
+    """
+    copy_model = book_model._meta.get_field('bookinstance').related_model
+    fields = ('pk',) + COUNTER_FIELDS
+    if book_ids is None:
+        books = book_model.objects.order_by('pk').values_list(*fields)
+    else:
+        book_ids = list(book_ids)
+    fixed = 0
+    last = 0
+    start = 0
+    now = timezone.now()
+    while True:
+        # Batches keep the IN (...) lists under the SQLite parameter limit (999).
+        if book_ids is None:
+            batch = list(books.filter(pk__gt=last)[:batch_size])
+        else:
+            batch = list(book_model.objects.filter(pk__in=book_ids[start:start + batch_size]).values_list(*fields))
+            start += batch_size
+        if not batch:
+            return fixed
+        last = batch[-1][0]
+
+        statuses = {}
+        copies = copy_model.objects.filter(book_id__in=[row[0] for row in batch]).order_by()
+        for book_id, status, number in copies.values_list('book_id', 'status').annotate(number=Count('pk')):
+            statuses.setdefault(book_id, {})[status] = number
+
+        groups = {}
+        for row in batch:
+            expected = counters(statuses.get(row[0], {}))
+            if tuple(expected[field] for field in COUNTER_FIELDS) != row[1:]:
+                groups.setdefault(tuple(expected.items()), []).append(row[0])
+        for values, pks in groups.items():
+            book_model.objects.filter(pk__in=pks).update(updated_at=now, **dict(values))
+            fragments.bump_books(pks)
+            fixed += len(pks)
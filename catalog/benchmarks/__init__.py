@@ -0,0 +1,5 @@
+"""
+Performance benchmarks of the catalog views.
+
+See catalog.benchmarks.runner and the run_benchmarks management command.
+"""
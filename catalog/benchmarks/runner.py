@@ -0,0 +1,280 @@
+"""
+Drives every catalog URL through the test client and measures it.
+
+For each URL the runner records the wall time (median of the runs), the
+number of SQL queries, the time spent in SQL, the number of rows fetched
+from the database and the template rendering time (median, from the
+Server-Timing header of catalog.instrumentation), then compares them with the budgets stored in
+budgets.json next to this module.
+"""
+import json
+import os
+import re
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.db import connection
+from django.db.backends.utils import CursorWrapper, CursorDebugWrapper
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from catalog import urls as catalog_urls
+from catalog.models import Author, Book, BookInstance
+
+
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), 'budgets.json')
+
+METRICS = ('ms', 'queries', 'sql_ms', 'rows', 'template_ms')
+
+_TEMPLATE_TIMING = re.compile(r'\btpl;dur=([\d.]+)')
+
+
+def _counting_cursor(cursor_class, counter):
+    class RowCountingCursor(cursor_class):
+        def fetchone(self):
+            with self.db.wrap_database_errors:
+                row = self.cursor.fetchone()
+            counter['rows'] += row is not None
+            return row
+
+        def fetchmany(self, *args):
+            with self.db.wrap_database_errors:
+                rows = self.cursor.fetchmany(*args)
+            counter['rows'] += len(rows)
+            return rows
+
+        def fetchall(self):
+            with self.db.wrap_database_errors:
+                rows = self.cursor.fetchall()
+            counter['rows'] += len(rows)
+            return rows
+
+        def __iter__(self):
+            for row in self.cursor:
+                counter['rows'] += 1
+                yield row
+
+    return RowCountingCursor
+
+
+class RowCounter:
+    """
+    Context manager counting the rows fetched through the connection.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.counter = {'rows': 0}
+
+    @property
+    def rows(self):
+        return self.counter['rows']
+
+    def __enter__(self):
+        plain = _counting_cursor(CursorWrapper, self.counter)
+        debug = _counting_cursor(CursorDebugWrapper, self.counter)
+        self.connection.make_cursor = lambda cursor: plain(cursor, self.connection)
+        self.connection.make_debug_cursor = lambda cursor: debug(cursor, self.connection)
+        return self
+
+    def __exit__(self, *exc_info):
+        del self.connection.make_cursor
+        del self.connection.make_debug_cursor
+
+
+class QueryTimer:
+    """
+    Context manager counting the queries run through the connection and
+    summing their execution time.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.seconds += time.perf_counter() - start
+
+    def __enter__(self):
+        self.wrapper = self.connection.execute_wrapper(self)
+        self.wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wrapper.__exit__(*exc_info)
+
+
+def load_budgets(path=BUDGETS_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def sample_objects():
+    """
+    Picks the worst-case objects of the dataset for the detail pages.
+    """
+    return {
+        Book: Book.objects.annotate(copies=Count('bookinstance')).order_by('-copies').first(),
+        Author: Author.objects.annotate(books=Count('book')).order_by('-books').first(),
+        BookInstance: BookInstance.objects.filter(status__exact='o').first(),
+    }
+
+
+# Model of the object whose pk fills each URL pattern with arguments.
+URL_OBJECTS = {
+    'book-detail': Book,
+    'book_update': Book,
+    'book_delete': Book,
+    'author-detail': Author,
+    'author_update': Author,
+    'author_delete': Author,
+    'renew-book-librarian': BookInstance,
+    'api-detail': Book,
+}
+
+# Leading arguments of the URLs taking more than an object.
+URL_ARGS = {
+    'api-list': ['books'],
+    'api-detail': ['books'],
+}
+
+
+# URLs that cannot be benchmarked with a GET request.
+URL_SKIP = {
+    'bulk-circulation': 'POST only',
+    'place-hold': 'POST only',
+    'cancel-hold': 'POST only',
+}
+
+# Query strings of the URLs that need one to do real work.
+URL_QUERIES = {
+    'search': '?q=season',
+    'api-list': '?include=author,genres&limit=1000',
+}
+
+
+def catalog_urls_to_benchmark(objects):
+    """
+    Returns (URL name, path) for every named catalog URL; skipped URLs and
+    patterns whose arguments cannot be filled are returned with a None path.
+    """
+    found = []
+    for pattern in catalog_urls.urlpatterns:
+        name = getattr(pattern, 'name', None)
+        if not name:
+            continue
+        if name in URL_SKIP:
+            found.append((name, None))
+            continue
+        args = list(URL_ARGS.get(name, []))
+        if len(pattern.pattern.regex.groupindex) > len(args):
+            obj = objects.get(URL_OBJECTS.get(name))
+            if obj is None:
+                found.append((name, None))
+                continue
+            args.append(obj.pk)
+        found.append((name, reverse(name, args=args) + URL_QUERIES.get(name, '')))
+    return found
+
+
+def benchmark_librarian():
+    """
+    Returns the borrower with the most loans, given the librarian permission.
+
+    Run inside a transaction that is rolled back: the permission is granted
+    for real.
+    """
+    user = User.objects.filter(pk__in=BookInstance.objects.filter(status__exact='o').values('borrower')).annotate(
+        loans=Count('bookinstance')).order_by('-loans').first()
+    if user is None:
+        user = User.objects.create(username='benchmark-librarian')
+    user.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+    return user
+
+
+def measure(client, path, repeat):
+    """
+    Requests the path ``repeat`` times after two warm-up requests: the first
+    one sets the cookies (e.g. the visitor's), the second fills the caches
+    keyed on them, so the requests measured find warm caches.
+    """
+    client.get(path)
+    client.get(path)
+    timings = []
+    template_timings = []
+    for _ in range(repeat):
+        with QueryTimer(connection) as queries, RowCounter(connection) as rows:
+            start = time.perf_counter()
+            response = client.get(path)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            timings.append((time.perf_counter() - start) * 1000)
+        match = _TEMPLATE_TIMING.search(response.get('Server-Timing', ''))
+        if match:
+            template_timings.append(float(match.group(1)))
+    return {
+        'status': response.status_code,
+        'ms': round(statistics.median(timings), 2),
+        'queries': queries.queries,
+        'sql_ms': round(queries.seconds * 1000, 2),
+        'rows': rows.rows,
+        'template_ms': round(statistics.median(template_timings), 2) if template_timings else None,
+    }
+
+
+def run(repeat=5, budgets=None):
+    """
+    Benchmarks the catalog URLs and returns the report as a dict.
+    """
+    budgets = load_budgets() if budgets is None else budgets
+    client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost')
+    client.force_login(benchmark_librarian())
+
+    results = []
+    for name, path in catalog_urls_to_benchmark(sample_objects()):
+        result = {'name': name, 'path': path, 'violations': []}
+        if path is None:
+            result['skipped'] = URL_SKIP.get(name, 'no sample object')
+            results.append(result)
+            continue
+        try:
+            result.update(measure(client, path, repeat))
+        except Exception as e:
+            result['error'] = '{0}: {1}'.format(type(e).__name__, e)
+            result['violations'].append('error')
+            results.append(result)
+            continue
+        for metric, limit in budgets.get(name, {}).items():
+            if result.get(metric) is not None and result[metric] > limit:
+                result['violations'].append('%s %s > %s' % (metric, result[metric], limit))
+        results.append(result)
+
+    return {
+        'repeat': repeat,
+        'results': results,
+        'failed': [result['name'] for result in results if result['violations']],
+    }
+
+
+def to_markdown(report):
+    lines = [
+        '| URL | Status | ms | Queries | SQL ms | Rows | Template ms | Budget |',
+        '|---|---|---|---|---|---|---|---|',
+    ]
+    for result in report['results']:
+        if result.get('skipped') or result.get('error'):
+            lines.append('| %s | %s | | | | | | |' % (
+                result['name'], 'skipped: %s' % result['skipped'] if result.get('skipped') else result['error']))
+            continue
+        lines.append('| {name} | {status} | {ms} | {queries} | {sql_ms} | {rows} | {template_ms} | {budget} |'.format(
+            budget='; '.join(result['violations']) or 'ok', **result))
+    return '\n'.join(lines) + '\n'
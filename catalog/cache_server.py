@@ -0,0 +1,191 @@
+"""
+A stand-in memcached server, for trying the memcached cache settings
+locally without installing memcached (``manage.py run_cache_server``).
+
+It speaks the text protocol used by python-memcached and pylibmc (get,
+gets, set, add, replace, append, prepend, cas, delete, incr, decr, touch,
+flush_all, stats, version, quit) and keeps everything in a dict of the
+process, without any memory limit. It is meant for development and tests,
+not production.
+"""
+import socketserver
+import threading
+import time
+
+
+VERSION = '1.6.0-locallibrary'
+
+# Expiration times larger than this are Unix timestamps, not durations (as in memcached).
+RELATIVE_EXPIRY_LIMIT = 60 * 60 * 24 * 30
+
+STORAGE_COMMANDS = ('set', 'add', 'replace', 'append', 'prepend', 'cas')
+
+
+class Store:
+    """
+    Items {key: (flags, data, expires, cas unique)}, shared by the connections.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = {}
+        self.next_cas = 1
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def expires(exptime):
+        if exptime == 0:
+            return None
+        if exptime < 0:
+            return 0
+        return exptime if exptime > RELATIVE_EXPIRY_LIMIT else time.time() + exptime
+
+    def _get(self, key):
+        item = self.items.get(key)
+        if item is not None and item[2] is not None and item[2] <= time.time():
+            del self.items[key]
+            item = None
+        return item
+
+    def _put(self, key, flags, data, expires):
+        self.items[key] = (flags, data, expires, self.next_cas)
+        self.next_cas += 1
+
+    def get(self, keys):
+        with self.lock:
+            found = [(key, self._get(key)) for key in keys]
+            found = [(key, item) for key, item in found if item is not None]
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            return found
+
+    def store(self, command, key, flags, exptime, data, cas=None):
+        with self.lock:
+            item = self._get(key)
+            if command == 'add' and item is not None:
+                return 'NOT_STORED'
+            if command in ('replace', 'append', 'prepend') and item is None:
+                return 'NOT_STORED'
+            if command == 'cas':
+                if item is None:
+                    return 'NOT_FOUND'
+                if item[3] != cas:
+                    return 'EXISTS'
+            if command == 'append':
+                flags, data, expires = item[0], item[1] + data, item[2]
+            elif command == 'prepend':
+                flags, data, expires = item[0], data + item[1], item[2]
+            else:
+                expires = self.expires(exptime)
+            self._put(key, flags, data, expires)
+            return 'STORED'
+
+    def delete(self, key):
+        with self.lock:
+            if self._get(key) is None:
+                return 'NOT_FOUND'
+            del self.items[key]
+            return 'DELETED'
+
+    def incr(self, key, delta):
+        with self.lock:
+            item = self._get(key)
+            if item is None:
+                return 'NOT_FOUND'
+            try:
+                value = int(item[1])
+            except ValueError:
+                return 'CLIENT_ERROR cannot increment or decrement non-numeric value'
+            # Decrementing below 0 gives 0, incrementing wraps around 64 bits.
+            value = max(0, value + delta) % 2 ** 64
+            self._put(key, item[0], str(value).encode(), item[2])
+            return str(value)
+
+    def touch(self, key, exptime):
+        with self.lock:
+            item = self._get(key)
+            if item is None:
+                return 'NOT_FOUND'
+            self.items[key] = item[:2] + (self.expires(exptime),) + item[3:]
+            return 'TOUCHED'
+
+    def flush(self):
+        with self.lock:
+            self.items.clear()
+        return 'OK'
+
+    def stats(self):
+        with self.lock:
+            return {'curr_items': len(self.items), 'get_hits': self.hits, 'get_misses': self.misses}
+
+
+class MemcachedHandler(socketserver.StreamRequestHandler):
+    """
+    One client connection: reads commands until ``quit`` or the end of the stream.
+    """
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            words = line.decode('utf-8', 'replace').split()
+            if not words:
+                continue
+            if words[0] == 'quit':
+                return
+            try:
+                reply = self.command(words)
+            except (IndexError, ValueError):
+                reply = 'CLIENT_ERROR bad command line format'
+            if reply is not None:
+                self.wfile.write(reply.encode() + b'\r\n')
+
+    def command(self, words):
+        store = self.server.store
+        name, args = words[0], words[1:]
+        noreply = bool(args) and args[-1] == 'noreply'
+        if noreply:
+            args = args[:-1]
+
+        if name in ('get', 'gets'):
+            lines = []
+            for key, (flags, data, _, cas) in store.get(args):
+                header = 'VALUE {0} {1} {2}'.format(key, flags, len(data))
+                if name == 'gets':
+                    header += ' {0}'.format(cas)
+                lines.append(header.encode() + b'\r\n' + data)
+            self.wfile.write(b''.join(line + b'\r\n' for line in lines))
+            return 'END'
+        if name in STORAGE_COMMANDS:
+            key, flags, exptime, size = args[0], int(args[1]), int(args[2]), int(args[3])
+            data = self.rfile.read(size + 2)[:size]
+            cas = int(args[4]) if name == 'cas' else None
+            reply = store.store(name, key, flags, exptime, data, cas)
+        elif name == 'delete':
+            reply = store.delete(args[0])
+        elif name in ('incr', 'decr'):
+            delta = int(args[1])
+            reply = store.incr(args[0], delta if name == 'incr' else -delta)
+        elif name == 'touch':
+            reply = store.touch(args[0], int(args[1]))
+        elif name == 'flush_all':
+            reply = store.flush()
+        elif name == 'version':
+            return 'VERSION ' + VERSION
+        elif name == 'stats':
+            lines = ['STAT {0} {1}'.format(stat, value) for stat, value in sorted(store.stats().items())]
+            return '\r\n'.join(lines + ['END'])
+        else:
+            return 'ERROR'
+        return None if noreply else reply
+
+
+class MemcachedServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, MemcachedHandler)
+        self.store = Store()
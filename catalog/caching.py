@@ -0,0 +1,134 @@
+"""
+Cache backends counting their hits and misses, and named cache access.
+
+The backends of locallibrary.cache_url are Django's own, with StatsMixin
+counting the keys found and missed by ``get()`` and ``get_many()`` per
+cache alias. The counts live in the process, like the request aggregates
+of catalog.instrumentation, and are exported by its metrics view.
+
+The application uses three caches besides the default one:
+
+* ``sessions``, for the cached_db and cache session engines;
+* ``template_fragments``, for the ``{% cache %}`` blocks and the versions
+  they are keyed on (see catalog.fragments);
+* ``queries``, for query results: the home page counters and visit counts.
+"""
+import threading
+
+from django.core.cache import caches
+from django.core.cache.backends import db, dummy, filebased, locmem, memcached
+
+
+_MISSING = object()
+
+_local = threading.local()
+
+
+class CacheStats:
+    """
+    Hits and misses per cache alias since the process started.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.caches = {}
+
+    def add(self, alias, hits, misses):
+        with self.lock:
+            counts = self.caches.setdefault(alias, {'hits': 0, 'misses': 0})
+            counts['hits'] += hits
+            counts['misses'] += misses
+
+    def snapshot(self):
+        with self.lock:
+            return {alias: dict(counts) for alias, counts in self.caches.items()}
+
+    def reset(self):
+        with self.lock:
+            self.caches.clear()
+
+
+stats = CacheStats()
+
+
+class StatsMixin:
+    """
+    Counts the hits and misses of a cache backend in ``stats``, under the ALIAS of its settings.
+
+    Backends implement ``get()`` with ``get_many()`` or the other way
+    round; only the outer call counts.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        self.alias = params.get('ALIAS', 'default')
+
+    def get(self, key, default=None, version=None):
+        if getattr(_local, 'counting', False):
+            return super().get(key, default, version)
+        _local.counting = True
+        try:
+            value = super().get(key, _MISSING, version)
+        finally:
+            _local.counting = False
+        hit = value is not _MISSING
+        stats.add(self.alias, int(hit), int(not hit))
+        return value if hit else default
+
+    def get_many(self, keys, version=None):
+        if getattr(_local, 'counting', False):
+            return super().get_many(keys, version)
+        keys = list(keys)
+        _local.counting = True
+        try:
+            found = super().get_many(keys, version)
+        finally:
+            _local.counting = False
+        stats.add(self.alias, len(found), len(keys) - len(found))
+        return found
+
+
+class LocMemCache(StatsMixin, locmem.LocMemCache):
+    pass
+
+
+class FileBasedCache(StatsMixin, filebased.FileBasedCache):
+    pass
+
+
+class DatabaseCache(StatsMixin, db.DatabaseCache):
+    pass
+
+
+class MemcachedCache(StatsMixin, memcached.MemcachedCache):
+    pass
+
+
+class PyLibMCCache(StatsMixin, memcached.PyLibMCCache):
+    pass
+
+
+class DummyCache(StatsMixin, dummy.DummyCache):
+    pass
+
+
+try:
+    from django_redis.cache import RedisCache as _RedisCache
+except ImportError:
+    # Optional: redis:// URLs need django-redis.
+    pass
+else:
+    class RedisCache(StatsMixin, _RedisCache):
+        pass
+
+
+class NamedCache:
+    """
+    The cache of an alias, for the current thread: what django.core.cache.cache is for the default one.
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def __getattr__(self, name):
+        return getattr(caches[self.alias], name)
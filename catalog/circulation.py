@@ -0,0 +1,159 @@
+"""
+Bulk circulation: check-out, check-in and renewal of many copies at once.
+
+Each operation reads the current state of the requested copies in one
+query, decides per copy whether the change applies, then writes every
+eligible copy with a single ``update()``, per batch of BATCH_SIZE copies,
+all inside one transaction.
+
+Copies checked in go to the hold queue (see catalog.holds) in the same
+transaction, and a copy reserved for a borrower can be checked out to them.
+"""
+import datetime
+import uuid
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import availability, fragments, holds, stats
+from .models import BookInstance
+
+
+MAX_COPIES = 1000
+
+# Copies read and written per query.
+BATCH_SIZE = 900
+
+LOAN_PERIOD = datetime.timedelta(weeks=3)
+
+# Status a copy must have for each action.
+ACTIONS = {
+    'check_out': 'a',
+    'check_in': 'o',
+    'renew': 'o',
+}
+
+
+class CirculationError(ValueError):
+    pass
+
+
+def parse_copy_ids(values):
+    """
+    Returns the values parsed as UUIDs, None for the invalid ones.
+    """
+    if not isinstance(values, list):
+        raise CirculationError('"copies" must be a list of copy ids.')
+    if len(values) > MAX_COPIES:
+        raise CirculationError('At most %s copies can be processed at once.' % MAX_COPIES)
+    parsed = []
+    for value in values:
+        try:
+            parsed.append(uuid.UUID(str(value)))
+        except ValueError:
+            parsed.append(None)
+    return parsed
+
+
+def apply(action, copies, borrower=None, due_back=None):
+    """
+    Applies the action to the copies (a list of ids) and returns
+    (number of copies changed, [{'id': ..., 'result': ...}] in request order).
+
+    'result' is 'ok' or the reason the copy was left alone.
+    """
+    if action not in ACTIONS:
+        raise CirculationError('Unknown action "%s".' % action)
+    if action == 'check_out' and borrower is None:
+        raise CirculationError('Checking out needs a borrower.')
+    if action in ('check_out', 'renew') and due_back is None:
+        due_back = datetime.date.today() + LOAN_PERIOD
+
+    parsed = parse_copy_ids(copies)
+    pks = list(dict.fromkeys(pk for pk in parsed if pk))
+
+    updated = 0
+    current, eligible = {}, set()
+    with transaction.atomic():
+        # Batches keep the IN (...) lists under the SQLite parameter limit (999).
+        for start in range(0, len(pks), BATCH_SIZE):
+            batch_updated, batch_current, batch_eligible = _apply_batch(
+                action, pks[start:start + BATCH_SIZE], borrower, due_back)
+            updated += batch_updated
+            current.update(batch_current)
+            eligible |= batch_eligible
+
+    results = []
+    for value, pk in zip(copies, parsed):
+        if pk is None:
+            result = 'invalid id'
+        elif pk not in current:
+            result = 'not found'
+        elif pk not in eligible:
+            result = 'wrong status: %s' % current[pk]
+        else:
+            result = 'ok'
+        results.append({'id': value, 'result': result})
+    return updated, results
+
+
+def _apply_batch(action, pks, borrower, due_back):
+    """
+    Applies the action to at most BATCH_SIZE copies, inside the transaction
+    of apply(), and returns (number of copies changed, {id: status read}, ids eligible).
+    """
+    required_status = ACTIONS[action]
+    rows = (BookInstance.objects.select_for_update()
+            .filter(pk__in=pks).order_by().values_list('pk', 'status', 'book_id'))
+    current = {pk: status for pk, status, _ in rows}
+    books = {pk: book_id for pk, _, book_id in rows}
+    eligible = {pk for pk, status in current.items() if status == required_status}
+    reserved = set()
+    if action == 'check_out' and 'r' in current.values():
+        reserved = holds.reserved_for(borrower, [pk for pk, status in current.items() if status == 'r'])
+        eligible |= reserved
+
+    changes = {}
+    # A new due date, or none, ends the overdue flag of the nightly sweep (see catalog.jobs).
+    if action == 'check_out':
+        changes = {'status': 'o', 'borrower': borrower, 'due_back': due_back, 'overdue_flagged_on': None}
+    elif action == 'check_in':
+        changes = {'status': 'a', 'borrower': None, 'due_back': None, 'overdue_flagged_on': None}
+    elif action == 'renew':
+        changes = {'due_back': due_back, 'overdue_flagged_on': None}
+    # update() does not fill auto_now fields.
+    changes['updated_at'] = timezone.now()
+    changes['version'] = F('version') + 1
+
+    # The status filter keeps the update correct even without row locks (SQLite).
+    updated = 0
+    if eligible:
+        condition = Q(pk__in=eligible - reserved, status=required_status)
+        if reserved:
+            condition |= Q(pk__in=reserved, status='r')
+        updated = BookInstance.objects.filter(condition).update(**changes)
+
+    # Some copies changed meanwhile and were not updated: which ones is not known.
+    partial = updated != len(eligible)
+    if partial and reserved:
+        # Only the holds whose copy was checked out are fulfilled.
+        reserved = set(BookInstance.objects.filter(pk__in=reserved, status='o', updated_at=changes['updated_at'])
+                       .values_list('pk', flat=True))
+
+    # update() bypasses the signals maintaining the counters and fragment versions.
+    if updated and not partial:
+        status = changes.get('status')
+        availability.copies_moved({pk: ((books[pk], current[pk]), (books[pk], status or current[pk]))
+                                   for pk in eligible})
+    elif updated:
+        # Recount their books, and the statistics.
+        availability.recompute({books[pk] for pk in eligible})
+        transaction.on_commit(stats.invalidate_stats)
+        fragments.bump(BookInstance, eligible)
+        fragments.bump_books(books[pk] for pk in eligible)
+    if action == 'check_out' and reserved:
+        holds.fulfil(reserved)
+    elif action == 'check_in' and updated:
+        holds.allocate(books[pk] for pk in eligible)
+    return updated, current, eligible
@@ -0,0 +1,68 @@
+"""
+Optimistic concurrency control for copies.
+
+Every BookInstance has a ``version``, incremented by each write: save()
+(see BookInstance.save) and the ``update()`` calls of catalog.circulation
+and catalog.holds. update_copy() writes only the fields that change, with
+one UPDATE that also requires the version the caller read. If someone wrote
+the copy in between, nothing is written and ConflictError is raised, so the
+caller can show the current state instead of silently overwriting it.
+
+BookInstance.save() makes the same check for existing copies: its UPDATE
+also requires the version the copy was loaded with, and ConflictError is
+raised when no row matches.
+
+Nothing is locked while a librarian fills in a form: the version read with
+the form travels with it and is checked when the form comes back. The renewal
+form and the admin forms (BookInstanceAdminForm) treat a missing version as a
+conflict.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import availability, holds
+from .models import BookInstance
+
+
+class ConflictError(Exception):
+    pass
+
+
+def update_copy(copy, version=None, **changes):
+    """
+    Writes the given field values that differ from ``copy``'s, provided the
+    copy is still at ``version`` (default: ``copy.version``), and returns the
+    names of the fields written. ``copy`` is updated to match.
+    """
+    if version is not None and version != copy.version:
+        raise ConflictError('This copy has been changed since you loaded it.')
+    changed = {name: value for name, value in changes.items() if getattr(copy, name) != value}
+    if not changed:
+        return []
+
+    now = timezone.now()
+    with transaction.atomic():
+        updated = BookInstance.objects.filter(pk=copy.pk, version=copy.version).update(
+            updated_at=now, version=F('version') + 1, **changed)
+        if not updated:
+            raise ConflictError('This copy has been changed since you loaded it.')
+
+        old_book_id, old_status = copy.book_id, copy.status
+        for name, value in changed.items():
+            setattr(copy, name, value)
+        copy.updated_at = now
+        copy.version += 1
+
+        # update() bypasses the signals maintaining the counters and fragment versions.
+        availability.copies_moved({copy.pk: ((old_book_id, old_status), (copy.book_id, copy.status))})
+        if (old_book_id, old_status) != (copy.book_id, 'a') and copy.status == 'a' \
+                and any(hold.copy_id == copy.pk for hold in holds.allocate([copy.book_id])):
+            copy.status = 'r'
+            copy.version += 1
+
+    # What catalog.signals remembers of the copy as loaded, for its next save().
+    copy._counted = (copy.book_id, copy.status)
+    copy._stats_status = copy.status
+    copy._original_book_id = copy.book_id
+    return list(changed)
@@ -0,0 +1,98 @@
+"""
+Streaming export of the whole catalogue as CSV or JSON Lines.
+
+One line per book: isbn, title, author ("Last, First"), summary, language,
+genres (separated by ";", a list in JSON) and the number of copies in each
+status, named after the Book counters. The columns are those read by
+catalog.importing, so an export can be imported into another library with
+as many copies in each status.
+
+Books are read with ``iterator()``, which streams from a server-side cursor
+on PostgreSQL and fetches in chunks elsewhere, together with their copy
+counters (see catalog.availability); genres are fetched with one query per
+chunk of books. Memory therefore stays flat whatever the size of the
+catalogue, and so does the optional gzip compression, done on the fly.
+"""
+import csv
+import json
+import zlib
+
+from .availability import STATUS_FIELDS
+from .importing import FORMATS, GENRE_SEPARATOR
+from .models import Book
+from .seeding import chunks
+
+
+HEADER = ('isbn', 'title', 'author', 'summary', 'language', 'genres') + tuple(STATUS_FIELDS.values())
+
+
+class Echo:
+    """
+    File-like object whose write() returns the value, for streaming csv.writer output.
+    """
+
+    def write(self, value):
+        return value
+
+
+def catalogue_rows(chunk_size=2000):
+    """
+    Yields one tuple of HEADER values per book, in primary key order.
+    """
+    books = Book.objects.order_by('pk').values_list(
+        'pk', 'isbn', 'title', 'author__last_name', 'author__first_name', 'summary', 'language__name',
+        *STATUS_FIELDS.values())
+    for chunk in chunks(books.iterator(chunk_size=chunk_size), chunk_size):
+        book_ids = [row[0] for row in chunk]
+
+        genres = {}
+        links = Book.genre.through.objects.filter(book_id__in=book_ids).order_by('book_id', 'genre__name')
+        for book_id, name in links.values_list('book_id', 'genre__name'):
+            genres.setdefault(book_id, []).append(name)
+
+        for pk, isbn, title, last_name, first_name, summary, language, *copies in chunk:
+            author = '{0}, {1}'.format(last_name, first_name) if last_name is not None else ''
+            yield (isbn, title, author, summary, language or '', genres.get(pk, [])) + tuple(copies)
+
+
+def export_lines(format, chunk_size=2000):
+    """
+    Yields the export as lines of text in ``format`` (see FORMATS).
+    """
+    rows = catalogue_rows(chunk_size)
+    if format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(HEADER)
+        for row in rows:
+            yield writer.writerow(row[:5] + (GENRE_SEPARATOR.join(row[5]),) + row[6:])
+    elif format == 'jsonl':
+        for row in rows:
+            yield json.dumps(dict(zip(HEADER, row)), ensure_ascii=False, separators=(',', ':')) + '\n'
+    else:
+        raise ValueError('Unknown format "%s".' % format)
+
+
+def encode(lines, compress=False, buffer_size=64 * 1024):
+    """
+    Encodes lines of text as UTF-8, gzip-compressed if asked, in pieces of
+    about ``buffer_size`` bytes.
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+    buffer = []
+    size = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= buffer_size:
+            data = b''.join(buffer)
+            buffer, size = [], 0
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                yield data
+    data = b''.join(buffer)
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
@@ -4,9 +4,14 @@ from django.core.exceptions import ValidationError
 from django.utils.translation import ugettext_lazy as _
 import datetime  # for checking renewal date range.
 
+from .models import BookInstance
+
 
 class RenewBookForm(forms.Form):
     renewal_date = forms.DateField(help_text="Enter a date between now and 4 weeks (default 3).")
+    # Version of the copy the form was filled in for (see catalog.concurrency).
+    # Optional for the other uses of the form's date rules (bulk renewals): renew_book_librarian requires it.
+    version = forms.IntegerField(widget=forms.HiddenInput, required=False)
 
     def clean_renewal_date(self):
         data = self.cleaned_data['renewal_date']
@@ -21,3 +26,35 @@ class RenewBookForm(forms.Form):
 
         # Помните, что всегда надо возвращать "очищенные" данные.
         return data
+
+
+class CatalogImportForm(forms.Form):
+    file = forms.FileField(help_text="A .csv or .jsonl file with isbn and title columns (see catalog.importing).")
+    format = forms.ChoiceField(choices=(('', 'From the file name'), ('csv', 'CSV'), ('jsonl', 'JSON Lines')),
+                               required=False)
+
+
+class BookInstanceAdminForm(forms.ModelForm):
+    """
+    Admin form of a copy, refusing to save over changes made since it was
+    loaded; BookInstance.save() also checks the version in its UPDATE.
+    """
+    # Version of the copy the form was filled in for (see catalog.concurrency); not
+    # named after the model field, which is not editable.
+    loaded_version = forms.IntegerField(label='Version', widget=forms.HiddenInput, required=False)
+
+    class Meta:
+        model = BookInstance
+        fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.instance._state.adding:
+            self.initial['loaded_version'] = self.instance.version
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # A missing version is a conflict too: the form could overwrite anything.
+        if not self.instance._state.adding and cleaned_data.get('loaded_version') != self.instance.version:
+            raise ValidationError(_('This copy has been changed since you loaded it. Reload the page and try again.'))
+        return cleaned_data
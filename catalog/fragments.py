@@ -0,0 +1,109 @@
+"""
+Versions for per-object template fragment caching.
+
+Every Book, Author and BookInstance has a version: an opaque token kept,
+like the fragments, in the ``template_fragments`` cache. Templates include it
+in the key of their ``{% cache %}`` blocks (see the ``version`` filter in
+catalog_extras), and catalog.signals bumps it whenever the object, or
+anything its fragments show, changes. A fragment is therefore never
+invalidated explicitly: a new version simply makes a new key, and the old
+fragments expire.
+
+Bumping deletes the token, so the next reader creates a fresh one. It
+happens right away and again when the transaction commits, so a concurrent
+request cannot cache data from before the commit under the new version.
+"""
+import uuid
+
+from django.db import transaction
+
+from .caching import NamedCache
+
+
+cache = NamedCache('template_fragments')
+
+# Lifetime of versions and of the fragments keyed on them.
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+
+def _key(model, pk):
+    return 'catalog:version:{0}:{1}'.format(model._meta.label_lower, pk)
+
+
+def versions(model, pks):
+    """
+    Returns {pk: version} for the given objects, creating missing versions.
+    """
+    keys = {_key(model, pk): pk for pk in pks}
+    found = cache.get_many(list(keys))
+    result = {keys[key]: version for key, version in found.items()}
+    for key, pk in keys.items():
+        if key not in found:
+            version = uuid.uuid4().hex
+            # add() keeps the version another request may just have created.
+            if not cache.add(key, version, FRAGMENT_TIMEOUT):
+                version = cache.get(key, version)
+            result[pk] = version
+    return result
+
+
+def attach_versions(objects):
+    """
+    Sets ``fragment_version`` on the objects with a single cache round trip.
+    """
+    objects = [obj for obj in objects if obj is not None]
+    if not objects:
+        return
+    by_model = {}
+    for obj in objects:
+        by_model.setdefault(type(obj), []).append(obj)
+    for model, instances in by_model.items():
+        found = versions(model, [obj.pk for obj in instances])
+        for obj in instances:
+            obj.fragment_version = found[obj.pk]
+
+
+def get_version(obj):
+    version = getattr(obj, 'fragment_version', None)
+    if version is None:
+        version = versions(type(obj), [obj.pk])[obj.pk]
+        obj.fragment_version = version
+    return version
+
+
+def bump(model, pks):
+    """
+    Gives the objects new versions, now and once the transaction commits.
+    """
+    keys = [_key(model, pk) for pk in pks if pk is not None]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def bump_books(book_ids):
+    """
+    Bumps the books and their authors, whose pages show the books' copy counts.
+    """
+    from .models import Author, Book
+
+    book_ids = [pk for pk in set(book_ids) if pk is not None]
+    if not book_ids:
+        return
+    bump(Book, book_ids)
+    bump(Author, Book.objects.filter(pk__in=book_ids).exclude(author=None).values_list('author_id', flat=True))
+
+
+class VersionedFragmentsMixin:
+    """
+    View mixin preloading the fragment versions of the object (detail views)
+    or of the page's objects (list views) in one cache round trip.
+    """
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if context.get('object_list') is not None:
+            attach_versions(context['object_list'])
+        elif context.get('object') is not None:
+            attach_versions([context['object']])
+        return context
@@ -0,0 +1,181 @@
+"""
+Hold queue: borrowers waiting for a copy of a book.
+
+The holds on a book are served first come, first served. Whenever a copy
+becomes available (checked in, or saved as Available), allocate() sets it
+aside for the oldest waiting hold: the copy becomes Reserved and the hold
+Allocated, until the borrower checks the copy out (see catalog.circulation)
+or cancels the hold, which passes the copy on to the next in line.
+
+Available copies and waiting holds are read with
+``select_for_update(skip_locked=True)``: an allocation running at the same
+time for the same book, e.g. another worker handling another return, skips
+the rows this one has locked instead of waiting for them, so a copy or a
+hold is never assigned twice. Every claim is also a conditional ``update()``
+on the previous status, which keeps allocation correct where rows cannot be
+locked (SQLite), and the database refuses a copy allocated to two holds.
+
+Borrowers are told by email, in one batch once the transaction commits.
+"""
+from django.core.mail import send_mass_mail
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import availability
+from .models import BookInstance, Hold
+
+
+# Statuses of the holds still in the queue.
+OPEN_STATUSES = ('w', 'a')
+
+NOTIFICATION_SUBJECT = 'Your hold on "{title}" is ready'
+NOTIFICATION_MESSAGE = '''Hello {username},
+
+A copy of "{title}" has been set aside for you (copy {copy}).
+Please collect it at the library desk.
+'''
+
+
+class HoldError(ValueError):
+    pass
+
+
+def place_hold(book, borrower):
+    """
+    Puts the borrower in the queue for the book and returns the hold,
+    allocated at once if a copy is available and nobody is ahead.
+    """
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                hold = Hold.objects.create(book=book, borrower=borrower)
+        except IntegrityError:
+            raise HoldError('You already have a hold on "%s".' % book.title)
+        allocate([book.pk])
+    hold.refresh_from_db()
+    return hold
+
+
+def cancel_hold(hold):
+    """
+    Cancels an open hold. The copy set aside for it, if any, goes to the next in line.
+    """
+    with transaction.atomic():
+        status, copy_id = Hold.objects.values_list('status', 'copy_id').get(pk=hold.pk)
+        if status not in OPEN_STATUSES or not Hold.objects.filter(pk=hold.pk, status=status).update(status='c'):
+            raise HoldError('This hold is no longer open.')
+        hold.status = 'c'
+        if status == 'a' and copy_id is not None:
+            _move_copies({hold.book_id: [copy_id]}, 'r', 'a')
+            allocate([hold.book_id])
+
+
+def allocate(book_ids):
+    """
+    Sets the available copies of the books aside for their oldest waiting
+    holds and returns the holds allocated.
+    """
+    book_ids = {pk for pk in book_ids if pk is not None}
+    if not book_ids:
+        return []
+
+    allocated = []
+    with transaction.atomic():
+        waiting = Hold.objects.filter(book_id__in=book_ids, status='w').order_by().values_list('book_id', flat=True)
+        for book_id in sorted(set(waiting)):
+            copies = list(BookInstance.objects.select_for_update(skip_locked=True)
+                          .filter(book_id=book_id, status='a').order_by('pk').values_list('pk', flat=True))
+            if not copies:
+                continue
+            # Oldest first (Hold.Meta.ordering). Only the holds are locked, not their book and borrower.
+            holds = (Hold.objects.select_for_update(skip_locked=True, of=('self',))
+                     .select_related('book', 'borrower').filter(book_id=book_id, status='w')[:len(copies)])
+            for hold in holds:
+                copy_id = _claim_copy(copies)
+                if copy_id is None:
+                    break
+                now = timezone.now()
+                if Hold.objects.filter(pk=hold.pk, status='w').update(status='a', copy=copy_id, allocated_at=now):
+                    hold.status, hold.copy_id, hold.allocated_at = 'a', copy_id, now
+                    allocated.append(hold)
+                else:
+                    # Cancelled meanwhile: give the copy to the next hold.
+                    BookInstance.objects.filter(pk=copy_id, status='r').update(
+                        status='a', updated_at=now, version=F('version') + 1)
+                    copies.insert(0, copy_id)
+
+        # update() bypasses the signals maintaining the counters and fragment versions.
+        by_book = {}
+        for hold in allocated:
+            by_book.setdefault(hold.book_id, []).append(hold.copy_id)
+        _copies_moved(by_book, 'a', 'r')
+
+    if allocated:
+        transaction.on_commit(lambda: notify(allocated))
+    return allocated
+
+
+def _claim_copy(copies):
+    """
+    Reserves the first of the copies still available, removing the ones tried from the list.
+    """
+    while copies:
+        copy_id = copies.pop(0)
+        if BookInstance.objects.filter(pk=copy_id, status='a').update(
+                status='r', updated_at=timezone.now(), version=F('version') + 1):
+            return copy_id
+    return None
+
+
+def _move_copies(by_book, from_status, to_status):
+    """
+    Changes the status of {book id: [copy id, ...]} copies that still have ``from_status``.
+    """
+    moved = {}
+    for book_id, copy_ids in by_book.items():
+        if BookInstance.objects.filter(pk__in=copy_ids, status=from_status).update(
+                status=to_status, updated_at=timezone.now(), version=F('version') + 1) == len(copy_ids):
+            moved[book_id] = copy_ids
+        else:
+            availability.recompute([book_id])
+    _copies_moved(moved, from_status, to_status)
+
+
+def _copies_moved(by_book, from_status, to_status):
+    """
+    Updates what depends on the status of the {book id: [copy id, ...]} copies after an ``update()``.
+    """
+    availability.copies_moved({pk: ((book_id, from_status), (book_id, to_status))
+                               for book_id, copy_ids in by_book.items() for pk in copy_ids})
+
+
+def reserved_for(borrower, copy_ids):
+    """
+    Returns the ids of the given copies set aside for the borrower.
+    """
+    return set(Hold.objects.filter(borrower=borrower, status='a', copy_id__in=copy_ids)
+               .values_list('copy_id', flat=True))
+
+
+def fulfil(copy_ids):
+    """
+    Closes the holds of the reserved copies just checked out to their borrowers.
+    """
+    return Hold.objects.filter(copy_id__in=copy_ids, status='a').update(status='f')
+
+
+def notify(holds):
+    """
+    Emails the borrowers of the allocated holds, over one connection.
+    """
+    messages = []
+    for hold in holds:
+        if not hold.borrower.email:
+            continue
+        context = {'username': hold.borrower.get_username(), 'title': hold.book.title, 'copy': hold.copy_id}
+        messages.append((NOTIFICATION_SUBJECT.format(**context), NOTIFICATION_MESSAGE.format(**context),
+                         None, [hold.borrower.email]))
+    if messages:
+        send_mass_mail(messages, fail_silently=True)
+    return len(messages)
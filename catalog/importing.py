@@ -0,0 +1,271 @@
+"""
+Bulk catalogue import from CSV or JSON Lines files.
+
+Each record describes one book and, optionally, copies of it:
+
+    isbn, title, author ("Last, First"), summary, language,
+    genres (names separated by ";", or a list in JSON), copies (a number),
+    imprint and status of the copies (default: maintenance).
+
+Instead of ``copies`` and ``status``, a record can give the number of copies
+in each status, in the columns of catalog.exporting named after the Book
+counters (num_copies_available, num_copies_on_loan...), so that an export
+imports with the same copies.
+
+Only ``isbn`` and ``title`` are required. Files are read one line at a time
+and imported in batches, each in its own transaction, so a large file never
+sits in memory and a failed import can simply be run again. Books whose ISBN
+is already in the catalogue (or earlier in the file) are skipped.
+
+Authors, genres and languages are looked up by name in dicts loaded once,
+and the missing ones created per batch. Books, genre links and copies are
+inserted with executemany like catalog.seeding, books with their copy
+counters already set, then the batch is added to the search index. Inserts
+bypass the model signals, so the cached counters are invalidated at the end.
+"""
+import csv
+import json
+import time
+import uuid
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import fragments, search, stats
+from .availability import COUNTER_FIELDS, STATUS_FIELDS, counters
+from .conditional import touch
+from .models import Author, Book, BookInstance, Genre, Language
+from .seeding import chunks, last_pk, insert_rows
+
+
+FORMATS = ('csv', 'jsonl')
+GENRE_SEPARATOR = ';'
+
+MAX_COPIES = 1000
+# Invalid records reported in detail; the others are only counted.
+MAX_ERRORS = 100
+
+
+class ImportFormatError(ValueError):
+    """
+    The file cannot be read at all (unknown format, missing columns...).
+    """
+
+
+def guess_format(filename):
+    name = filename.lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    raise ImportFormatError('Cannot tell the format of "%s": use a .csv or .jsonl file.' % filename)
+
+
+def read_records(stream, format):
+    """
+    Yields (line number, record) from a text stream, a line at a time.
+
+    Lines which are not a JSON object give a None record.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        missing = {'isbn', 'title'} - set(reader.fieldnames or ())
+        if missing:
+            raise ImportFormatError('Missing columns: %s.' % ', '.join(sorted(missing)))
+        for record in reader:
+            yield reader.line_num, record
+    elif format == 'jsonl':
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield number, record if isinstance(record, dict) else None
+    else:
+        raise ImportFormatError('Unknown format "%s".' % format)
+
+
+def _text(record, name, max_length, required=False):
+    value = record.get(name)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise ValueError('No %s.' % name)
+    if len(value) > max_length:
+        raise ValueError('%s is longer than %s characters.' % (name.capitalize(), max_length))
+    return value
+
+
+def clean_record(record):
+    """
+    Returns the record with checked and normalized values, or raises ValueError.
+    """
+    if record is None:
+        raise ValueError('Not a JSON object.')
+
+    author = _text(record, 'author', 201)
+    if author:
+        last_name, _, first_name = author.partition(',')
+        author = (first_name.strip()[:100], last_name.strip()[:100])
+
+    genres = record.get('genres') or []
+    if isinstance(genres, str):
+        genres = genres.split(GENRE_SEPARATOR)
+    genres = {str(name).strip()[:200] for name in genres} - {''}
+
+    # {status: number of copies}
+    by_status = {status: record[field] for status, field in STATUS_FIELDS.items()
+                 if record.get(field) not in (None, '')}
+    if not by_status:
+        status = _text(record, 'status', 1) or BookInstance._meta.get_field('status').default
+        if status not in dict(BookInstance.LOAN_STATUS):
+            raise ValueError('Invalid status "%s".' % status)
+        by_status = {status: record.get('copies') or 0}
+    copies = {}
+    for status, number in by_status.items():
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise ValueError('Invalid number of copies.')
+        if number < 0:
+            raise ValueError('Copies must be between 0 and %s.' % MAX_COPIES)
+        if number:
+            copies[status] = number
+    if sum(copies.values()) > MAX_COPIES:
+        raise ValueError('Copies must be between 0 and %s.' % MAX_COPIES)
+
+    return {
+        'isbn': _text(record, 'isbn', 17, required=True).replace('-', '').replace(' ', '')[:13],
+        'title': _text(record, 'title', 200, required=True),
+        'summary': _text(record, 'summary', 1000),
+        'author': author or None,
+        'language': _text(record, 'language', 100) or None,
+        'genres': sorted(genres),
+        'copies': copies,
+        'imprint': _text(record, 'imprint', 200),
+    }
+
+
+class _Lookup:
+    """
+    Ids of a model's objects by name, creating the missing ones.
+    """
+
+    def __init__(self, model, key_fields):
+        self.model = model
+        self.key_fields = key_fields
+        self.ids = {row[:-1]: row[-1] for row in model.objects.values_list(*key_fields, 'pk')}
+        self.created = set()
+
+    def resolve(self, keys):
+        missing = sorted({key for key in keys if key not in self.ids})
+        if missing:
+            last = last_pk(self.model)
+            if any(field.name == 'updated_at' for field in self.model._meta.fields):
+                now = timezone.now()
+                insert_rows(self.model, self.key_fields + ('updated_at',), [key + (now,) for key in missing],
+                            len(missing))
+            else:
+                insert_rows(self.model, self.key_fields, missing, len(missing))
+            for row in self.model.objects.filter(pk__gt=last).values_list(*self.key_fields, 'pk'):
+                self.ids[row[:-1]] = row[-1]
+                self.created.add(row[-1])
+        return self.ids
+
+
+class CatalogImporter:
+    """
+    Imports batches of (line number, record) and counts what was done in ``result``.
+    """
+
+    def __init__(self):
+        self.authors = _Lookup(Author, ('first_name', 'last_name'))
+        self.genres = _Lookup(Genre, ('name',))
+        self.languages = _Lookup(Language, ('name',))
+        self.isbns = set(Book.objects.values_list('isbn', flat=True))
+        self.result = {'records': 0, 'books': 0, 'copies': 0, 'duplicates': 0, 'invalid': 0, 'errors': []}
+
+    def import_batch(self, batch):
+        result = self.result
+        records = []
+        for line, record in batch:
+            result['records'] += 1
+            try:
+                record = clean_record(record)
+            except ValueError as e:
+                result['invalid'] += 1
+                if len(result['errors']) < MAX_ERRORS:
+                    result['errors'].append((line, str(e)))
+                continue
+            if record['isbn'] in self.isbns:
+                result['duplicates'] += 1
+                continue
+            self.isbns.add(record['isbn'])
+            records.append(record)
+        if records:
+            with transaction.atomic():
+                self._insert(records)
+
+    def _insert(self, records):
+        author_ids = self.authors.resolve(record['author'] for record in records if record['author'])
+        genre_ids = self.genres.resolve((name,) for record in records for name in record['genres'])
+        language_ids = self.languages.resolve((record['language'],) for record in records if record['language'])
+
+        # Raw inserts do not fill auto_now fields.
+        now = timezone.now()
+        last = last_pk(Book)
+        insert_rows(Book, ('title', 'summary', 'isbn', 'author', 'language', 'updated_at') + COUNTER_FIELDS, [
+            (record['title'], record['summary'], record['isbn'],
+             author_ids[record['author']] if record['author'] else None,
+             language_ids[(record['language'],)] if record['language'] else None,
+             now) + tuple(counters(record['copies']).values())
+            for record in records], len(records))
+        book_ids = dict(Book.objects.filter(pk__gt=last).values_list('isbn', 'pk'))
+
+        insert_rows(Book.genre.through, ('book', 'genre'), [
+            (book_ids[record['isbn']], genre_ids[(name,)]) for record in records for name in record['genres']
+        ], len(records))
+
+        copies = [
+            (uuid.uuid4(), book_ids[record['isbn']], record['imprint'], status, now, 0)
+            for record in records for status, number in sorted(record['copies'].items()) for _ in range(number)
+        ]
+        if copies:
+            insert_rows(BookInstance, ('id', 'book', 'imprint', 'status', 'updated_at', 'version'), copies, len(copies),
+                        sort=True)
+
+        search.index_books(book_ids.values())
+
+        # Existing authors' pages now list more books.
+        existing_authors = {author_ids[record['author']] for record in records if record['author']}
+        existing_authors -= self.authors.created
+        fragments.bump(Author, existing_authors)
+        touch(Author, existing_authors)
+
+        self.result['books'] += len(book_ids)
+        self.result['copies'] += len(copies)
+
+
+def import_catalog(records, batch_size=5000, progress=None):
+    """
+    Imports (line number, record) pairs, as read by ``read_records``, and
+    returns counts of the records read, books, copies, authors, genres and
+    languages created, duplicates and invalid records, with the first errors.
+
+    ``progress`` is called with the counts so far and the elapsed seconds
+    after each batch.
+    """
+    importer = CatalogImporter()
+    start = time.perf_counter()
+    try:
+        for batch in chunks(records, batch_size):
+            importer.import_batch(batch)
+            if progress:
+                progress(importer.result, time.perf_counter() - start)
+    finally:
+        # Bulk inserts bypass the signals maintaining the cached counters.
+        stats.invalidate_stats()
+
+    return dict(importer.result, authors=len(importer.authors.created), genres=len(importer.genres.created),
+                languages=len(importer.languages.created), seconds=time.perf_counter() - start)
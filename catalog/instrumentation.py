@@ -0,0 +1,255 @@
+"""
+Per-request instrumentation: latency, SQL queries, template rendering.
+
+InstrumentationMiddleware measures every request and
+
+* adds a ``Server-Timing`` header (total, db and template durations), shown
+  by the browser developer tools;
+* logs one JSON line per request on the ``catalog.instrumentation`` logger
+  (level INFO), and a warning listing the repeated queries when the same SQL
+  ran DUPLICATE_QUERY_THRESHOLD times or more: the signature of an N+1;
+* aggregates the measures per URL name (``books``, ``book-detail``...) for
+  the Prometheus text endpoint metrics_view, when settings.METRICS_ENABLED.
+  The view also exports the hits and misses of every cache (see
+  catalog.caching).
+
+Queries are seen through ``connection.execute_wrapper()``; SQL is grouped on
+its text, which the ORM keeps free of parameter values, with IN lists folded
+so that lists of different lengths count as the same query. Template time is
+measured by the InstrumentedDjangoTemplates backend and covers the queries
+templates run while rendering, e.g. the lazy querysets of the views.
+
+The aggregates live in the process, so each worker exposes its own; the
+Prometheus server sums them.
+"""
+import json
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from . import caching
+
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_QUERY_THRESHOLD = getattr(settings, 'DUPLICATE_QUERY_THRESHOLD', 3)
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+
+_local = threading.local()
+
+
+def current():
+    """
+    Returns the RequestMetrics of the request being handled by this thread, or None.
+    """
+    return getattr(_local, 'metrics', None)
+
+
+class RequestMetrics:
+    """
+    Measures of one request, filled in by the middleware, the query wrapper
+    and the template backend.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.seconds = 0.0
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+        self.signatures = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - start
+            self.queries += 1
+            signature = _IN_LIST.sub('(...)', sql)
+            self.signatures[signature] = self.signatures.get(signature, 0) + 1
+
+    def duplicates(self):
+        """
+        Returns {SQL: count} for the queries repeated DUPLICATE_QUERY_THRESHOLD times or more.
+        """
+        return {sql: count for sql, count in self.signatures.items() if count >= DUPLICATE_QUERY_THRESHOLD}
+
+    def server_timing(self):
+        return 'total;dur={0:.1f}, db;dur={1:.1f};desc="{2} queries", tpl;dur={3:.1f}'.format(
+            self.seconds * 1000, self.sql_seconds * 1000, self.queries, self.template_seconds * 1000)
+
+
+class Aggregates:
+    """
+    Totals per URL name since the process started, for metrics_view.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def add(self, name, metrics, duplicates):
+        with self.lock:
+            view = self.views.get(name)
+            if view is None:
+                view = self.views[name] = {
+                    'requests': 0, 'seconds': 0.0, 'queries': 0, 'sql_seconds': 0.0, 'template_seconds': 0.0,
+                    'duplicate_queries': 0, 'buckets': [0] * len(LATENCY_BUCKETS),
+                }
+            view['requests'] += 1
+            view['seconds'] += metrics.seconds
+            view['queries'] += metrics.queries
+            view['sql_seconds'] += metrics.sql_seconds
+            view['template_seconds'] += metrics.template_seconds
+            view['duplicate_queries'] += sum(duplicates.values())
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if metrics.seconds <= bound:
+                    view['buckets'][index] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {name: dict(view, buckets=list(view['buckets'])) for name, view in self.views.items()}
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+
+aggregates = Aggregates()
+
+
+class InstrumentationMiddleware:
+    """
+    Measures each request (see the module docstring).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = _local.metrics = RequestMetrics()
+        wrappers = [connection.execute_wrapper(metrics) for connection in connections.all()]
+        try:
+            for wrapper in wrappers:
+                wrapper.__enter__()
+            response = self.get_response(request)
+        finally:
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+            _local.metrics = None
+            metrics.seconds = time.perf_counter() - metrics.start
+
+        # Streaming responses are measured up to their first byte.
+        name = request.resolver_match.view_name if request.resolver_match else '<unresolved>'
+        duplicates = metrics.duplicates()
+        response['Server-Timing'] = metrics.server_timing()
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'view': name,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'ms': round(metrics.seconds * 1000, 1),
+                'queries': metrics.queries,
+                'sql_ms': round(metrics.sql_seconds * 1000, 1),
+                'template_ms': round(metrics.template_seconds * 1000, 1),
+                'duplicate_queries': sum(duplicates.values()),
+            }))
+        if duplicates:
+            logger.warning('Repeated queries in %s (%s): %s', name, request.path, json.dumps(duplicates))
+        if getattr(settings, 'METRICS_ENABLED', False):
+            aggregates.add(name, metrics, duplicates)
+        return response
+
+
+class InstrumentedTemplate(Template):
+    """
+    Template timing its rendering into the current RequestMetrics.
+    """
+
+    def render(self, context=None, request=None):
+        metrics = current()
+        if metrics is None:
+            return super().render(context, request)
+        # Templates rendered from templates are already being timed.
+        metrics.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_seconds += time.perf_counter() - start
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, with rendering timed per request.
+    """
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return InstrumentedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def _labels(**labels):
+    return '{%s}' % ','.join('{0}="{1}"'.format(label, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for label, value in sorted(labels.items()))
+
+
+def metrics_view(request):
+    """
+    View function exposing the per-view aggregates in the Prometheus text format.
+    """
+    if not getattr(settings, 'METRICS_ENABLED', False):
+        raise Http404('Metrics are disabled.')
+    views = sorted(aggregates.snapshot().items())
+
+    lines = [
+        '# HELP catalog_request_duration_seconds Time to first byte of the responses.',
+        '# TYPE catalog_request_duration_seconds histogram',
+    ]
+    for name, view in views:
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), view['buckets'] + [view['requests']]):
+            lines.append('catalog_request_duration_seconds_bucket{0} {1}'.format(_labels(view=name, le=bound), count))
+        lines.append('catalog_request_duration_seconds_sum{0} {1}'.format(_labels(view=name), view['seconds']))
+        lines.append('catalog_request_duration_seconds_count{0} {1}'.format(_labels(view=name), view['requests']))
+
+    for metric, key, help_text in (
+            ('catalog_db_queries_total', 'queries', 'SQL queries run.'),
+            ('catalog_db_duration_seconds_total', 'sql_seconds', 'Time spent running SQL.'),
+            ('catalog_template_duration_seconds_total', 'template_seconds', 'Time spent rendering templates.'),
+            ('catalog_duplicate_queries_total', 'duplicate_queries', 'Queries repeated in the same request.')):
+        lines.append('# HELP {0} {1}'.format(metric, help_text))
+        lines.append('# TYPE {0} counter'.format(metric))
+        for name, view in views:
+            lines.append('{0}{1} {2}'.format(metric, _labels(view=name), view[key]))
+
+    cache_stats = sorted(caching.stats.snapshot().items())
+    for metric, key, help_text in (
+            ('catalog_cache_hits_total', 'hits', 'Keys found in the cache.'),
+            ('catalog_cache_misses_total', 'misses', 'Keys missing from the cache.')):
+        lines.append('# HELP {0} {1}'.format(metric, help_text))
+        lines.append('# TYPE {0} counter'.format(metric))
+        for alias, counts in cache_stats:
+            lines.append('{0}{1} {2}'.format(metric, _labels(cache=alias), counts[key]))
+
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,247 @@
+"""
+Background jobs, stored in the database and run by ``manage.py run_worker``.
+
+A job is a registered function run once per key: the nightly overdue sweep
+uses the date as its key, so scheduling it again the same night, from any
+number of workers, finds the existing row (name and key are unique) and does
+nothing. Nothing here runs during a request.
+
+A worker claims the next due job by moving it from pending to running with
+a conditional ``update()``, after reading the candidates with
+``select_for_update(skip_locked=True)``, so only one worker runs each job.
+A job left running by a worker that died is claimed again once its lock is
+older than LOCK_TIMEOUT. Failed jobs are retried up to MAX_ATTEMPTS times,
+waiting RETRY_DELAY longer after each attempt. A job can record its progress
+in ``result`` while it runs (see save_progress()); a retry starts from it.
+"""
+import datetime
+import itertools
+import json
+import logging
+import os
+import socket
+import traceback
+
+from django.core.mail import send_mass_mail
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import BookInstance, Job
+
+
+logger = logging.getLogger(__name__)
+
+LOCK_TIMEOUT = datetime.timedelta(hours=1)
+
+MAX_ATTEMPTS = 3
+
+RETRY_DELAY = datetime.timedelta(minutes=5)
+
+# Registered job functions: name -> function(job) returning a JSON-serializable result.
+JOBS = {}
+
+# Jobs scheduled every night: name -> local time of day.
+DAILY = {
+    'overdue_sweep': datetime.time(2, 0),
+}
+
+
+def job(name):
+    """
+    Decorator registering a job function under ``name``.
+    """
+    def register(func):
+        JOBS[name] = func
+        return func
+    return register
+
+
+def worker_name():
+    return '{0}:{1}'.format(socket.gethostname(), os.getpid())
+
+
+def schedule(name, key='', run_after=None):
+    """
+    Adds a pending run of the job for ``key`` unless there is one already,
+    and returns (job, created).
+    """
+    if name not in JOBS:
+        raise ValueError('Unknown job "%s".' % name)
+    key = str(key)
+    existing = Job.objects.filter(name=name, key=key).first()
+    if existing is not None:
+        return existing, False
+    try:
+        with transaction.atomic():
+            return Job.objects.create(name=name, key=key, run_after=run_after or timezone.now()), True
+    except IntegrityError:
+        # Scheduled by another worker meanwhile.
+        return Job.objects.get(name=name, key=key), False
+
+
+def schedule_daily(now=None):
+    """
+    Schedules today's run of the daily jobs whose time has come.
+    """
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    for name, at in DAILY.items():
+        run_after = timezone.make_aware(datetime.datetime.combine(today, at))
+        if run_after <= now:
+            schedule(name, today.isoformat(), run_after)
+
+
+def claim(worker, now=None):
+    """
+    Locks the next due job for the worker and returns it, or None.
+    """
+    now = now or timezone.now()
+    due = Q(status='p', run_after__lte=now) | Q(status='r', locked_at__lt=now - LOCK_TIMEOUT)
+    with transaction.atomic():
+        candidates = (Job.objects.select_for_update(skip_locked=True).filter(due)
+                      .values_list('pk', 'status', 'locked_at')[:10])
+        for pk, status, locked_at in candidates:
+            # The conditions keep two workers from claiming the same job where rows cannot be locked (SQLite).
+            if Job.objects.filter(pk=pk, status=status, locked_at=locked_at).update(
+                    status='r', locked_by=worker, locked_at=now, attempts=F('attempts') + 1):
+                return Job.objects.get(pk=pk)
+    return None
+
+
+def run(job):
+    """
+    Runs a claimed job and records the outcome; returns whether it succeeded.
+    """
+    mine = Job.objects.filter(pk=job.pk, locked_by=job.locked_by)
+    try:
+        result = JOBS[job.name](job)
+    except Exception:
+        logger.exception('Job %s failed (attempt %s).', job, job.attempts)
+        if job.attempts < MAX_ATTEMPTS:
+            retry = {'status': 'p', 'run_after': timezone.now() + RETRY_DELAY * job.attempts}
+        else:
+            retry = {'status': 'f', 'finished_at': timezone.now()}
+        mine.update(last_error=traceback.format_exc(), locked_by='', locked_at=None, **retry)
+        return False
+    mine.update(status='d', result=json.dumps(result), finished_at=timezone.now(), locked_by='', locked_at=None)
+    return True
+
+
+def save_progress(job, progress):
+    """
+    Records the progress of the running job, kept for its next attempt if it fails.
+    """
+    job.result = json.dumps(progress)
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(result=job.result)
+
+
+def load_progress(job):
+    """
+    Returns the progress recorded by an earlier attempt of the job, or {}.
+    """
+    return json.loads(job.result) if job.result else {}
+
+
+def run_pending(worker=None, limit=None):
+    """
+    Claims and runs due jobs until there are none left (or ``limit`` ran);
+    returns the number of jobs run.
+    """
+    worker = worker or worker_name()
+    count = 0
+    while limit is None or count < limit:
+        job = claim(worker)
+        if job is None:
+            break
+        run(job)
+        count += 1
+    return count
+
+
+# Overdue loans.
+
+# Emails per SMTP connection.
+REMINDER_BATCH_SIZE = 100
+
+REMINDER_SUBJECT = 'Overdue books: please return them to the library'
+REMINDER_MESSAGE = '''Hello {username},
+
+The following books you borrowed are overdue:
+
+{books}
+
+Please return or renew them as soon as possible.
+'''
+
+
+def flag_overdue(today):
+    """
+    Flags the copies on loan past their due date, in one UPDATE, and clears
+    the flag of those no longer overdue. Returns (flagged, cleared).
+
+    Both are writes like any other: a form loaded before the sweep must not
+    save the flag back as it was (see catalog.concurrency).
+    """
+    overdue = Q(status__exact='o', due_back__lt=today)
+    written = {'updated_at': timezone.now(), 'version': F('version') + 1}
+    flagged = BookInstance.objects.filter(overdue, overdue_flagged_on=None).update(overdue_flagged_on=today, **written)
+    cleared = BookInstance.objects.filter(~overdue, overdue_flagged_on__isnull=False).update(
+        overdue_flagged_on=None, **written)
+    return flagged, cleared
+
+
+def send_overdue_reminders(today, batch_size=REMINDER_BATCH_SIZE, after=None, progress=None):
+    """
+    Emails every borrower with flagged copies one reminder listing them all,
+    ``batch_size`` emails per SMTP connection. Returns the number sent.
+
+    Borrowers are emailed in id order, from the first one after the ``after``
+    borrower id if given; ``progress(last borrower id, number sent)`` is
+    called after each batch sent.
+    """
+    copies = (BookInstance.objects.filter(status__exact='o', overdue_flagged_on__isnull=False)
+              .exclude(borrower=None).exclude(borrower__email='')
+              .order_by('borrower_id', 'due_back', 'pk')
+              .values_list('borrower_id', 'borrower__username', 'borrower__email', 'book__title', 'due_back'))
+    if after is not None:
+        copies = copies.filter(borrower_id__gt=after)
+    sent = 0
+    messages = []
+    for (borrower_id, username, email), rows in itertools.groupby(copies.iterator(), key=lambda row: row[:3]):
+        books = '\n'.join('- "{0}", due back on {1} ({2} days ago)'.format(title, due_back, (today - due_back).days)
+                          for _, _, _, title, due_back in rows)
+        messages.append((REMINDER_SUBJECT, REMINDER_MESSAGE.format(username=username, books=books), None, [email]))
+        if len(messages) >= batch_size:
+            sent += send_mass_mail(messages)
+            messages = []
+            if progress is not None:
+                progress(borrower_id, sent)
+    if messages:
+        sent += send_mass_mail(messages)
+        if progress is not None:
+            progress(borrower_id, sent)
+    return sent
+
+
+@job('overdue_sweep')
+def overdue_sweep(job):
+    today = datetime.date.fromisoformat(job.key) if job.key else timezone.localdate()
+    flagged, cleared = flag_overdue(today)
+    # Reminders are a job of their own, so a failed email batch does not sweep again.
+    schedule('overdue_reminders', job.key)
+    return {'flagged': flagged, 'cleared': cleared}
+
+
+@job('overdue_reminders')
+def overdue_reminders(job):
+    today = datetime.date.fromisoformat(job.key) if job.key else timezone.localdate()
+    # A retry skips the borrowers already emailed by the batches sent before the failure.
+    done = load_progress(job)
+    sent_before = done.get('sent', 0)
+
+    def progress(last_borrower, sent):
+        save_progress(job, {'sent': sent_before + sent, 'last_borrower': last_borrower})
+
+    sent = send_overdue_reminders(today, REMINDER_BATCH_SIZE, done.get('last_borrower'), progress)
+    return {'sent': sent_before + sent}
@@ -0,0 +1,109 @@
+"""
+Reports EXPLAIN plans and timings of the catalog hot queries with and
+without the indexes added for them.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from catalog.models import Author, Book, BookInstance
+from catalog.pagination import CursorPaginator
+from catalog.seeding import seed_library
+from catalog import views
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Runs the loan and list queries against a generated dataset and reports their '
+            'EXPLAIN plans and timings with and without the catalog indexes. '
+            'Everything happens in a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--copies', type=int, default=1000000,
+                            help='Number of book copies the dataset should have (default 1000000).')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Number of runs per query; the best time is reported (default 5).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the generated data.')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.generate(options['copies'], options['seed'])
+                queries = self.hot_queries()
+
+                self.stdout.write(self.style.MIGRATE_HEADING('With indexes'))
+                after = self.run_queries(queries, options['repeat'], 'with indexes')
+
+                self.drop_indexes()
+                self.stdout.write(self.style.MIGRATE_HEADING('Without indexes'))
+                before = self.run_queries(queries, options['repeat'], 'without indexes')
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Summary (best of %s runs)' % options['repeat']))
+        for name, _ in queries:
+            self.stdout.write('%-24s %10.2f ms -> %10.2f ms' % (name, before[name], after[name]))
+
+    def generate(self, copies, seed):
+        """
+        Tops the current data up to ``copies`` book copies.
+        """
+        missing = copies - BookInstance.objects.count()
+        if missing <= 0:
+            return
+        self.stdout.write('Generating %s copies...' % missing)
+        seed_library(authors=max(1, missing // 200), books=max(1, missing // 20), copies=missing,
+                     borrowers=100, seed=seed)
+
+    def hot_queries(self):
+        """
+        Returns (name, queryset) pairs of the first page queries of the catalog list views.
+        """
+        borrower = BookInstance.objects.filter(status__exact='o').values_list('borrower', flat=True).first()
+        paginators = (
+            ('all-borrowed', BookInstance.objects.filter(status__exact='o'), views.AllLoanedBooksByUserListView),
+            ('my-borrowed', BookInstance.objects.filter(borrower=borrower, status__exact='o'),
+             views.LoanedBooksByUserListView),
+            ('books', Book.objects.all(), views.BookListView),
+            ('authors', Author.objects.all(), views.AuthorListView),
+        )
+        queries = []
+        for name, queryset, view in paginators:
+            paginator = CursorPaginator(queryset, view.paginate_by, view.cursor_ordering)
+            queries.append((name, paginator.page_queryset()[0]))
+        return queries
+
+    def explain(self, queryset, label):
+        # The label keeps SQLite from reusing a statement (and its stale plan)
+        # prepared before the indexes were dropped.
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('{0} {1} /* {2} */'.format(connection.ops.explain_query_prefix(), sql, label), params)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+    def run_queries(self, queries, repeat, label):
+        timings = {}
+        for name, queryset in queries:
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(queryset.all())
+                elapsed = (time.perf_counter() - start) * 1000
+                best = elapsed if best is None else min(best, elapsed)
+            timings[name] = best
+            self.stdout.write(self.style.SQL_TABLE(name))
+            self.stdout.write(self.explain(queryset, label))
+            self.stdout.write('%.2f ms\n' % best)
+        return timings
+
+    def drop_indexes(self):
+        schema_editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for model in (Book, BookInstance, Author):
+                for index in model._meta.indexes:
+                    cursor.execute(str(index.remove_sql(model, schema_editor)))
@@ -0,0 +1,40 @@
+"""
+Streams the whole catalogue to a CSV or JSON Lines file (see catalog.exporting).
+"""
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.exporting import encode, export_lines
+from catalog.importing import FORMATS
+
+
+class Command(BaseCommand):
+    help = 'Exports every book with its author, language, genres and copy counts, in constant memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help='File to write, or - for standard output.')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Default: from the output file extension (.csv, .jsonl, optionally .gz), else csv.')
+        parser.add_argument('--gzip', action='store_true', help='Compress; implied by an output file ending in .gz.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Books read per round trip.')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        compress = options['gzip'] or output.endswith('.gz')
+        format = options['format'] or ('jsonl' if output.replace('.gz', '').endswith('.jsonl') else 'csv')
+
+        start = time.perf_counter()
+        size = 0
+        stream = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        try:
+            for data in encode(export_lines(format, chunk_size=options['chunk_size']), compress=compress):
+                stream.write(data)
+                size += len(data)
+        finally:
+            if output != '-':
+                stream.close()
+        if output != '-':
+            self.stdout.write(self.style.SUCCESS('Wrote %s bytes to %s in %.1f s.' % (
+                size, output, time.perf_counter() - start)))
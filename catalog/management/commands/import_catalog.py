@@ -0,0 +1,44 @@
+"""
+Imports books and copies from a CSV or JSON Lines file (see catalog.importing).
+"""
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.importing import FORMATS, ImportFormatError, guess_format, import_catalog, read_records
+
+
+class Command(BaseCommand):
+    help = 'Streams books, their authors, genres, languages and copies from a CSV or JSONL file into the catalog.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, or - for standard input (then give --format).')
+        parser.add_argument('--format', choices=FORMATS, help='Default: guessed from the file extension.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Records per transaction.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            format = options['format'] or guess_format(path)
+            if path == '-':
+                result = self.run(sys.stdin, format, options['batch_size'])
+            else:
+                with open(path, encoding='utf-8-sig', newline='') as stream:
+                    result = self.run(stream, format, options['batch_size'])
+        except (ImportFormatError, OSError) as e:
+            raise CommandError(e)
+
+        for line, error in result['errors']:
+            self.stderr.write('Line %s: %s' % (line, error))
+        self.stdout.write(self.style.SUCCESS(
+            'Imported %(books)s books and %(copies)s copies from %(records)s records in %(seconds).1f s '
+            '(%(authors)s new authors, %(genres)s genres, %(languages)s languages; '
+            '%(duplicates)s duplicates and %(invalid)s invalid records skipped).' % result))
+
+    def run(self, stream, format, batch_size):
+        return import_catalog(read_records(stream, format), batch_size=batch_size, progress=self.report)
+
+    def report(self, result, seconds):
+        self.stdout.write('%10s records %10s books %10s copies %6.2f s (%.0f records/s)' % (
+            result['records'], result['books'], result['copies'], seconds,
+            result['records'] / seconds if seconds else 0))
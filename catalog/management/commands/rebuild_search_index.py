@@ -0,0 +1,20 @@
+"""
+Rebuilds the full-text search index of the catalogue.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog import search
+
+
+class Command(BaseCommand):
+    help = 'Drops and rebuilds the book full-text search index (e.g. after bulk loads).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=900)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = search.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Indexed %s books in %.1f s.' % (count, time.perf_counter() - start)))
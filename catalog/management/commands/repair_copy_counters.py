@@ -0,0 +1,21 @@
+"""
+Recounts the copies of every book and fixes the stored counters (see catalog.availability).
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog import availability
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the per-book copy counters from the copies, e.g. after raw SQL changes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=900)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        fixed = availability.recompute(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Fixed the counters of %s books in %.1f s.' % (
+            fixed, time.perf_counter() - start)))
@@ -0,0 +1,58 @@
+"""
+Benchmarks every catalog URL against budgets and reports the results.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from catalog import stats
+from catalog.benchmarks import runner
+from catalog.seeding import seed_library
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Measures wall time, query count, SQL time and rows fetched of every catalog URL '
+            'and compares them with catalog/benchmarks/budgets.json. Runs in a transaction '
+            'that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Measured requests per URL (default 5).')
+        parser.add_argument('--seed-copies', type=int, default=0,
+                            help='Seed this many extra copies (and proportional books/authors) first.')
+        parser.add_argument('--budgets', default=runner.BUDGETS_PATH, help='Path of the budgets JSON file.')
+        parser.add_argument('--format', choices=('markdown', 'json'), default='markdown')
+        parser.add_argument('--output', help='Write the report to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        budgets = runner.load_budgets(options['budgets'])
+        try:
+            with transaction.atomic():
+                copies = options['seed_copies']
+                if copies:
+                    seed_library(authors=max(1, copies // 200), books=max(1, copies // 20), copies=copies)
+                report = runner.run(repeat=options['repeat'], budgets=budgets)
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            # Counters may have been cached from the rolled back data.
+            stats.invalidate_stats()
+
+        if options['format'] == 'json':
+            output = json.dumps(report, indent=2)
+        else:
+            output = runner.to_markdown(report)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
+
+        if report['failed']:
+            raise CommandError('Over budget: %s' % ', '.join(report['failed']))
@@ -0,0 +1,25 @@
+"""
+Runs the stand-in memcached server of catalog.cache_server, for CACHE_URL=memcached://127.0.0.1:11211.
+"""
+from django.core.management.base import BaseCommand
+
+from catalog.cache_server import MemcachedServer
+
+
+class Command(BaseCommand):
+    help = 'Runs an in-process memcached stand-in (text protocol) until interrupted. For development only.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Address to listen on.')
+        parser.add_argument('--port', type=int, default=11211, help='Port to listen on.')
+
+    def handle(self, *args, **options):
+        server = MemcachedServer((options['host'], options['port']))
+        host, port = server.server_address[:2]
+        self.stdout.write('Memcached stand-in listening on %s:%s.' % (host, port))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped.')
+        finally:
+            server.server_close()
@@ -0,0 +1,32 @@
+"""
+Runs the background jobs of catalog.jobs: the nightly overdue sweep and reminders.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog import jobs
+
+
+class Command(BaseCommand):
+    help = 'Schedules the daily jobs and runs due jobs, polling the database until interrupted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the due jobs, then exit.')
+        parser.add_argument('--interval', type=float, default=30, help='Seconds between polls.')
+        parser.add_argument('--worker', default=None, help='Name recorded on the jobs (default: host:pid).')
+
+    def handle(self, *args, **options):
+        worker = options['worker'] or jobs.worker_name()
+        self.stdout.write('Worker %s: jobs %s.' % (worker, ', '.join(sorted(jobs.JOBS))))
+        try:
+            while True:
+                jobs.schedule_daily()
+                count = jobs.run_pending(worker)
+                if count:
+                    self.stdout.write(self.style.SUCCESS('Ran %s jobs.' % count))
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped.')
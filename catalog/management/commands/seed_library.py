@@ -0,0 +1,36 @@
+"""
+Populates the catalog with synthetic data for load and scaling tests.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.seeding import seed_library
+
+
+class Command(BaseCommand):
+    help = 'Bulk creates deterministic synthetic authors, books, genres, languages, copies and borrowers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=100)
+        parser.add_argument('--books', type=int, default=1000)
+        parser.add_argument('--genres', type=int, default=8)
+        parser.add_argument('--languages', type=int, default=8)
+        parser.add_argument('--copies', type=int, default=10000)
+        parser.add_argument('--borrowers', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data.')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows per bulk_create call.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        created = seed_library(
+            authors=options['authors'], books=options['books'], genres=options['genres'],
+            languages=options['languages'], copies=options['copies'], borrowers=options['borrowers'],
+            seed=options['seed'], batch_size=options['batch_size'], progress=self.report,
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS('Created %s in %.1f s.' % (
+            ', '.join('%s %s' % (count, name) for name, count in created.items()), elapsed)))
+
+    def report(self, name, count, seconds):
+        self.stdout.write('%10s %-12s %6.2f s (%.0f rows/s)' % (count, name, seconds, count / seconds if seconds else 0))
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from catalog import search
+
+    # Creates the index and fills it with the books that already exist.
+    search.rebuild_index(book_model=apps.get_model('catalog', 'Book'))
+
+
+def drop_search_index(apps, schema_editor):
+    from catalog import search
+
+    with schema_editor.connection.cursor() as cursor:
+        search.get_backend(schema_editor.connection.vendor).drop_index(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_loan_and_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.2 on 2026-10-17 06:39
+
+from django.db import migrations, models
+
+
+def count_copies(apps, schema_editor):
+    from catalog import availability
+
+    availability.recompute(book_model=apps.get_model('catalog', 'Book'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='num_copies',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='num_copies_available',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='num_copies_maintenance',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='num_copies_on_loan',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='num_copies_reserved',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_copies, migrations.RunPython.noop),
+    ]
@@ -46,10 +46,43 @@ class Book(models.Model):
     genre = models.ManyToManyField(Genre, help_text="Select a genre for this book")
     language = models.ForeignKey(Language, on_delete=models.SET_NULL, null=True,
                                       help_text="Select a lang for this book")
+    # Last change, for conditional GETs (see catalog.conditional).
+    updated_at = models.DateTimeField(auto_now=True)
+    # Copies of the book, in total and by status, maintained by catalog.availability.
+    num_copies = models.PositiveIntegerField(default=0, editable=False)
+    num_copies_available = models.PositiveIntegerField(default=0, editable=False)
+    num_copies_on_loan = models.PositiveIntegerField(default=0, editable=False)
+    num_copies_reserved = models.PositiveIntegerField(default=0, editable=False)
+    num_copies_maintenance = models.PositiveIntegerField(default=0, editable=False)
 
     # ManyToManyField used because genre can contain many books. Books can cover many genres.
     # Genre class has already been defined so we can specify the object above.
 
+    class Meta:
+        indexes = [
+            # Book list ordering (see BookListView.cursor_ordering).
+            models.Index(fields=['title', 'id'], name='catalog_book_title_idx'),
+        ]
+
+    # Written only by the F() updates of catalog.availability, never by save().
+    # Total first, then one counter per status (see availability.STATUS_FIELDS).
+    COUNTER_FIELDS = ('num_copies', 'num_copies_available', 'num_copies_on_loan', 'num_copies_reserved',
+                      'num_copies_maintenance')
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the book without its copy counters, unless they are named in
+        ``update_fields``: those loaded with the book may be out of date by
+        now, and writing them back would undo concurrent changes.
+        """
+        if not self._state.adding and self.pk is not None and kwargs.get('update_fields') is None \
+                and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.COUNTER_FIELDS
+                                       and field.attname not in deferred]
+        super().save(*args, **kwargs)
+
     def display_genre(self):
         """
         Creates a string for the Genre. This is required to display genre in Admin.
@@ -90,18 +123,63 @@ class BookInstance(models.Model):
     )
 
     status = models.CharField(max_length=1, choices=LOAN_STATUS, blank=True, default='m', help_text='Book availability')
+    updated_at = models.DateTimeField(auto_now=True)
+    # Incremented by every write, for optimistic concurrency (see catalog.concurrency).
+    version = models.PositiveIntegerField(default=0, editable=False)
+    # Set by the nightly overdue sweep (see catalog.jobs), cleared once the copy is back or renewed.
+    # The loan lists show it instead of working out is_overdue per row.
+    overdue_flagged_on = models.DateField(null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ["due_back"]
 
         permissions = (("can_mark_returned", "Set book as returned"),)
 
+        indexes = [
+            # Loan lists: status filter, then keyset ordering on (due_back, id).
+            models.Index(fields=['status', 'due_back', 'id'], name='catalog_bi_status_due_idx'),
+            models.Index(fields=['borrower', 'status', 'due_back', 'id'], name='catalog_bi_borrower_due_idx'),
+        ]
+
     @property
     def is_overdue(self):
         if self.due_back and date.today() > self.due_back:
             return True
         return False
 
+    def save(self, *args, **kwargs):
+        """
+        Saves the copy as a new version, so concurrent optimistic writers notice the change.
+
+        An existing copy is only written if it is still at the version it was
+        loaded with; otherwise catalog.concurrency.ConflictError is raised.
+        """
+        self._saved_version = None if self._state.adding else self.version
+        self.version += 1
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'version' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['version']
+        try:
+            super().save(*args, **kwargs)
+        except Exception:
+            self.version -= 1
+            raise
+        finally:
+            self._saved_version = None
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        # The UPDATE of save() also requires the version the copy was loaded with.
+        version = getattr(self, '_saved_version', None)
+        if version is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        if super()._do_update(base_qs.filter(version=version), using, pk_val, values, update_fields, forced_update):
+            return True
+        if base_qs.filter(pk=pk_val).exists():
+            from .concurrency import ConflictError
+            raise ConflictError('This copy has been changed since you loaded it.')
+        # Deleted meanwhile: save() inserts it again, as it always has.
+        return False
+
     def __str__(self):
         """
         String for representing the Model object
@@ -117,6 +195,13 @@ class Author(models.Model):
     last_name = models.CharField(max_length=100)
     date_of_birth = models.DateField(null=True, blank=True)
     date_of_death = models.DateField('died', null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Author list ordering (see AuthorListView.cursor_ordering).
+            models.Index(fields=['last_name', 'first_name', 'id'], name='catalog_author_name_idx'),
+        ]
 
     def get_absolute_url(self):
         """
@@ -130,3 +215,105 @@ class Author(models.Model):
         """
         return '{0}, {1}'.format(self.last_name, self.first_name)
 
+
+
+class Hold(models.Model):
+    """
+    Model representing a borrower's place in the queue for a book (see catalog.holds).
+    """
+    book = models.ForeignKey('Book', on_delete=models.CASCADE)
+    borrower = models.ForeignKey(User, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    HOLD_STATUS = (
+        ('w', 'Waiting'),
+        ('a', 'Allocated'),
+        ('f', 'Fulfilled'),
+        ('c', 'Cancelled'),
+    )
+
+    status = models.CharField(max_length=1, choices=HOLD_STATUS, default='w')
+    # The copy set aside (Reserved) for the borrower once the hold reaches the head of the queue.
+    copy = models.ForeignKey('BookInstance', on_delete=models.SET_NULL, null=True, blank=True)
+    allocated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+
+        indexes = [
+            # Head of each book's queue: waiting holds, oldest first.
+            models.Index(fields=['book', 'status', 'created_at', 'id'], name='catalog_hold_queue_idx'),
+        ]
+        constraints = [
+            # One open hold per borrower and book.
+            models.UniqueConstraint(fields=['book', 'borrower'], condition=models.Q(status__in=['w', 'a']),
+                                    name='catalog_hold_one_open'),
+            # A copy is set aside for one hold at a time.
+            models.UniqueConstraint(fields=['copy'], condition=models.Q(status='a'), name='catalog_hold_one_per_copy'),
+        ]
+
+    def __str__(self):
+        """
+        String for representing the Model object.
+        """
+        return '{0} for {1} ({2})'.format(self.book, self.borrower, self.get_status_display())
+
+
+class Job(models.Model):
+    """
+    Model representing one run of a background job (see catalog.jobs).
+    """
+    name = models.CharField(max_length=100)
+    # The job runs once per key, e.g. once per date for a daily job.
+    key = models.CharField(max_length=100, blank=True)
+
+    JOB_STATUS = (
+        ('p', 'Pending'),
+        ('r', 'Running'),
+        ('d', 'Done'),
+        ('f', 'Failed'),
+    )
+
+    status = models.CharField(max_length=1, choices=JOB_STATUS, default='p')
+    run_after = models.DateTimeField()
+    attempts = models.PositiveIntegerField(default=0)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    result = models.TextField(blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['run_after', 'id']
+
+        indexes = [
+            # Workers look for the next due job.
+            models.Index(fields=['status', 'run_after'], name='catalog_job_due_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'key'], name='catalog_job_once_per_key'),
+        ]
+
+    def __str__(self):
+        """
+        String for representing the Model object.
+        """
+        return '{0} [{1}] ({2})'.format(self.name, self.key, self.get_status_display())
+
+
+class VisitCount(models.Model):
+    """
+    Model representing the home page visits of one visitor (see catalog.visits).
+    """
+    # Identifier kept in the visitor's signed cookie.
+    visitor = models.CharField(max_length=32, unique=True)
+    # The row is created by the visitor's second visit, counting the first one too.
+    count = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """
+        String for representing the Model object.
+        """
+        return '{0} ({1} visits)'.format(self.visitor, self.count)
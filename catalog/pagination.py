@@ -0,0 +1,259 @@
+"""
+Keyset (cursor) pagination for list views.
+
+Offset pagination needs a full ``COUNT(*)`` and an ``OFFSET n`` scan that gets
+slower the deeper the page. Keyset pagination instead remembers the ordering
+key of the last row shown and asks for rows strictly after it, which an index
+on the ordering key answers in constant time for any page.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+def estimate_count(queryset, exact_below=0):
+    """
+    Returns a cheap estimate of the number of rows matched by the queryset.
+
+    PostgreSQL reports its planner estimate through EXPLAIN; other databases
+    have no such estimate, so the exact count is used there. Estimates under
+    ``exact_below`` rows are replaced by the exact count, which is cheap then.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimate = int(plan[0]['Plan']['Plan Rows'])
+    return queryset.count() if estimate < exact_below else estimate
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Offset paginator counting with estimate_count(), for the admin changelists
+    of large tables: ``COUNT(*)`` over millions of rows takes seconds, while
+    page links only need the order of magnitude.
+
+    An estimate above the real number of rows gives page links past the end:
+    such a page is empty, so page() counts the rows exactly and returns the
+    last page instead.
+    """
+    exact_below = 10000
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return len(self.object_list)
+        return estimate_count(self.object_list, exact_below=self.exact_below)
+
+    def page(self, number):
+        page = super().page(number)
+        if len(page) or page.number == 1:
+            return page
+        # Past the end: the estimate was too high.
+        self.__dict__['count'] = self.object_list.count()
+        self.__dict__.pop('num_pages', None)
+        return super().page(self.num_pages)
+
+
+class CursorPage:
+    """
+    A page of results, exposing the subset of the Page API the templates use.
+    """
+
+    def __init__(self, object_list, next_url=None, previous_url=None, approximate_total=None):
+        self.object_list = object_list
+        self.next_url = next_url
+        self.previous_url = previous_url
+        self.approximate_total = approximate_total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_url is not None
+
+    def has_previous(self):
+        return self.previous_url is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginates a queryset on ``ordering``, a sequence of model field names
+    (prefixed with '-' for descending order) whose last item is unique.
+
+    NULL values are placed where the database sorts them natively (last in
+    ascending order on PostgreSQL, first on SQLite), so that an index on the
+    ordering key can serve the query.
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.model = queryset.model
+        self.keys = []
+        for name in ordering:
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            field = self.model._meta.pk if name == 'pk' else self.model._meta.get_field(name)
+            self.keys.append((field, descending))
+
+    def encode_cursor(self, obj, backwards=False):
+        values = [field.value_to_string(obj) if getattr(obj, field.attname) is not None else None
+                  for field, _ in self.keys]
+        payload = json.dumps({'k': values, 'b': backwards}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """
+        Returns (key values, backwards) encoded in the cursor, or raises ValueError.
+        """
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+            values = payload['k']
+            if len(values) != len(self.keys):
+                raise ValueError('Cursor does not match the ordering.')
+            values = [None if value is None else field.to_python(value)
+                      for (field, _), value in zip(self.keys, values)]
+            return values, bool(payload['b'])
+        except (TypeError, KeyError, ValueError, ValidationError) as e:
+            raise ValueError('Invalid cursor.') from e
+
+    def _ordering(self, backwards):
+        # Native NULL placement keeps the ordering answerable by a plain index.
+        ordering = []
+        for field, descending in self.keys:
+            ordering.append(('-' if descending != backwards else '') + field.attname)
+        return ordering
+
+    def _nulls_first(self, field, descending):
+        """
+        Whether NULLs of the field come first when reading forwards.
+        """
+        return connections[self.queryset.db].features.nulls_order_largest == descending
+
+    def _after(self, field, descending, value, backwards):
+        """
+        Filter matching values of one key field that come after ``value``
+        in the direction being read.
+        """
+        name = field.attname
+        nulls_first = self._nulls_first(field, descending)
+        if backwards:
+            nulls_first = not nulls_first
+            descending = not descending
+
+        if value is None:
+            return Q(**{name + '__isnull': False}) if nulls_first else Q(pk__in=[])
+        condition = Q(**{name + ('__lt' if descending else '__gt'): value})
+        if field.null and not nulls_first:
+            condition |= Q(**{name + '__isnull': True})
+        return condition
+
+    def _seek(self, values, backwards):
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (field, descending), value in zip(self.keys, values):
+            condition |= equal & self._after(field, descending, value, backwards)
+            if value is None:
+                equal &= Q(**{field.attname + '__isnull': True})
+            else:
+                equal &= Q(**{field.attname: value})
+        return condition
+
+    def page_queryset(self, cursor=None):
+        """
+        Returns (queryset, backwards) fetching the page at ``cursor`` plus one
+        extra row telling whether there is more to read.
+        """
+        backwards = False
+        queryset = self.queryset
+        if cursor:
+            values, backwards = self.decode_cursor(cursor)
+            queryset = queryset.filter(self._seek(values, backwards))
+        return queryset.order_by(*self._ordering(backwards))[:self.per_page + 1], backwards
+
+    def page(self, cursor=None):
+        """
+        Returns (rows, has_next, has_previous) for the page at ``cursor``.
+        """
+        queryset, backwards = self.page_queryset(cursor)
+        rows = list(queryset)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if backwards:
+            rows.reverse()
+            return rows, True, has_more
+        return rows, has_more, bool(cursor)
+
+
+class CursorPaginationMixin:
+    """
+    ListView mixin replacing offset pagination with keyset pagination.
+
+    Set ``cursor_ordering`` to the ordering key (its last field must be
+    unique) and ``paginate_by`` as usual. The page object offers
+    ``next_url``/``previous_url`` with opaque cursor tokens, and
+    ``approximate_total`` when ``cursor_approximate_total`` is set.
+    """
+    cursor_ordering = ('pk',)
+    cursor_query_param = 'cursor'
+    cursor_approximate_total = False
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(queryset, page_size, self.cursor_ordering)
+        cursor = self.request.GET.get(self.cursor_query_param)
+        try:
+            rows, has_next, has_previous = paginator.page(cursor)
+        except ValueError:
+            raise Http404('Invalid cursor.')
+
+        next_url = previous_url = None
+        if has_next:
+            next_url = self._cursor_url(paginator.encode_cursor(rows[-1]))
+        if has_previous:
+            previous_url = self._cursor_url(paginator.encode_cursor(rows[0], backwards=True) if rows else None)
+
+        approximate_total = estimate_count(queryset) if self.cursor_approximate_total else None
+        page = CursorPage(rows, next_url, previous_url, approximate_total)
+        return None, page, rows, page.has_other_pages()
+
+    def get_page_queryset(self):
+        """
+        Returns the unevaluated queryset of the requested page (with its extra
+        row), or None when the cursor is invalid.
+        """
+        queryset = self.get_queryset()
+        paginator = CursorPaginator(queryset, self.get_paginate_by(queryset), self.cursor_ordering)
+        try:
+            return paginator.page_queryset(self.request.GET.get(self.cursor_query_param))[0]
+        except ValueError:
+            return None
+
+    def _cursor_url(self, cursor):
+        query = self.request.GET.copy()
+        query.pop(self.cursor_query_param, None)
+        if cursor:
+            query[self.cursor_query_param] = cursor
+        return '{0}?{1}'.format(self.request.path, query.urlencode())
@@ -0,0 +1,204 @@
+"""
+Full-text search over the catalogue.
+
+Each book is indexed as one document made of its title, summary, author
+name and genre names. The index lives next to the catalog tables:
+
+* SQLite: an FTS5 virtual table ranked with bm25();
+* PostgreSQL: a table of weighted tsvectors with a GIN index, ranked with ts_rank();
+* other databases: no index, a plain ``icontains`` scan ordered by title.
+
+catalog.signals keeps the index in sync with the models; bulk writes that
+bypass signals should call index_books() or rebuild_index().
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import Book
+
+
+TABLE = 'catalog_book_fts'
+
+# Column weights: a match in the title counts most, then author, genres and summary.
+WEIGHTS = (('title', 10.0, 'A'), ('author', 5.0, 'B'), ('genres', 3.0, 'B'), ('summary', 1.0, 'C'))
+
+MAX_TERMS = 10
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(query):
+    """
+    Splits the user query into at most MAX_TERMS lower-cased words.
+    """
+    return [term.lower() for term in _TERM_RE.findall(query or '')][:MAX_TERMS]
+
+
+def documents(book_ids, book_model=Book):
+    """
+    Yields (book id, title, author, genres, summary) for the given books.
+
+    Rows are read with two values_list() queries, without building model
+    instances. ``book_model`` lets migrations pass their historical Book model.
+    """
+    genres = {}
+    links = book_model.genre.through.objects.filter(book_id__in=book_ids)
+    for book_id, name in links.values_list('book_id', 'genre__name'):
+        genres.setdefault(book_id, []).append(name)
+
+    books = book_model.objects.filter(pk__in=book_ids).values_list(
+        'pk', 'title', 'summary', 'author__first_name', 'author__last_name')
+    for pk, title, summary, first_name, last_name in books:
+        author = '{0} {1}'.format(first_name, last_name) if first_name is not None else ''
+        yield pk, title, author, ' '.join(genres.get(pk, ())), summary
+
+
+class SQLiteBackend:
+
+    def create_index(self, cursor):
+        cursor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS {0} USING fts5({1}, tokenize="unicode61")'.format(
+                TABLE, ', '.join(name for name, _, _ in WEIGHTS)))
+
+    def drop_index(self, cursor):
+        cursor.execute('DROP TABLE IF EXISTS {0}'.format(TABLE))
+
+    def clear(self, cursor):
+        cursor.execute('DELETE FROM {0}'.format(TABLE))
+
+    def remove(self, cursor, book_ids):
+        cursor.executemany('DELETE FROM {0} WHERE rowid = %s'.format(TABLE), [[pk] for pk in book_ids])
+
+    def add(self, cursor, rows):
+        cursor.executemany('INSERT INTO {0} (rowid, title, author, genres, summary) VALUES (%s, %s, %s, %s, %s)'.format(
+            TABLE), rows)
+
+    def search(self, cursor, terms, limit, offset):
+        # Every term is quoted (so it cannot be FTS syntax) and matched as a prefix.
+        match = ' '.join('"{0}"*'.format(term.replace('"', '""')) for term in terms)
+        cursor.execute(
+            'SELECT rowid FROM {0} WHERE {0} MATCH %s ORDER BY bm25({0}, {1}) LIMIT %s OFFSET %s'.format(
+                TABLE, ', '.join(str(weight) for _, weight, _ in WEIGHTS)),
+            [match, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostgreSQLBackend:
+    config = 'simple'
+
+    def create_index(self, cursor):
+        cursor.execute(
+            'CREATE TABLE IF NOT EXISTS {0} ('
+            'book_id integer PRIMARY KEY REFERENCES catalog_book (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)'.format(TABLE))
+        cursor.execute('CREATE INDEX IF NOT EXISTS {0}_document_idx ON {0} USING gin (document)'.format(TABLE))
+
+    def drop_index(self, cursor):
+        cursor.execute('DROP TABLE IF EXISTS {0}'.format(TABLE))
+
+    def clear(self, cursor):
+        cursor.execute('TRUNCATE {0}'.format(TABLE))
+
+    def remove(self, cursor, book_ids):
+        cursor.execute('DELETE FROM {0} WHERE book_id = ANY(%s)'.format(TABLE), [list(book_ids)])
+
+    def add(self, cursor, rows):
+        document = ' || '.join(
+            "setweight(to_tsvector('{0}', %s), '{1}')".format(self.config, letter) for _, _, letter in WEIGHTS)
+        cursor.executemany('INSERT INTO {0} (book_id, document) VALUES (%s, {1})'.format(TABLE, document), rows)
+
+    def search(self, cursor, terms, limit, offset):
+        query = ' & '.join("'{0}':*".format(term.replace("'", "''")) for term in terms)
+        cursor.execute(
+            'SELECT book_id FROM {0}, to_tsquery(%s, %s) query WHERE document @@ query '
+            'ORDER BY ts_rank(document, query) DESC, book_id LIMIT %s OFFSET %s'.format(TABLE),
+            [self.config, query, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+class FallbackBackend:
+    """
+    Unindexed search for databases without a full-text backend here.
+    """
+
+    def create_index(self, cursor):
+        pass
+
+    drop_index = clear = create_index
+
+    def remove(self, cursor, book_ids):
+        pass
+
+    def add(self, cursor, rows):
+        pass
+
+    def search(self, cursor, terms, limit, offset):
+        condition = Q()
+        for term in terms:
+            condition &= (Q(title__icontains=term) | Q(summary__icontains=term) | Q(author__first_name__icontains=term)
+                          | Q(author__last_name__icontains=term) | Q(genre__name__icontains=term))
+        books = Book.objects.filter(condition).order_by('title', 'pk').values_list('pk', flat=True).distinct()
+        return list(books[offset:offset + limit])
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'postgresql': PostgreSQLBackend,
+}
+
+
+def get_backend(vendor=None):
+    return BACKENDS.get(vendor or connection.vendor, FallbackBackend)()
+
+
+def index_books(book_ids):
+    """
+    (Re)indexes the given books; ids of deleted books are just removed.
+    """
+    book_ids = list(book_ids)
+    backend = get_backend()
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Batches keep the IN (...) lists under the SQLite parameter limit (999).
+        for start in range(0, len(book_ids), 900):
+            batch = book_ids[start:start + 900]
+            backend.remove(cursor, batch)
+            backend.add(cursor, list(documents(batch)))
+
+
+def remove_books(book_ids):
+    book_ids = list(book_ids)
+    if book_ids:
+        with transaction.atomic(), connection.cursor() as cursor:
+            get_backend().remove(cursor, book_ids)
+
+
+def rebuild_index(batch_size=900, book_model=Book):
+    """
+    Reindexes every book, in batches; returns the number of books indexed.
+    """
+    backend = get_backend()
+    count = 0
+    last = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        backend.create_index(cursor)
+        backend.clear(cursor)
+        while True:
+            batch = list(book_model.objects.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return count
+            backend.add(cursor, list(documents(batch, book_model)))
+            count += len(batch)
+            last = batch[-1]
+
+
+def search_books(query, limit=20, offset=0):
+    """
+    Returns the ids of the books matching every word of the query, best match first.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    with connection.cursor() as cursor:
+        return get_backend().search(cursor, terms, limit, offset)
@@ -0,0 +1,204 @@
+"""
+Synthetic catalog data for load and scaling tests.
+
+Rows are generated from a seeded random generator, so the same arguments
+always produce the same data, and inserted in batches: small tables with
+``bulk_create``, the large ones (books, genre links, copies) as plain
+parameter tuples through ``executemany``, which skips building a model
+instance per row.
+"""
+import datetime
+import random
+import time
+import uuid
+
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.contrib.auth.models import User
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from . import availability, search, stats
+from .availability import COUNTER_FIELDS
+from .models import Author, Book, BookInstance, Genre, Language
+
+
+WORDS = (
+    'dry', 'season', 'river', 'night', 'empire', 'stone', 'garden', 'winter', 'shadow', 'glass',
+    'city', 'storm', 'silent', 'golden', 'last', 'house', 'island', 'memory', 'wolf', 'light',
+    'war', 'letters', 'machine', 'ocean', 'crown', 'forest', 'journey', 'secret', 'fire', 'road',
+)
+FIRST_NAMES = (
+    'Anna', 'Boris', 'Clara', 'David', 'Elena', 'Fedor', 'Greta', 'Hugo', 'Irina', 'Jonas',
+    'Katya', 'Leo', 'Maria', 'Nikolai', 'Olga', 'Pavel', 'Rosa', 'Sergei', 'Tanya', 'Viktor',
+)
+LAST_NAMES = (
+    'Adams', 'Bulgakov', 'Chekhov', 'Dickens', 'Eliot', 'Fitzgerald', 'Gogol', 'Hugo', 'Ibsen', 'Joyce',
+    'Kafka', 'London', 'Mann', 'Nabokov', 'Orwell', 'Pushkin', 'Rowling', 'Smith', 'Tolstoy', 'Woolf',
+)
+GENRE_NAMES = ('Fantasy', 'Science Fiction', 'Poetry', 'History', 'Drama', 'Detective', 'Biography', 'Horror')
+LANGUAGE_NAMES = ('en', 'ru', 'uk', 'de', 'fr', 'es', 'it', 'pl')
+
+# Status distribution of the generated copies.
+STATUS_WEIGHTS = (('a', 5), ('o', 3), ('m', 1), ('r', 1))
+
+BORROWER_PREFIX = 'seed-borrower-'
+
+
+def chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def last_pk(model):
+    return model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+def insert_rows(model, field_names, rows, batch_size, sort=False):
+    """
+    Inserts rows (tuples of Python values in ``field_names`` order) with executemany.
+
+    With ``sort``, each batch is sorted on its first column (as stored) so
+    that random keys such as UUIDs are inserted into their index in order.
+    """
+    connection = connections[DEFAULT_DB_ALIAS]
+    fields = [model._meta.get_field(name) for name in field_names]
+    sql = 'INSERT INTO {0} ({1}) VALUES ({2})'.format(
+        connection.ops.quote_name(model._meta.db_table),
+        ', '.join(connection.ops.quote_name(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+
+    # Text, numbers and NULL go to the database as they are, for the field
+    # types used here. Other values (dates, UUIDs...) are converted, once per
+    # distinct value since foreign keys and timestamps repeat the same few.
+    plain = (str, int, type(None))
+    prepared = [{} for _ in fields]
+
+    def prepare(index, value):
+        if type(value) in plain:
+            return value
+        try:
+            return prepared[index][value]
+        except KeyError:
+            result = prepared[index][value] = fields[index].get_db_prep_save(value, connection)
+            return result
+
+    columns = range(len(fields))
+    with connection.cursor() as cursor:
+        for chunk in chunks(rows, batch_size):
+            chunk = [[prepare(index, row[index]) for index in columns] for row in chunk]
+            if sort:
+                chunk.sort(key=lambda row: row[0])
+            cursor.executemany(sql, chunk)
+
+
+def insert_objects(model, objects, batch_size):
+    """
+    Bulk inserts the objects and returns the primary keys of the new rows.
+
+    Not every backend returns primary keys from ``bulk_create``, so the new
+    auto-increment keys are read back as the ones above the previous maximum.
+    """
+    last = last_pk(model)
+    for chunk in chunks(objects, batch_size):
+        model.objects.bulk_create(chunk)
+    return list(model.objects.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True))
+
+
+def seed_library(authors=100, books=1000, genres=len(GENRE_NAMES), languages=len(LANGUAGE_NAMES),
+                 copies=10000, borrowers=50, seed=0, batch_size=10000, today=None, progress=None):
+    """
+    Adds the given numbers of objects to the catalog and returns them as a dict.
+
+    ``progress`` is called with (model name, number of rows, seconds) after
+    each model is inserted.
+    """
+    rnd = random.Random(seed)
+    today = today or datetime.date.today()
+    statuses = [status for status, weight in STATUS_WEIGHTS for _ in range(weight)]
+    # Raw inserts do not fill auto_now fields.
+    now = timezone.now()
+
+    def timed(name, count, insert):
+        start = time.perf_counter()
+        result = insert()
+        if progress:
+            progress(name, count, time.perf_counter() - start)
+        return result
+
+    with transaction.atomic():
+        genre_ids = timed('genres', genres, lambda: insert_objects(Genre, (
+            Genre(name=GENRE_NAMES[n % len(GENRE_NAMES)] + ('' if n < len(GENRE_NAMES) else ' %s' % n))
+            for n in range(genres)), batch_size))
+
+        language_ids = timed('languages', languages, lambda: insert_objects(Language, (
+            Language(name=LANGUAGE_NAMES[n % len(LANGUAGE_NAMES)] + ('' if n < len(LANGUAGE_NAMES) else str(n)))
+            for n in range(languages)), batch_size))
+
+        author_ids = timed('authors', authors, lambda: insert_objects(Author, (
+            Author(first_name=rnd.choice(FIRST_NAMES), last_name=rnd.choice(LAST_NAMES),
+                   date_of_birth=datetime.date(rnd.randrange(1800, 2000), rnd.randrange(1, 13), rnd.randrange(1, 29)))
+            for _ in range(authors)), batch_size))
+
+        def insert_books():
+            last = last_pk(Book)
+            # Counters start at zero and are recomputed once the copies exist.
+            insert_rows(Book, ('title', 'summary', 'isbn', 'author', 'language', 'updated_at') + COUNTER_FIELDS, (
+                (' '.join(rnd.choice(WORDS) for _ in range(rnd.randrange(1, 5))).capitalize(),
+                 ' '.join(rnd.choice(WORDS) for _ in range(20)),
+                 '%013d' % rnd.randrange(10 ** 13),
+                 rnd.choice(author_ids) if author_ids else None,
+                 rnd.choice(language_ids) if language_ids else None,
+                 now) + (0,) * len(COUNTER_FIELDS)
+                for _ in range(books)), batch_size)
+            return list(Book.objects.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True))
+
+        book_ids = timed('books', books, insert_books)
+
+        if genre_ids:
+            genre_links = Book.genre.through
+            timed('book genres', len(book_ids), lambda: insert_rows(genre_links, ('book', 'genre'), (
+                (book_id, genre_id)
+                for book_id in book_ids
+                for genre_id in rnd.sample(genre_ids, min(len(genre_ids), rnd.randrange(1, 4)))), batch_size))
+
+        existing = User.objects.filter(username__startswith=BORROWER_PREFIX).count()
+        borrower_ids = timed('borrowers', borrowers, lambda: insert_objects(User, (
+            User(username='%s%s' % (BORROWER_PREFIX, existing + n), password=UNUSABLE_PASSWORD_PREFIX)
+            for n in range(borrowers)), batch_size))
+
+        # Copy ids depend on the rows already there, so seeding twice does not collide.
+        id_rnd = random.Random('%s:%s' % (seed, BookInstance.objects.count()))
+
+        def make_copy():
+            status = rnd.choice(statuses)
+            on_loan = status == 'o' and borrower_ids
+            return (
+                uuid.UUID(int=id_rnd.getrandbits(128), version=4),
+                rnd.choice(book_ids) if book_ids else None,
+                'Imprint %s' % rnd.randrange(1950, 2020),
+                status,
+                rnd.choice(borrower_ids) if on_loan else None,
+                today + datetime.timedelta(days=rnd.randrange(-30, 30)) if on_loan else None,
+                now,
+                0,
+            )
+
+        timed('copies', copies, lambda: insert_rows(
+            BookInstance, ('id', 'book', 'imprint', 'status', 'borrower', 'due_back', 'updated_at', 'version'),
+            (make_copy() for _ in range(copies)), batch_size, sort=True))
+
+        timed('copy counters', len(book_ids), lambda: availability.recompute(book_ids))
+        timed('search index', len(book_ids), lambda: search.index_books(book_ids))
+
+    # Bulk inserts bypass the signals maintaining the cached counters.
+    stats.invalidate_stats()
+
+    return {'genres': len(genre_ids), 'languages': len(language_ids), 'authors': len(author_ids),
+            'books': len(book_ids), 'borrowers': len(borrower_ids), 'copies': copies}
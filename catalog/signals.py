@@ -0,0 +1,298 @@
+"""
+Signal handlers keeping derived catalog data in sync with the models.
+"""
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from . import availability, fragments, holds, search, stats
+from .conditional import touch
+from .models import Book, BookInstance, Author, Genre, Language, Hold
+
+
+def _is_selected(title):
+    return bool(title) and stats.SELECTION_KEY_WORD.lower() in title.lower()
+
+
+@receiver(post_init, sender=Book)
+def remember_book_title(sender, instance, **kwargs):
+    # Read from __dict__ so deferred fields are not loaded just for this.
+    instance._stats_title = instance.__dict__.get('title')
+
+
+@receiver(post_init, sender=BookInstance)
+def remember_bookinstance_status(sender, instance, **kwargs):
+    instance._stats_status = instance.__dict__.get('status')
+    instance._original_book_id = instance.__dict__.get('book_id')
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, created, **kwargs):
+    if not created and instance._stats_title is None:
+        # The title was deferred when loaded, so the old value is unknown.
+        transaction.on_commit(stats.invalidate_stats)
+        return
+    was_selected = not created and _is_selected(instance._stats_title)
+    stats.adjust_stats(
+        num_books=1 if created else 0,
+        num_book_selection=int(_is_selected(instance.title)) - int(was_selected),
+    )
+    instance._stats_title = instance.title
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    stats.adjust_stats(num_books=-1, num_book_selection=-int(_is_selected(instance.title)))
+
+
+@receiver(post_save, sender=BookInstance)
+def bookinstance_saved(sender, instance, created, **kwargs):
+    if not created and instance._stats_status is None:
+        transaction.on_commit(stats.invalidate_stats)
+        return
+    was_available = not created and instance._stats_status == 'a'
+    stats.adjust_stats(
+        num_instances=1 if created else 0,
+        num_instances_available=int(instance.status == 'a') - int(was_available),
+    )
+    instance._stats_status = instance.status
+
+
+@receiver(post_delete, sender=BookInstance)
+def bookinstance_deleted(sender, instance, **kwargs):
+    stats.adjust_stats(num_instances=-1, num_instances_available=-int(instance.status == 'a'))
+
+
+# Plain per-model counters: only creation and deletion change them.
+_COUNTED_MODELS = (
+    (Author, 'num_authors'),
+    (Genre, 'num_genre'),
+    (Language, 'num_lang'),
+)
+
+
+def _counted_model_saved(stat_name):
+    def handler(sender, instance, created, **kwargs):
+        if created:
+            stats.adjust_stats(**{stat_name: 1})
+    return handler
+
+
+def _counted_model_deleted(stat_name):
+    def handler(sender, instance, **kwargs):
+        stats.adjust_stats(**{stat_name: -1})
+    return handler
+
+
+for _model, _stat_name in _COUNTED_MODELS:
+    post_save.connect(_counted_model_saved(_stat_name), sender=_model, weak=False,
+                      dispatch_uid='catalog.stats.{0}.saved'.format(_stat_name))
+    post_delete.connect(_counted_model_deleted(_stat_name), sender=_model, weak=False,
+                        dispatch_uid='catalog.stats.{0}.deleted'.format(_stat_name))
+
+
+# Copy counters on books.
+
+_DEFERRED = object()
+
+
+@receiver(post_init, sender=BookInstance)
+def remember_counted_copy(sender, instance, **kwargs):
+    counted = (instance.__dict__.get('book_id', _DEFERRED), instance.__dict__.get('status', _DEFERRED))
+    # None when the copy was loaded without these fields.
+    instance._counted = None if _DEFERRED in counted else counted
+
+
+@receiver(post_save, sender=BookInstance)
+def count_saved_copy(sender, instance, created, **kwargs):
+    counted = (instance.book_id, instance.status)
+    if created:
+        availability.adjust({counted: 1})
+    elif instance._counted is None:
+        # The old values are unknown: recount the book instead.
+        availability.recompute([instance.book_id])
+    elif instance._counted != counted:
+        availability.adjust({instance._counted: -1, counted: 1})
+    instance._counted = counted
+
+
+@receiver(post_delete, sender=BookInstance)
+def count_deleted_copy(sender, instance, **kwargs):
+    if instance._counted is not None:
+        availability.adjust({instance._counted: -1})
+    elif instance.__dict__.get('book_id') is not None:
+        # The row is gone, so a deferred status cannot be loaded any more.
+        availability.recompute([instance.book_id])
+
+
+# Hold queue.
+
+@receiver(post_save, sender=BookInstance)
+def allocate_available_copy(sender, instance, **kwargs):
+    if instance.status == 'a':
+        # After the commit, so a copy saved and then changed again in the same transaction is not taken.
+        book_id = instance.book_id
+        transaction.on_commit(lambda: holds.allocate([book_id]))
+
+
+@receiver(pre_delete, sender=BookInstance)
+def requeue_holds_of_deleted_copy(sender, instance, **kwargs):
+    # Back to the head of the queue (they keep their creation time), for the next copy.
+    Hold.objects.filter(copy=instance, status='a').update(status='w', copy=None, allocated_at=None)
+
+
+# Full-text search index.
+
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance, **kwargs):
+    search.index_books([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def unindex_deleted_book(sender, instance, **kwargs):
+    search.remove_books([instance.pk])
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def index_book_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            search.index_books([instance.pk])
+    elif action == 'pre_clear':
+        # genre.book_set.clear() does not tell which books it unlinks.
+        instance._related_book_ids = list(instance.book_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        search.index_books(instance._related_book_ids)
+    elif action in ('post_add', 'post_remove'):
+        search.index_books(pk_set)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Genre)
+def index_related_books(sender, instance, created, **kwargs):
+    if not created:
+        search.index_books(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Genre)
+@receiver(pre_delete, sender=Language)
+def remember_related_books(sender, instance, **kwargs):
+    # Deleting these updates or unlinks books without sending Book signals.
+    instance._related_book_ids = list(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+def index_related_books_after_delete(sender, instance, **kwargs):
+    search.index_books(instance._related_book_ids)
+
+
+# Modification times for conditional GETs, where the object shown is not saved.
+# Runs before the fragment handlers below, which reset _original_book_id.
+
+@receiver(post_init, sender=Book)
+def remember_book_author(sender, instance, **kwargs):
+    instance._original_author_id = instance.__dict__.get('author_id')
+
+
+@receiver(post_save, sender=Book)
+def touch_previous_author(sender, instance, created, **kwargs):
+    if not created and instance._original_author_id != instance.author_id:
+        touch(Author, [instance._original_author_id])
+    instance._original_author_id = instance.author_id
+
+
+@receiver(post_delete, sender=Book)
+def touch_author_of_deleted_book(sender, instance, **kwargs):
+    touch(Author, [instance.author_id])
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Language)
+@receiver(post_delete, sender=Language)
+@receiver(post_delete, sender=Author)
+def touch_related_books(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    book_ids = getattr(instance, '_related_book_ids', None)
+    if book_ids is None:
+        book_ids = instance.book_set.values_list('pk', flat=True)
+    touch(Book, book_ids)
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def touch_book_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            touch(Book, [instance.pk])
+    elif action == 'post_clear':
+        touch(Book, instance._related_book_ids)
+    elif action in ('post_add', 'post_remove'):
+        touch(Book, pk_set)
+
+
+@receiver(post_save, sender=BookInstance)
+def touch_previous_book(sender, instance, created, **kwargs):
+    if not created and instance._original_book_id != instance.book_id:
+        touch(Book, [instance._original_book_id])
+
+
+@receiver(post_delete, sender=BookInstance)
+def touch_book_of_deleted_copy(sender, instance, **kwargs):
+    touch(Book, [instance.book_id])
+
+
+# Versions of cached template fragments.
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def bump_book_version(sender, instance, **kwargs):
+    fragments.bump_books([instance.pk])
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def bump_author_version(sender, instance, created=False, **kwargs):
+    fragments.bump(Author, [instance.pk])
+    if created:
+        return
+    # Book fragments show the author's name.
+    book_ids = getattr(instance, '_related_book_ids', None)
+    if book_ids is None:
+        book_ids = instance.book_set.values_list('pk', flat=True)
+    fragments.bump(Book, book_ids)
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Language)
+@receiver(post_delete, sender=Language)
+def bump_related_book_versions(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    book_ids = getattr(instance, '_related_book_ids', None)
+    if book_ids is None:
+        book_ids = instance.book_set.values_list('pk', flat=True)
+    fragments.bump(Book, book_ids)
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def bump_book_genres_version(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            fragments.bump(Book, [instance.pk])
+    elif action == 'post_clear':
+        fragments.bump(Book, instance._related_book_ids)
+    elif action in ('post_add', 'post_remove'):
+        fragments.bump(Book, pk_set)
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def bump_bookinstance_version(sender, instance, **kwargs):
+    fragments.bump(BookInstance, [instance.pk])
+    # The copy is listed on its book's page, and counted on its author's.
+    fragments.bump_books([instance.book_id, instance._original_book_id])
+    instance._original_book_id = instance.book_id
@@ -0,0 +1,116 @@
+"""
+Library statistics shown on the home page.
+
+All counters are computed in a single database round trip and kept in the
+``queries`` cache (see catalog.caching), one key per counter. Model signals
+(see catalog.signals) keep the cached counters up to date with atomic
+``incr``/``decr`` calls, so in the steady state the home page does not touch
+the database for them at all.
+"""
+from django.db import connection, transaction
+
+from .caching import NamedCache
+from .models import Book, BookInstance, Author, Genre, Language
+
+
+# Word used for the "book selection" counter on the home page.
+SELECTION_KEY_WORD = 'dry'
+
+cache = NamedCache('queries')
+
+CACHE_KEY_PREFIX = 'catalog:stats:'
+
+# Counters drift only if a write bypasses the model signals (``update()``,
+# ``bulk_create()``...), so a long timeout is safe; it just bounds the drift.
+CACHE_TIMEOUT = 60 * 60
+
+STAT_NAMES = (
+    'num_books',
+    'num_instances',
+    'num_instances_available',
+    'num_authors',
+    'num_genre',
+    'num_lang',
+    'num_book_selection',
+)
+
+
+def _stat_querysets():
+    """
+    Returns the queryset counted by every statistic, in STAT_NAMES order.
+    """
+    return (
+        Book.objects.all(),
+        BookInstance.objects.all(),
+        BookInstance.objects.filter(status__exact='a'),
+        Author.objects.all(),
+        Genre.objects.all(),
+        Language.objects.all(),
+        Book.objects.filter(title__icontains=SELECTION_KEY_WORD),
+    )
+
+
+def compute_stats():
+    """
+    Counts every statistic with one SELECT made of scalar COUNT subqueries.
+
+    The subqueries are compiled by the ORM, so lookups such as ``icontains``
+    get the right SQL for the current database vendor.
+    """
+    columns = []
+    params = []
+    for queryset in _stat_querysets():
+        sql, sql_params = queryset.order_by().values('pk').query.sql_with_params()
+        columns.append('(SELECT COUNT(*) FROM ({0}) subquery)'.format(sql))
+        params.extend(sql_params)
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT {0}'.format(', '.join(columns)), params)
+        row = cursor.fetchone()
+
+    return dict(zip(STAT_NAMES, row))
+
+
+def get_library_stats():
+    """
+    Returns the home page counters, computing and caching them on a miss.
+    """
+    keys = [CACHE_KEY_PREFIX + name for name in STAT_NAMES]
+    cached = cache.get_many(keys)
+    if len(cached) == len(keys):
+        return {name: cached[CACHE_KEY_PREFIX + name] for name in STAT_NAMES}
+
+    stats = compute_stats()
+    cache.set_many({CACHE_KEY_PREFIX + name: value for name, value in stats.items()}, CACHE_TIMEOUT)
+    return stats
+
+
+def invalidate_stats():
+    """
+    Drops every cached counter; the next read recomputes them.
+
+    Call it after bulk writes that bypass model signals.
+    """
+    cache.delete_many([CACHE_KEY_PREFIX + name for name in STAT_NAMES])
+
+
+def adjust_stats(**deltas):
+    """
+    Applies counter deltas (e.g. ``num_books=1``) once the current transaction commits.
+
+    Missing counters are left alone: they will be recomputed from the
+    database on the next read anyway.
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    def apply():
+        for name, delta in deltas.items():
+            try:
+                cache.incr(CACHE_KEY_PREFIX + name, delta)
+            except ValueError:
+                # Counter is not cached (yet, or anymore).
+                pass
+
+    transaction.on_commit(apply)
@@ -0,0 +1,15 @@
+from django import template
+
+from catalog.fragments import get_version
+
+
+register = template.Library()
+
+
+@register.filter
+def version(obj):
+    """
+    Returns the fragment cache version of a Book, Author or BookInstance, e.g.
+    {% cache 86400 'book-row' book.pk book|version %}.
+    """
+    return get_version(obj)
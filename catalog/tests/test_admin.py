@@ -0,0 +1,160 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.contrib.auth.models import Permission, User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog import availability
+from catalog.models import BookInstance, Book, Author, Genre, Language
+from catalog.pagination import EstimatedCountPaginator
+
+
+class ChangelistQueriesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='12345')
+        cls.genres = [Genre.objects.create(name=name) for name in ('Fantasy', 'Horror', 'Poetry')]
+        cls.borrower = User.objects.create_user(username='reader', password='12345')
+
+    def setUp(self):
+        self.client.login(username='admin', password='12345')
+
+    def add_books(self, number):
+        for _ in range(number):
+            author = Author.objects.create(first_name='John', last_name='Smith')
+            book = Book.objects.create(title='Book', summary='My book summary', isbn='ABCDEFG', author=author)
+            book.genre.set(self.genres)
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=self.borrower)
+
+    def changelist_queries(self, model_name):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse('admin:catalog_%s_changelist' % model_name))
+        self.assertEqual(resp.status_code, 200)
+        return len(queries), resp
+
+    def test_queries_do_not_grow_with_rows(self):
+        for model_name in ('book', 'bookinstance'):
+            self.add_books(2)
+            few, _ = self.changelist_queries(model_name)
+            self.add_books(5)
+            many, resp = self.changelist_queries(model_name)
+            self.assertEqual(few, many, model_name)
+        self.assertContains(resp, 'Book')
+
+    def test_genres_in_name_order(self):
+        self.add_books(1)
+        _, resp = self.changelist_queries('book')
+        self.assertContains(resp, 'Fantasy, Horror, Poetry')
+
+    def test_estimated_count_is_exact_on_sqlite(self):
+        self.add_books(3)
+        self.assertEqual(EstimatedCountPaginator(Book.objects.order_by('pk'), 2).count, 3)
+
+    def test_pages_past_an_estimate_too_high_give_the_last_page(self):
+        self.add_books(3)
+        with mock.patch('catalog.pagination.estimate_count', return_value=10):
+            paginator = EstimatedCountPaginator(Book.objects.order_by('pk'), 2)
+            self.assertEqual(paginator.num_pages, 5)
+            page = paginator.page(5)
+        self.assertEqual((page.number, len(page), paginator.count, paginator.num_pages), (2, 1, 3, 2))
+
+        with mock.patch('catalog.pagination.estimate_count', return_value=10):
+            resp = self.client.get(reverse('admin:catalog_book_changelist') + '?p=4')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.context['cl'].result_list), 3)
+
+
+class PaginatedInlineTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='12345')
+        cls.book = Book.objects.create(title='Book', summary='My book summary', isbn='ABCDEFG',
+                                       author=Author.objects.create(first_name='John', last_name='Smith'),
+                                       language=Language.objects.create(name='English'))
+        cls.book.genre.add(Genre.objects.create(name='Fantasy'))
+        cls.borrower = User.objects.create_user(username='borrower', password='12345')
+        for copy_num in range(25):
+            BookInstance.objects.create(book=cls.book, imprint='Imprint %s' % copy_num, status='a')
+
+    def setUp(self):
+        self.client.login(username='admin', password='12345')
+        self.url = reverse('admin:catalog_book_change', args=[self.book.pk])
+
+    def test_change_page_edits_first_page_only(self):
+        resp = self.client.get(self.url)
+        formset = resp.context['inline_admin_formsets'][0].formset
+        self.assertEqual((formset.initial_form_count(), formset.total_count), (20, 25))
+        self.assertContains(resp, 'Showing 20 of 25')
+
+        page = self.client.get(formset.next_url).json()
+        self.assertEqual(len(page['results']), 5)
+        self.assertIsNone(page['next'])
+        self.assertEqual(page['results'][0]['status'], 'Available')
+        shown = {str(form.instance.pk) for form in formset.forms}
+        self.assertFalse(shown & {row['id'] for row in page['results']})
+
+    def test_saving_the_capped_inline(self):
+        resp = self.client.get(self.url)
+        formset = resp.context['inline_admin_formsets'][0].formset
+        data = {}
+        for form in [resp.context['adminform'].form, formset.management_form] + formset.forms:
+            for name in form.fields:
+                value = form[name].value()
+                data[form.add_prefix(name)] = '' if value is None else value
+        first = formset.forms[0]
+        data[first.add_prefix('imprint')] = 'Changed'
+
+        resp = self.client.post(self.url, data)
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(BookInstance.objects.get(pk=first.instance.pk).imprint, 'Changed')
+        self.assertEqual(BookInstance.objects.filter(book=self.book).count(), 25)
+
+    def post_data(self, copies):
+        data = {
+            'title': self.book.title, 'author': self.book.author_id, 'summary': self.book.summary,
+            'isbn': self.book.isbn, 'language': self.book.language_id, 'genre': list(self.book.genre.values_list('pk', flat=True)),
+            'bookinstance_set-TOTAL_FORMS': len(copies), 'bookinstance_set-INITIAL_FORMS': len(copies),
+            'bookinstance_set-MIN_NUM_FORMS': 0, 'bookinstance_set-MAX_NUM_FORMS': 1000,
+        }
+        for index, copy in enumerate(copies):
+            prefix = 'bookinstance_set-%s-' % index
+            data.update({prefix + 'id': copy.pk, prefix + 'book': self.book.pk, prefix + 'imprint': copy.imprint,
+                         prefix + 'status': copy.status, prefix + 'due_back': '', prefix + 'loaded_version': copy.version,
+                         prefix + 'borrower': copy.borrower_id or ''})
+        return data
+
+    def test_saving_the_inline_in_a_fixed_number_of_queries(self):
+        BookInstance.objects.filter(book=self.book).update(status='o', borrower=self.borrower)
+        availability.recompute([self.book.pk])
+        for number in (5, 20):
+            copies = list(BookInstance.objects.filter(book=self.book).order_by('status', 'pk')[:number])
+            data = self.post_data(copies)
+            data['bookinstance_set-0-imprint'] = 'Changed %s' % number
+            # The count and the posted copies, their borrowers once: the rest is the book form,
+            # the change and its log entry, whatever the number of copies posted.
+            ContentType.objects.clear_cache()
+            with self.assertNumQueries(26):
+                resp = self.client.post(self.url, data)
+            self.assertEqual(resp.status_code, 302)
+            self.assertEqual(BookInstance.objects.get(pk=copies[0].pk).imprint, 'Changed %s' % number)
+
+    def test_related_page_needs_permission_on_the_related_model(self):
+        staff = User.objects.create_user(username='staff', password='12345', is_staff=True)
+        staff.user_permissions.add(Permission.objects.get(codename='view_book'))
+        url = reverse('admin:catalog_book_related', args=[self.book.pk, 'bookinstance'])
+        self.client.login(username='staff', password='12345')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        staff.user_permissions.add(Permission.objects.get(codename='view_bookinstance'))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_author_books_inline(self):
+        resp = self.client.get(reverse('admin:catalog_author_change', args=[self.book.author.pk]))
+        formset = resp.context['inline_admin_formsets'][0].formset
+        self.assertEqual((formset.total_count, formset.next_url), (1, None))
+        self.assertContains(resp, '1 in total.')
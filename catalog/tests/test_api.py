@@ -0,0 +1,69 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from catalog.models import BookInstance, Book, Genre, Author
+
+
+class ApiTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.genre = Genre.objects.create(name='Fantasy')
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        for book_num in range(30):
+            book = Book.objects.create(title='Book %s' % book_num, summary='My book summary', isbn='ABCDEFG',
+                                       author=cls.author if book_num % 2 else None)
+            book.genre.add(cls.genre)
+        cls.borrower = User.objects.create_user(username='testuser1', password='12345')
+        cls.copy = BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=cls.borrower)
+
+    def test_books_with_authors_and_genres_in_fixed_number_of_queries(self):
+        # Books, their genre links, authors, genres.
+        with self.assertNumQueries(4):
+            resp = self.client.get(reverse('api-list', args=['books']), {'include': 'author,genres', 'limit': 1000})
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(len(data['data']), 30)
+        self.assertEqual(data['data'][1]['author'], self.author.pk)
+        self.assertEqual(data['data'][1]['genres'], [self.genre.pk])
+        self.assertEqual(data['included']['authors'], [{
+            'id': self.author.pk, 'first_name': 'John', 'last_name': 'Smith', 'date_of_birth': None,
+            'date_of_death': None, 'updated_at': data['included']['authors'][0]['updated_at'],
+        }])
+        self.assertEqual(data['included']['genres'], [{'id': self.genre.pk, 'name': 'Fantasy'}])
+        self.assertIsNone(data['links']['next'])
+
+    def test_sparse_fields(self):
+        resp = self.client.get(reverse('api-list', args=['books']),
+                               {'fields': 'title', 'include': 'author', 'fields[authors]': 'last_name', 'limit': 2})
+        data = resp.json()
+        self.assertEqual(set(data['data'][1]), {'id', 'title', 'author'})
+        self.assertEqual(data['included']['authors'], [{'id': self.author.pk, 'last_name': 'Smith'}])
+
+        resp = self.client.get(reverse('api-list', args=['books']), {'fields': 'title,borrower'})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_cursor_pagination(self):
+        url = reverse('api-list', args=['books'])
+        titles = []
+        while url:
+            data = self.client.get(url, {'fields': 'title', 'limit': 7} if '?' not in url else {}).json()
+            titles += [book['title'] for book in data['data']]
+            url = data['links']['next']
+        self.assertEqual(titles, ['Book %s' % book_num for book_num in range(30)])
+
+        resp = self.client.get(reverse('api-list', args=['books']), {'cursor': 'garbage'})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_copy_detail_hides_borrower(self):
+        resp = self.client.get(reverse('api-detail', args=['copies', self.copy.pk]), {'include': 'book'})
+        data = resp.json()
+        self.assertEqual(data['data']['id'], str(self.copy.pk))
+        self.assertNotIn('borrower', data['data'])
+        self.assertEqual(data['included']['books'][0]['title'], 'Book 29')
+
+    def test_missing_objects_and_resources(self):
+        self.assertEqual(self.client.get(reverse('api-detail', args=['copies', 'nope'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api-detail', args=['books', 1000])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api-list', args=['users'])).status_code, 404)
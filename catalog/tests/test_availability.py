@@ -0,0 +1,92 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+
+from catalog import availability, circulation, fragments
+from catalog.models import BookInstance, Book
+
+
+class CopyCountersTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG')
+        cls.other_book = Book.objects.create(title='Other Book', summary='My book summary', isbn='ABCDEFH')
+        cls.borrower = User.objects.create_user(username='testuser1', password='12345')
+
+    def counters(self, book):
+        return Book.objects.values_list(*availability.COUNTER_FIELDS).get(pk=book.pk)
+
+    def test_signals_keep_counters_in_sync(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='m')
+        # Total, available, on loan, reserved, maintenance.
+        self.assertEqual(self.counters(self.book), (2, 1, 0, 0, 1))
+
+        copy.status = 'o'
+        copy.save()
+        self.assertEqual(self.counters(self.book), (2, 0, 1, 0, 1))
+
+        copy = BookInstance.objects.get(pk=copy.pk)
+        copy.book = self.other_book
+        copy.save()
+        self.assertEqual(self.counters(self.book), (1, 0, 0, 0, 1))
+        self.assertEqual(self.counters(self.other_book), (1, 0, 1, 0, 0))
+
+        copy.delete()
+        self.assertEqual(self.counters(self.other_book), (0, 0, 0, 0, 0))
+
+    def test_deferred_copy_is_recounted(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        copy = BookInstance.objects.only('imprint').get(pk=copy.pk)
+        copy.status = 'r'
+        copy.save()
+        self.assertEqual(self.counters(self.book), (1, 0, 0, 1, 0))
+
+    def test_bulk_circulation_moves_counts(self):
+        copies = [BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+                  for book in (self.book, self.book, self.other_book)]
+        circulation.apply('check_out', [str(copy.pk) for copy in copies], self.borrower, None)
+        self.assertEqual(self.counters(self.book), (2, 0, 2, 0, 0))
+        self.assertEqual(self.counters(self.other_book), (1, 0, 1, 0, 0))
+
+    def test_bulk_circulation_of_the_most_copies_allowed(self):
+        # More copies than SQLite accepts parameters in one query (999).
+        BookInstance.objects.bulk_create([BookInstance(book=self.book, imprint='Imprint', status='a')
+                                          for _ in range(circulation.MAX_COPIES)])
+        availability.recompute([self.book.pk])
+        copy_ids = [str(pk) for pk in BookInstance.objects.values_list('pk', flat=True)]
+
+        updated, results = circulation.apply('check_out', copy_ids, self.borrower, None)
+        self.assertEqual(updated, circulation.MAX_COPIES)
+        self.assertEqual({result['result'] for result in results}, {'ok'})
+        self.assertEqual(self.counters(self.book), (circulation.MAX_COPIES, 0, circulation.MAX_COPIES, 0, 0))
+
+    def test_recompute_fixes_drifted_counters(self):
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        Book.objects.filter(pk=self.book.pk).update(num_copies=5, num_copies_available=0)
+
+        version = fragments.get_version(self.book)
+        self.assertEqual(availability.recompute(batch_size=1), 1)
+        self.assertEqual(self.counters(self.book), (1, 1, 0, 0, 0))
+        # Cached rows showing the wrong counts are not used again.
+        self.assertNotEqual(fragments.versions(Book, [self.book.pk])[self.book.pk], version)
+        self.assertEqual(availability.recompute(), 0)
+
+    def test_saving_a_stale_book_keeps_the_counters(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        stale = Book.objects.get(pk=self.book.pk)
+        copy.status = 'o'
+        copy.save()
+
+        stale.title = 'New Title'
+        stale.save()
+        self.assertEqual(self.counters(self.book), (1, 0, 1, 0, 0))
+        self.assertEqual(Book.objects.get(pk=self.book.pk).title, 'New Title')
+
+    def test_saving_a_deferred_book_keeps_the_counters(self):
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        stale = Book.objects.only('title').get(pk=self.book.pk)
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='m')
+        stale.title = 'New Title'
+        stale.save()
+        self.assertEqual(self.counters(self.book), (2, 1, 0, 0, 1))
@@ -0,0 +1,38 @@
+from django.test import TestCase
+
+from catalog import visits
+from catalog.benchmarks import runner
+from catalog.seeding import seed_library
+
+
+class CatalogBenchmarkTest(TestCase):
+    # Query budgets do not depend on the machine, so they are enforced here;
+    # wall time budgets are only checked by the run_benchmarks command.
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_library(authors=5, books=20, copies=200, borrowers=3)
+
+    def setUp(self):
+        # No batch of visits is due while the index page is measured.
+        visits.buffer.clear()
+
+    def test_every_url_is_benchmarked(self):
+        report = runner.run(repeat=1, budgets={})
+        measured = [result for result in report['results'] if result['name'] not in runner.URL_SKIP]
+        self.assertEqual({result['name'] for result in measured}, set(runner.load_budgets()))
+        for result in measured:
+            self.assertEqual(result.get('status'), 200, result)
+        index = next(result for result in measured if result['name'] == 'index')
+        self.assertIsNotNone(index['template_ms'])
+
+    def test_views_stay_within_query_budgets(self):
+        budgets = {name: {'queries': budget['queries']} for name, budget in runner.load_budgets().items()}
+        report = runner.run(repeat=1, budgets=budgets)
+        self.assertEqual(report['failed'], [], runner.to_markdown(report))
+
+    def test_markdown_report_lists_every_url(self):
+        report = runner.run(repeat=1, budgets={})
+        markdown = runner.to_markdown(report)
+        for result in report['results']:
+            self.assertIn('| %s |' % result['name'], markdown)
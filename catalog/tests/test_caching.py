@@ -0,0 +1,123 @@
+import socket
+import sys
+import threading
+import types
+import unittest
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from catalog import caching
+from catalog.cache_server import MemcachedServer
+from locallibrary import cache_url
+
+try:
+    import memcache
+except ImportError:
+    memcache = None
+
+
+class CacheUrlTest(SimpleTestCase):
+
+    def test_parse(self):
+        self.assertEqual(cache_url.parse('locmem://'),
+                         {'BACKEND': 'catalog.caching.LocMemCache', 'ALIAS': 'default', 'LOCATION': ''})
+        self.assertEqual(cache_url.parse('file:///var/tmp/django_cache?timeout=none&max_entries=500', 'queries'), {
+            'BACKEND': 'catalog.caching.FileBasedCache', 'ALIAS': 'queries', 'LOCATION': '/var/tmp/django_cache',
+            'TIMEOUT': None, 'OPTIONS': {'MAX_ENTRIES': 500},
+        })
+        self.assertEqual(cache_url.parse('memcached://10.0.0.1:11211,10.0.0.2:11211?key_prefix=lib')['LOCATION'],
+                         ['10.0.0.1:11211', '10.0.0.2:11211'])
+        with mock.patch.dict(sys.modules, {'django_redis': types.ModuleType('django_redis')}):
+            self.assertEqual(cache_url.parse('redis://127.0.0.1:6379/1?timeout=60')['LOCATION'],
+                             'redis://127.0.0.1:6379/1')
+        with self.assertRaises(ValueError):
+            cache_url.parse('mongodb://localhost')
+        with self.assertRaises(ValueError):
+            cache_url.parse('memcached://localhost?max_entries=10')
+
+    def test_redis_needs_django_redis(self):
+        # A None entry makes the import fail, installed or not.
+        with mock.patch.dict(sys.modules, {'django_redis': None}):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'needs django-redis'):
+                cache_url.parse('redis://127.0.0.1:6379/1')
+
+    def test_named_caches_share_the_default_one(self):
+        config = cache_url.caches({'CACHE_URL': 'locmem://lib?key_prefix=v1', 'SESSION_CACHE_URL': 'db://sessions'})
+        self.assertEqual(set(config), {'default', 'sessions', 'template_fragments', 'queries'})
+        self.assertEqual(config['sessions']['BACKEND'], 'catalog.caching.DatabaseCache')
+        self.assertEqual(config['queries']['LOCATION'], 'lib')
+        self.assertEqual(config['queries']['KEY_PREFIX'], 'v1:queries')
+        self.assertEqual(config['default']['KEY_PREFIX'], 'v1')
+
+
+class CacheStatsTest(SimpleTestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        caching.stats.reset()
+        self.addCleanup(caching.stats.reset)
+
+    def test_hits_and_misses_are_counted_per_cache(self):
+        cache = caches['queries']
+        cache.set('a', 1)
+        cache.set('b', None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c', 'default'), 'default')
+        self.assertEqual(cache.get_many(['a', 'c', 'd']), {'a': 1})
+        caches['sessions'].get('a')
+
+        self.assertEqual(caching.stats.snapshot(), {
+            'queries': {'hits': 3, 'misses': 3},
+            'sessions': {'hits': 0, 'misses': 1},
+        })
+
+    @override_settings(METRICS_ENABLED=True)
+    def test_metrics_include_cache_stats(self):
+        caches['queries'].get('missing')
+        resp = self.client.get(reverse('metrics'))
+        self.assertContains(resp, 'catalog_cache_misses_total{cache="queries"} 1')
+
+
+class MemcachedStandInTest(SimpleTestCase):
+
+    def setUp(self):
+        self.server = MemcachedServer(('127.0.0.1', 0))
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.location = '127.0.0.1:%s' % self.server.server_address[1]
+
+    def send(self, data):
+        with socket.create_connection(self.server.server_address[:2]) as connection:
+            connection.sendall(data + b'quit\r\n')
+            reply = b''
+            while True:
+                chunk = connection.recv(4096)
+                if not chunk:
+                    return reply
+                reply += chunk
+
+    def test_text_protocol(self):
+        reply = self.send(b'set a 3 0 5\r\nhello\r\nadd a 0 0 1\r\nx\r\nget a b\r\n'
+                          b'set n 0 0 1\r\n7\r\nincr n 5\r\ndecr n 20\r\ndelete a\r\ndelete a\r\nget a\r\n')
+        self.assertEqual(reply, b'STORED\r\nNOT_STORED\r\nVALUE a 3 5\r\nhello\r\nEND\r\n'
+                                b'STORED\r\n12\r\n0\r\nDELETED\r\nNOT_FOUND\r\nEND\r\n')
+
+    def test_expired_items_are_gone(self):
+        reply = self.send(b'set a 0 -1 1\r\nx\r\nget a\r\nset b 0 0 1 noreply\r\ny\r\ntouch b -1\r\nget b\r\n')
+        self.assertEqual(reply, b'STORED\r\nEND\r\nTOUCHED\r\nEND\r\n')
+
+    @unittest.skipIf(memcache is None, 'python-memcached is not installed')
+    def test_django_memcached_backend(self):
+        cache = caching.MemcachedCache(self.location, {'ALIAS': 'test'})
+        cache.set('book', {'title': 'Wet Season'})
+        self.assertEqual(cache.get('book'), {'title': 'Wet Season'})
+        cache.set('count', 1)
+        self.assertEqual(cache.incr('count', 2), 3)
+        cache.delete('book')
+        self.assertIsNone(cache.get('book'))
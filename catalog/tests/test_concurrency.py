@@ -0,0 +1,112 @@
+import datetime
+
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User, Permission
+from django.urls import reverse
+
+from catalog import availability
+from catalog.concurrency import ConflictError, update_copy
+from catalog.forms import BookInstanceAdminForm
+from catalog.models import BookInstance, Book
+
+
+class UpdateCopyTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG')
+        cls.borrower = User.objects.create_user(username='testuser1', password='12345')
+
+    def setUp(self):
+        self.copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', borrower=self.borrower,
+                                                due_back=datetime.date.today())
+
+    def test_save_and_update_bump_version(self):
+        self.assertEqual(self.copy.version, 1)
+        self.copy.save(update_fields=['imprint'])
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).version, 2)
+
+        due_back = datetime.date.today() + datetime.timedelta(weeks=1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(update_copy(self.copy, due_back=due_back, status='o'), ['due_back'])
+        update = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "catalog_bookinstance"')]
+        self.assertEqual(len(update), 1)
+        self.assertNotIn('"status"', update[0].split('WHERE')[0])
+        self.assertEqual(BookInstance.objects.values_list('due_back', 'version').get(pk=self.copy.pk), (due_back, 3))
+        self.assertEqual(self.copy.version, 3)
+
+    def test_stale_copy_is_not_overwritten(self):
+        stale = BookInstance.objects.get(pk=self.copy.pk)
+        update_copy(self.copy, status='a', borrower=None)
+
+        with self.assertRaises(ConflictError):
+            update_copy(stale, due_back=datetime.date.today() + datetime.timedelta(weeks=1))
+        with self.assertRaises(ConflictError):
+            update_copy(self.copy, self.copy.version - 1, imprint='Other')
+        self.assertEqual(BookInstance.objects.values_list('status', 'due_back').get(pk=self.copy.pk),
+                         ('a', datetime.date.today()))
+        # Total, available, on loan, reserved, maintenance.
+        self.assertEqual(Book.objects.values_list(*availability.COUNTER_FIELDS).get(pk=self.book.pk), (1, 1, 0, 0, 0))
+
+    def test_stale_copy_is_not_saved(self):
+        stale = BookInstance.objects.get(pk=self.copy.pk)
+        due_back = datetime.date.today() + datetime.timedelta(weeks=1)
+        update_copy(self.copy, due_back=due_back)
+
+        stale.imprint = 'Other'
+        # save() marks the transaction for rollback on errors: catch them outside a savepoint.
+        with self.assertRaises(ConflictError), transaction.atomic():
+            stale.save()
+        self.assertEqual(stale.version, self.copy.version - 1)
+        self.assertEqual(BookInstance.objects.values_list('imprint', 'due_back').get(pk=self.copy.pk),
+                         ('Imprint', due_back))
+
+        # Saving the current version works.
+        self.copy.imprint = 'Other'
+        self.copy.save()
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).imprint, 'Other')
+
+    def test_admin_form_refuses_stale_version(self):
+        data = {'book': self.book.pk, 'imprint': 'Other', 'status': 'o', 'borrower': self.borrower.pk,
+                'due_back': datetime.date.today(), 'id': self.copy.pk}
+        form = BookInstanceAdminForm(data=dict(data, loaded_version=self.copy.version), instance=self.copy)
+        self.assertTrue(form.is_valid(), form.errors)
+
+        for version in (self.copy.version - 1, None):
+            copy = BookInstance.objects.get(pk=self.copy.pk)
+            form = BookInstanceAdminForm(data=dict(data, loaded_version=version), instance=copy)
+            self.assertFalse(form.is_valid())
+
+
+class RenewalConflictTest(TestCase):
+
+    def setUp(self):
+        librarian = User.objects.create_user(username='librarian', password='12345')
+        librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG')
+        self.copy = BookInstance.objects.create(book=book, imprint='Imprint', status='o',
+                                                due_back=datetime.date.today())
+        self.client.login(username='librarian', password='12345')
+
+    def test_concurrent_renewal_gets_409(self):
+        url = reverse('renew-book-librarian', kwargs={'pk': self.copy.pk})
+        version = self.client.get(url).context['form'].initial['version']
+        first = datetime.date.today() + datetime.timedelta(weeks=1)
+        second = datetime.date.today() + datetime.timedelta(weeks=2)
+
+        resp = self.client.post(url, {'renewal_date': first, 'version': version})
+        self.assertRedirects(resp, reverse('all-borrowed'))
+
+        resp = self.client.post(url, {'renewal_date': second, 'version': version})
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp.context['bookinst'].due_back, first)
+        self.assertEqual(resp.context['form'].initial['version'], version + 1)
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).due_back, first)
+
+    def test_renewal_without_version_gets_409(self):
+        url = reverse('renew-book-librarian', kwargs={'pk': self.copy.pk})
+        resp = self.client.post(url, {'renewal_date': datetime.date.today() + datetime.timedelta(weeks=1)})
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).due_back, datetime.date.today())
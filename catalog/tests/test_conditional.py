@@ -0,0 +1,92 @@
+import datetime
+
+from django.test import TestCase
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from django.views import generic
+
+from catalog.conditional import ConditionalGetMixin
+from catalog.models import BookInstance, Book, Genre, Author
+
+
+class ConditionalGetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG',
+                                       author=cls.author)
+        cls.copy = BookInstance.objects.create(book=cls.book, imprint='Imprint', status='a')
+        User.objects.create_user(username='testuser1', password='12345')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_unchanged_pages_are_not_modified(self):
+        for url in (reverse('book-detail', args=[self.book.pk]), reverse('author-detail', args=[self.author.pk]),
+                    reverse('books'), reverse('authors')):
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            is_list = url in (reverse('books'), reverse('authors'))
+            self.assertEqual(resp.has_header('Last-Modified'), not is_list)
+
+            with self.assertNumQueries(1):
+                resp = self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'])
+            self.assertEqual(resp.status_code, 304)
+
+            if not is_list:
+                resp = self.client.get(url, HTTP_IF_MODIFIED_SINCE=resp['Last-Modified'])
+                self.assertEqual(resp.status_code, 304)
+
+    def test_list_page_changes_when_its_latest_row_is_deleted(self):
+        older = Book.objects.create(title='Another Book', summary='My book summary', isbn='ABCDEFH')
+        Book.objects.filter(pk=older.pk).update(updated_at=self.book.updated_at - datetime.timedelta(days=1))
+        resp = self.client.get(reverse('books'))
+        etag = resp['ETag']
+
+        Book.objects.filter(pk=self.book.pk).delete()
+        # A date older than the page's cached copy would have answered 304.
+        resp = self.client.get(reverse('books'), HTTP_IF_NONE_MATCH=etag,
+                               HTTP_IF_MODIFIED_SINCE=http_date(timezone.now().timestamp()))
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotContains(resp, 'Book Title')
+
+    def test_related_changes_change_etag(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        etag = self.client.get(url)['ETag']
+
+        genre = Genre.objects.create(name='Fantasy')
+        Book.objects.get(pk=self.book.pk).genre.add(genre)
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+
+        genre.name = 'Science Fiction'
+        genre.save()
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertContains(resp, 'Science Fiction')
+
+        BookInstance.objects.filter(pk=self.copy.pk).delete()
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 200)
+
+    def test_deleted_copy_touches_its_book(self):
+        updated_at = Book.objects.get(pk=self.book.pk).updated_at
+        BookInstance.objects.get(pk=self.copy.pk).delete()
+        self.assertGreater(Book.objects.get(pk=self.book.pk).updated_at, updated_at)
+
+    def test_etag_depends_on_user(self):
+        url = reverse('authors')
+        etag = self.client.get(url)['ETag']
+        self.client.login(username='testuser1', password='12345')
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, 'testuser1')
+
+    def test_detail_rows_default_to_the_object(self):
+        view = type('CopyDetailView', (ConditionalGetMixin, generic.DetailView), {'model': BookInstance})()
+        view.kwargs = {'pk': self.copy.pk}
+        self.assertEqual(list(view.get_modification_rows()),
+                         [(self.copy.pk, BookInstance.objects.get(pk=self.copy.pk).updated_at)])
@@ -0,0 +1,68 @@
+import csv
+import gzip
+import io
+import json
+
+from django.test import TestCase
+from django.contrib.auth.models import User, Permission
+from django.urls import reverse
+
+from catalog.models import BookInstance, Book, Genre, Author, Language
+from catalog.exporting import HEADER, export_lines
+from catalog.importing import import_catalog, read_records
+
+
+class ExportCatalogTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        language = Language.objects.create(name='en')
+        cls.book = Book.objects.create(title='Dry Season', summary='A summary', isbn='9780000000011',
+                                       author=author, language=language)
+        cls.book.genre.add(Genre.objects.create(name='Horror'), Genre.objects.create(name='Fantasy'))
+        BookInstance.objects.create(book=cls.book, imprint='Imprint', status='a')
+        BookInstance.objects.create(book=cls.book, imprint='Imprint', status='o')
+        for book_num in range(4):
+            Book.objects.create(title='Book %s' % book_num, summary='', isbn='%s' % book_num)
+
+        user = User.objects.create_user(username='librarian', password='12345')
+        user.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+
+    def test_csv_rows(self):
+        rows = list(csv.reader(export_lines('csv', chunk_size=2)))
+        self.assertEqual(tuple(rows[0]), HEADER)
+        # Available, on loan, reserved, maintenance.
+        self.assertEqual(rows[1], ['9780000000011', 'Dry Season', 'Smith, John', 'A summary', 'en',
+                                   'Fantasy;Horror', '1', '1', '0', '0'])
+        self.assertEqual(rows[2], ['0', 'Book 0', '', '', '', '', '0', '0', '0', '0'])
+        self.assertEqual(len(rows), 6)
+
+    def test_queries_per_chunk(self):
+        # Books (one chunked cursor), then genres for each chunk of two.
+        with self.assertNumQueries(1 + 3):
+            lines = list(export_lines('jsonl', chunk_size=2))
+        self.assertEqual(json.loads(lines[0])['genres'], ['Fantasy', 'Horror'])
+
+    def test_export_can_be_imported(self):
+        exported = ''.join(export_lines('jsonl'))
+        Book.objects.all().delete()
+        result = import_catalog(read_records(io.StringIO(exported), 'jsonl'))
+        self.assertEqual(result['books'], 5)
+        self.assertEqual(result['copies'], 2)
+        # With the same copies, so the same availability.
+        book = Book.objects.get(isbn='9780000000011')
+        self.assertEqual(sorted(book.bookinstance_set.values_list('status', flat=True)), ['a', 'o'])
+        self.assertEqual(book.num_copies_available, 1)
+        self.assertEqual(sorted(Book.objects.get(isbn='9780000000011').genre.values_list('name', flat=True)),
+                         ['Fantasy', 'Horror'])
+
+    def test_gzip_endpoint(self):
+        self.client.login(username='librarian', password='12345')
+        resp = self.client.get(reverse('catalog-export'), {'format': 'csv', 'gzip': '1'})
+        self.assertEqual(resp['Content-Type'], 'application/gzip')
+        self.assertIn('.csv.gz', resp['Content-Disposition'])
+        content = gzip.decompress(b''.join(resp.streaming_content)).decode('utf-8')
+        self.assertEqual(content, ''.join(export_lines('csv')))
+
+        self.assertEqual(self.client.get(reverse('catalog-export'), {'format': 'xml'}).status_code, 400)
@@ -0,0 +1,63 @@
+from django.test import TestCase
+from django.core.cache import cache
+from django.urls import reverse
+
+from catalog.models import BookInstance, Book, Genre, Author
+from catalog.fragments import versions
+
+
+class FragmentVersionTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG',
+                                       author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def version(self, obj):
+        return versions(type(obj), [obj.pk])[obj.pk]
+
+    def test_version_is_stable_until_bumped(self):
+        version = self.version(self.book)
+        self.assertEqual(self.version(self.book), version)
+
+        self.book.save()
+        self.assertNotEqual(self.version(self.book), version)
+
+    def test_related_changes_bump_book_and_author(self):
+        book_version = self.version(self.book)
+        author_version = self.version(self.author)
+
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        self.assertNotEqual(self.version(self.book), book_version)
+        self.assertNotEqual(self.version(self.author), author_version)
+
+        book_version = self.version(self.book)
+        self.book.genre.add(Genre.objects.create(name='Fantasy'))
+        self.assertNotEqual(self.version(self.book), book_version)
+
+        book_version = self.version(self.book)
+        self.author.save()
+        self.assertNotEqual(self.version(self.book), book_version)
+
+    def test_cached_detail_page_is_refreshed_by_edits(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        self.client.get(url)
+        # Modification times and the book itself.
+        with self.assertNumQueries(2):
+            resp = self.client.get(url)
+        self.assertContains(resp, 'Book Title')
+
+        Book.objects.get(pk=self.book.pk).genre.add(Genre.objects.create(name='Fantasy'))
+        resp = self.client.get(url)
+        self.assertContains(resp, 'Fantasy')
+
+    def test_author_rename_refreshes_cached_book_rows(self):
+        self.client.get(reverse('books'))
+        self.author.last_name = 'Doe'
+        self.author.save()
+        resp = self.client.get(reverse('books'))
+        self.assertContains(resp, 'Doe, John')
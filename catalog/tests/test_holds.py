@@ -0,0 +1,113 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core import mail
+from django.db import transaction
+from django.urls import reverse
+
+from catalog import availability, circulation, holds, stats
+from catalog.models import BookInstance, Book, Hold
+
+
+class HoldQueueTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG')
+        cls.first = User.objects.create_user(username='first', password='12345', email='first@example.com')
+        cls.second = User.objects.create_user(username='second', password='12345', email='second@example.com')
+        cls.copy = BookInstance.objects.create(book=cls.book, imprint='Imprint', status='o', borrower=cls.second)
+
+    def counters(self):
+        return Book.objects.values_list(*availability.COUNTER_FIELDS).get(pk=self.book.pk)
+
+    def test_returned_copy_goes_to_oldest_hold(self):
+        first_hold = holds.place_hold(self.book, self.first)
+        second_hold = holds.place_hold(self.book, self.second)
+        self.assertEqual((first_hold.status, second_hold.status), ('w', 'w'))
+
+        circulation.apply('check_in', [str(self.copy.pk)])
+        first_hold.refresh_from_db()
+        self.assertEqual((first_hold.status, first_hold.copy_id), ('a', self.copy.pk))
+        self.assertEqual(Hold.objects.get(pk=second_hold.pk).status, 'w')
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).status, 'r')
+        # Total, available, on loan, reserved, maintenance.
+        self.assertEqual(self.counters(), (1, 0, 0, 1, 0))
+
+        # Only the holder can borrow the reserved copy.
+        updated, results = circulation.apply('check_out', [str(self.copy.pk)], self.second)
+        self.assertEqual((updated, results[0]['result']), (0, 'wrong status: r'))
+        updated, results = circulation.apply('check_out', [str(self.copy.pk)], self.first)
+        self.assertEqual(updated, 1)
+        self.assertEqual(Hold.objects.get(pk=first_hold.pk).status, 'f')
+        self.assertEqual(self.counters(), (1, 0, 1, 0, 0))
+
+    def test_copy_changed_during_check_out_keeps_its_hold(self):
+        BookInstance.objects.filter(pk=self.copy.pk).update(status='a', borrower=None)
+        other = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        availability.recompute([self.book.pk])
+        hold = holds.place_hold(self.book, self.first)
+        reserved = hold.copy_id
+        available = other.pk if reserved == self.copy.pk else self.copy.pk
+        reserved_for = holds.reserved_for
+
+        def changed_meanwhile(borrower, copy_ids):
+            # Another request moves the reserved copy to maintenance before the update.
+            found = reserved_for(borrower, copy_ids)
+            BookInstance.objects.filter(pk=reserved).update(status='m')
+            return found
+
+        # The test transaction never commits: the callbacks are recorded instead.
+        with mock.patch.object(holds, 'reserved_for', changed_meanwhile), \
+                mock.patch.object(transaction, 'on_commit') as on_commit:
+            updated, results = circulation.apply('check_out', [str(reserved), str(available)], self.first)
+        self.assertEqual(updated, 1)
+        self.assertEqual(Hold.objects.get(pk=hold.pk).status, 'a')
+        # The statistics are recounted rather than adjusted by a guess.
+        self.assertIn(mock.call(stats.invalidate_stats), on_commit.call_args_list)
+        # Total, available, on loan, reserved, maintenance.
+        self.assertEqual(self.counters(), (2, 0, 1, 0, 1))
+
+    def test_cancelling_passes_copy_on(self):
+        BookInstance.objects.filter(pk=self.copy.pk).update(status='a', borrower=None)
+        availability.recompute([self.book.pk])
+        first_hold = holds.place_hold(self.book, self.first)
+        second_hold = holds.place_hold(self.book, self.second)
+        self.assertEqual(first_hold.status, 'a')
+
+        holds.cancel_hold(first_hold)
+        second_hold.refresh_from_db()
+        self.assertEqual((second_hold.status, second_hold.copy_id), ('a', self.copy.pk))
+        with self.assertRaises(holds.HoldError):
+            holds.cancel_hold(first_hold)
+
+    def test_one_open_hold_per_borrower(self):
+        holds.place_hold(self.book, self.first)
+        with self.assertRaises(holds.HoldError):
+            holds.place_hold(self.book, self.first)
+
+    def test_notifications_are_batched(self):
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='m')
+        for user in (self.first, self.second):
+            holds.place_hold(self.book, user)
+        BookInstance.objects.filter(book=self.book).update(status='a')
+        availability.recompute([self.book.pk])
+
+        allocated = holds.allocate([self.book.pk])
+        self.assertEqual(len(allocated), 2)
+        self.assertEqual(holds.notify(allocated), 2)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['first@example.com', 'second@example.com'])
+        self.assertIn('Book Title', mail.outbox[0].subject)
+
+    def test_hold_views(self):
+        self.client.login(username='first', password='12345')
+        resp = self.client.post(reverse('place-hold', args=[self.book.pk]))
+        self.assertRedirects(resp, reverse('my-borrowed'))
+        resp = self.client.get(reverse('my-borrowed'))
+        hold = resp.context['hold_list'][0]
+        self.assertEqual((hold.status, hold.ahead), ('w', None))
+
+        self.client.post(reverse('cancel-hold', args=[hold.pk]))
+        self.assertEqual(Hold.objects.get(pk=hold.pk).status, 'c')
+        self.assertEqual(self.client.get(reverse('cancel-hold', args=[hold.pk])).status_code, 405)
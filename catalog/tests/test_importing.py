@@ -0,0 +1,87 @@
+import io
+import json
+
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User, Permission
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+
+from catalog.models import BookInstance, Book, Author, Genre, Language
+from catalog.importing import import_catalog, read_records
+from catalog.search import search_books
+
+
+CSV = '''isbn,title,author,summary,language,genres,copies,imprint,status
+978-0-00-000001-1,Dry Season,"Smith, John",A summary,en,Fantasy;Horror,2,Imprint 2019,a
+9780000000029,Second Book,"Smith, John",,en,Fantasy,0,,
+9780000000029,Same ISBN,"Doe, Jane",,,,1,,
+,No ISBN,,,,,,,
+9780000000036,Too Many Copies,,,,,abc,,
+'''
+
+
+class ImportCatalogTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Author.objects.create(first_name='John', last_name='Smith')
+        Genre.objects.create(name='Fantasy')
+
+    def test_imports_csv(self):
+        result = import_catalog(read_records(io.StringIO(CSV), 'csv'), batch_size=2)
+
+        self.assertEqual((result['records'], result['books'], result['copies']), (5, 2, 2))
+        self.assertEqual((result['authors'], result['genres'], result['languages']), (0, 1, 1))
+        self.assertEqual((result['duplicates'], result['invalid']), (1, 2))
+        self.assertEqual([line for line, error in result['errors']], [5, 6])
+
+        book = Book.objects.get(isbn='9780000000011')
+        self.assertEqual(book.author.last_name, 'Smith')
+        self.assertEqual(book.language.name, 'en')
+        self.assertEqual(sorted(book.genre.values_list('name', flat=True)), ['Fantasy', 'Horror'])
+        self.assertEqual(list(book.bookinstance_set.values_list('imprint', 'status')), [('Imprint 2019', 'a')] * 2)
+        self.assertIsNotNone(book.updated_at)
+        self.assertEqual(Author.objects.count(), 1)
+        self.assertEqual(Language.objects.count(), 1)
+        self.assertEqual(search_books('season'), [book.pk])
+
+    def test_imports_jsonl_and_skips_known_isbns(self):
+        lines = [
+            json.dumps({'isbn': '1', 'title': 'First', 'genres': ['Poetry'], 'copies': 1}),
+            'not json',
+            json.dumps({'isbn': '2', 'title': 'Second', 'author': 'Doe, Jane'}),
+        ]
+        result = import_catalog(read_records(io.StringIO('\n'.join(lines)), 'jsonl'))
+        self.assertEqual((result['books'], result['copies'], result['invalid']), (2, 1, 1))
+        self.assertEqual(result['errors'], [(2, 'Not a JSON object.')])
+        self.assertEqual(BookInstance.objects.get().status, 'm')
+
+        result = import_catalog(read_records(io.StringIO('\n'.join(lines)), 'jsonl'))
+        self.assertEqual((result['books'], result['duplicates']), (0, 2))
+
+
+class CatalogImportViewTest(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username='librarian', password='12345')
+        user.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        self.client.login(username='librarian', password='12345')
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=0)
+    def test_upload_from_temporary_file(self):
+        upload = SimpleUploadedFile('books.csv', CSV.encode('utf-8'), content_type='text/csv')
+        resp = self.client.post(reverse('catalog-import'), {'file': upload})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['result']['books'], 2)
+        self.assertContains(resp, 'Invalid number of copies.')
+
+    def test_unknown_format(self):
+        upload = SimpleUploadedFile('books.xls', b'isbn,title\n1,A\n')
+        resp = self.client.post(reverse('catalog-import'), {'file': upload})
+        self.assertFormError(resp, 'form', 'file', 'Cannot tell the format of "books.xls": use a .csv or .jsonl file.')
+        self.assertEqual(Book.objects.count(), 0)
+
+    def test_requires_librarian(self):
+        self.client.logout()
+        resp = self.client.get(reverse('catalog-import'))
+        self.assertEqual(resp.status_code, 302)
@@ -0,0 +1,54 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog.instrumentation import RequestMetrics, aggregates
+from catalog.models import Book, Author
+
+
+class InstrumentationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        for book_num in range(3):
+            Book.objects.create(title='Book %s' % book_num, summary='My book summary', isbn='%s' % book_num,
+                                author=author)
+
+    def setUp(self):
+        aggregates.reset()
+        self.addCleanup(aggregates.reset)
+
+    def test_server_timing_header(self):
+        resp = self.client.get(reverse('books'))
+        self.assertRegex(resp['Server-Timing'],
+                         r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+$')
+        self.assertNotIn('tpl;dur=0.0', resp['Server-Timing'])
+
+    def test_repeated_queries_are_reported(self):
+        metrics = RequestMetrics()
+
+        def execute(sql, params, many, context):
+            return None
+
+        for pk in range(3):
+            metrics(execute, 'SELECT * FROM book WHERE id = %s', [pk], False, {})
+        metrics(execute, 'SELECT * FROM book WHERE id IN (%s, %s)', [1, 2], False, {})
+        metrics(execute, 'SELECT * FROM book WHERE id IN (%s, %s, %s)', [1, 2, 3], False, {})
+        self.assertEqual(metrics.queries, 5)
+        self.assertEqual(metrics.duplicates(), {'SELECT * FROM book WHERE id = %s': 3})
+
+    @override_settings(METRICS_ENABLED=True)
+    def test_metrics_per_url_name(self):
+        self.client.get(reverse('books'))
+        self.client.get(reverse('books'))
+        self.client.get(reverse('book-detail', args=[Book.objects.first().pk]))
+
+        resp = self.client.get(reverse('metrics'))
+        self.assertEqual(resp['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        content = resp.content.decode()
+        self.assertIn('catalog_request_duration_seconds_count{view="books"} 2', content)
+        self.assertIn('catalog_request_duration_seconds_bucket{le="+Inf",view="book-detail"} 1', content)
+        self.assertRegex(content, r'catalog_db_queries_total\{view="books"\} [1-9]')
+
+    def test_metrics_disabled_by_default(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
@@ -0,0 +1,115 @@
+import datetime
+import json
+from unittest import mock
+
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core import mail
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog import jobs
+from catalog.concurrency import ConflictError
+from catalog.models import BookInstance, Book, Job
+
+
+class OverdueJobsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = datetime.date(2019, 6, 10)
+        book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG')
+        cls.reader = User.objects.create_user(username='reader', password='12345', email='reader@example.com')
+        cls.other = User.objects.create_user(username='other', password='12345', email='other@example.com')
+        for borrower, due_back in ((cls.reader, 1), (cls.reader, 2), (cls.other, 3), (cls.other, -1)):
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=borrower,
+                                        due_back=cls.today - datetime.timedelta(days=due_back))
+
+    def test_sweep_flags_and_clears(self):
+        self.assertEqual(jobs.flag_overdue(self.today), (3, 0))
+        self.assertEqual(jobs.flag_overdue(self.today), (0, 0))
+
+        BookInstance.objects.filter(borrower=self.other).update(status='a', borrower=None, due_back=None)
+        self.assertEqual(jobs.flag_overdue(self.today), (0, 1))
+
+    def test_sweep_is_a_new_version(self):
+        copy = BookInstance.objects.filter(borrower=self.reader).first()
+        jobs.flag_overdue(self.today)
+        # A form loaded before the sweep would clear the flag.
+        copy.imprint = 'New imprint'
+        with self.assertRaises(ConflictError), transaction.atomic():
+            copy.save()
+        self.assertEqual(BookInstance.objects.get(pk=copy.pk).overdue_flagged_on, self.today)
+
+    def test_loan_list_shows_the_flag(self):
+        self.client.login(username='reader', password='12345')
+        self.assertNotContains(self.client.get(reverse('my-borrowed')), 'text-danger')
+        jobs.flag_overdue(self.today)
+        self.assertContains(self.client.get(reverse('my-borrowed')), 'class="text-danger"', count=2)
+
+    def test_one_reminder_per_borrower(self):
+        jobs.flag_overdue(self.today)
+        self.assertEqual(jobs.send_overdue_reminders(self.today, batch_size=1), 2)
+        reminder = next(message for message in mail.outbox if message.to == ['reader@example.com'])
+        self.assertEqual(reminder.body.count('"Book Title"'), 2)
+        self.assertIn('(2 days ago)', reminder.body)
+
+    def test_worker_runs_each_job_once(self):
+        now = timezone.make_aware(datetime.datetime.combine(self.today, datetime.time(3, 0)))
+        jobs.schedule_daily(now)
+        jobs.schedule_daily(now)
+        self.assertEqual(Job.objects.count(), 1)
+
+        self.assertEqual(jobs.run_pending('worker-1'), 2)
+        self.assertEqual(dict(Job.objects.values_list('name', 'status')),
+                         {'overdue_sweep': 'd', 'overdue_reminders': 'd'})
+        self.assertEqual(len(mail.outbox), 2)
+
+        jobs.schedule_daily(now)
+        self.assertEqual(jobs.run_pending('worker-2'), 0)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_claimed_job_is_locked(self):
+        job, created = jobs.schedule('overdue_sweep', self.today.isoformat())
+        self.assertEqual(jobs.claim('worker-1').pk, job.pk)
+        self.assertIsNone(jobs.claim('worker-2'))
+        # A lock left by a dead worker expires.
+        later = timezone.now() + jobs.LOCK_TIMEOUT + datetime.timedelta(minutes=1)
+        job = jobs.claim('worker-2', now=later)
+        self.assertEqual((job.locked_by, job.attempts), ('worker-2', 2))
+
+    def test_failed_job_is_retried(self):
+        jobs.JOBS['broken'] = lambda job: 1 / 0
+        self.addCleanup(jobs.JOBS.pop, 'broken')
+        job, created = jobs.schedule('broken')
+        with self.assertLogs('catalog.jobs', 'ERROR'):
+            self.assertFalse(jobs.run(jobs.claim('worker-1')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), ('p', ''))
+        self.assertIn('ZeroDivisionError', job.last_error)
+        self.assertGreater(job.run_after, timezone.now())
+
+    def test_reminders_resume_after_the_last_batch_sent(self):
+        jobs.flag_overdue(self.today)
+        sent_mail = jobs.send_mass_mail
+
+        def fail_second_batch(messages):
+            if mail.outbox:
+                raise ConnectionError('SMTP server went away')
+            return sent_mail(messages)
+
+        job, created = jobs.schedule('overdue_reminders', self.today.isoformat())
+        with mock.patch.object(jobs, 'REMINDER_BATCH_SIZE', 1), \
+                mock.patch.object(jobs, 'send_mass_mail', fail_second_batch), \
+                self.assertLogs('catalog.jobs', 'ERROR'):
+            self.assertFalse(jobs.run(jobs.claim('worker-1')))
+        self.assertEqual([message.to for message in mail.outbox], [['reader@example.com']])
+
+        # The retry only emails the borrowers the failed attempt did not reach.
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with mock.patch.object(jobs, 'REMINDER_BATCH_SIZE', 1):
+            self.assertTrue(jobs.run(jobs.claim('worker-1')))
+        self.assertEqual([message.to for message in mail.outbox], [['reader@example.com'], ['other@example.com']])
+        job.refresh_from_db()
+        self.assertEqual(json.loads(job.result), {'sent': 2})
@@ -0,0 +1,68 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Book, Genre, Author
+from catalog.search import search_books, search_terms, rebuild_index
+
+
+class BookSearchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Ray', last_name='Bradbury')
+        cls.genre = Genre.objects.create(name='Science Fiction')
+        cls.dandelion = Book.objects.create(title='Dandelion Wine', summary='A summer in Green Town.',
+                                            isbn='ABCDEFG', author=cls.author)
+        cls.martian = Book.objects.create(title='The Martian Chronicles', summary='Wine is mentioned once.',
+                                          isbn='ABCDEFG', author=cls.author)
+        cls.martian.genre.add(cls.genre)
+        cls.other = Book.objects.create(title='Other Book', summary='Nothing to see.', isbn='ABCDEFG')
+
+    def test_search_terms_drop_query_syntax(self):
+        self.assertEqual(search_terms('"Wine" AND -martian*'), ['wine', 'and', 'martian'])
+        self.assertEqual(search_terms(''), [])
+
+    def test_matches_title_summary_author_and_genre(self):
+        self.assertEqual(search_books('green town'), [self.dandelion.pk])
+        self.assertEqual(sorted(search_books('bradbury')), sorted([self.dandelion.pk, self.martian.pk]))
+        self.assertEqual(search_books('science'), [self.martian.pk])
+        self.assertEqual(search_books('nothing'), [self.other.pk])
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(search_books('wine'), [self.dandelion.pk, self.martian.pk])
+
+    def test_prefix_match(self):
+        self.assertEqual(search_books('dandel'), [self.dandelion.pk])
+
+    def test_index_follows_model_changes(self):
+        self.other.title = 'Fahrenheit 451'
+        self.other.save()
+        self.assertEqual(search_books('fahrenheit'), [self.other.pk])
+
+        self.author.last_name = 'Douglas'
+        self.author.save()
+        self.assertEqual(search_books('bradbury'), [])
+
+        self.genre.book_set.clear()
+        self.assertEqual(search_books('science'), [])
+
+        Book.objects.filter(pk=self.dandelion.pk).delete()
+        self.assertEqual(search_books('dandelion'), [])
+
+    def test_rebuild_index(self):
+        self.assertEqual(rebuild_index(), 3)
+        self.assertEqual(search_books('martian'), [self.martian.pk])
+
+    def test_search_view_paginates_results(self):
+        for book_num in range(12):
+            Book.objects.create(title='Wine %s' % book_num, summary='Summary', isbn='ABCDEFG')
+
+        resp = self.client.get(reverse('search'), {'q': 'wine'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTemplateUsed(resp, 'catalog/book_search.html')
+        self.assertEqual(len(resp.context['book_list']), 10)
+        self.assertTrue(resp.context['is_paginated'])
+
+        resp = self.client.get(resp.context['page_obj'].next_url)
+        self.assertEqual(len(resp.context['book_list']), 4)
+        self.assertFalse(resp.context['page_obj'].has_next())
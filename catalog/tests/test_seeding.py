@@ -0,0 +1,32 @@
+from django.test import TestCase
+
+from catalog.models import BookInstance, Book, Author
+from catalog.seeding import seed_library
+
+
+class SeedLibraryTest(TestCase):
+
+    def test_creates_requested_numbers_of_objects(self):
+        created = seed_library(authors=3, books=10, genres=2, languages=2, copies=50, borrowers=4)
+
+        self.assertEqual(created, {'genres': 2, 'languages': 2, 'authors': 3, 'books': 10,
+                                   'borrowers': 4, 'copies': 50})
+        self.assertEqual(Book.objects.count(), 10)
+        self.assertEqual(BookInstance.objects.count(), 50)
+        self.assertFalse(Book.objects.filter(genre__isnull=True).exists())
+        for copy in BookInstance.objects.filter(status='o'):
+            self.assertIsNotNone(copy.borrower_id)
+            self.assertIsNotNone(copy.due_back)
+
+    def test_same_seed_gives_same_data(self):
+        seed_library(authors=3, books=10, copies=20, borrowers=2, seed=7)
+        first = list(Book.objects.order_by('pk').values_list('title', 'isbn'))
+        first_authors = list(Author.objects.order_by('pk').values_list('first_name', 'last_name'))
+
+        Book.objects.all().delete()
+        Author.objects.all().delete()
+        seed_library(authors=3, books=10, copies=20, borrowers=2, seed=7)
+
+        self.assertEqual(list(Book.objects.order_by('pk').values_list('title', 'isbn')), first)
+        self.assertEqual(list(Author.objects.order_by('pk').values_list('first_name', 'last_name')), first_authors)
+        self.assertEqual(BookInstance.objects.count(), 40)
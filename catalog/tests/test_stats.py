@@ -0,0 +1,79 @@
+from django.test import TestCase, TransactionTestCase
+from django.core.cache import cache
+from django.urls import reverse
+
+from catalog.models import BookInstance, Book, Genre, Language, Author
+from catalog.stats import get_library_stats, compute_stats
+
+
+class LibraryStatsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        Genre.objects.create(name='Fantasy')
+        Language.objects.create(name='English')
+        dry_book = Book.objects.create(title='Dry Season', summary='Summary', isbn='ABCDEFG', author=author)
+        Book.objects.create(title='Wet Season', summary='Summary', isbn='ABCDEFG', author=author)
+        BookInstance.objects.create(book=dry_book, imprint='Imprint', status='a')
+        BookInstance.objects.create(book=dry_book, imprint='Imprint', status='o')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_compute_stats_uses_single_query(self):
+        with self.assertNumQueries(1):
+            stats = compute_stats()
+
+        self.assertEqual(stats, {
+            'num_books': 2,
+            'num_instances': 2,
+            'num_instances_available': 1,
+            'num_authors': 1,
+            'num_genre': 1,
+            'num_lang': 1,
+            'num_book_selection': 1,
+        })
+
+    def test_cached_stats_need_no_queries(self):
+        get_library_stats()
+        with self.assertNumQueries(0):
+            stats = get_library_stats()
+        self.assertEqual(stats['num_books'], 2)
+
+    def test_index_shows_stats(self):
+        resp = self.client.get(reverse('index'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['num_instances_available'], 1)
+        self.assertEqual(resp.context['key_word'], 'dry')
+
+
+class LibraryStatsInvalidationTest(TransactionTestCase):
+    # Cached counters are adjusted on commit, so real transactions are needed.
+
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.book = Book.objects.create(title='Wet Season', summary='Summary', isbn='ABCDEFG', author=self.author)
+        get_library_stats()
+
+    def test_cached_stats_follow_model_changes(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='m')
+        copy.status = 'a'
+        copy.save()
+        self.book.title = 'Dry Season'
+        self.book.save()
+        Genre.objects.create(name='Fantasy')
+        self.author.delete()
+
+        with self.assertNumQueries(0):
+            stats = get_library_stats()
+        self.assertEqual(stats, compute_stats())
+
+    def test_deleting_copies_updates_cached_stats(self):
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        BookInstance.objects.all().delete()
+
+        stats = get_library_stats()
+        self.assertEqual(stats['num_instances'], 0)
+        self.assertEqual(stats['num_instances_available'], 0)
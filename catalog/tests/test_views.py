@@ -1,4 +1,6 @@
 from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
 
 # Create your tests here.
 
@@ -9,6 +11,7 @@ from django.contrib.auth.models import User, Permission
 
 
 import datetime
+import json
 from django.utils import timezone
 
 from catalog.models import BookInstance, Book, Genre, Language, Author
@@ -46,12 +49,96 @@ class AuthorListViewTest(TestCase):
         self.assertTrue(len(resp.context['author_list']) == 10)
 
     def test_lists_all_authors(self):
-        # Get second page and confirm it has (exactly) remaining 3 items
-        resp = self.client.get(reverse('authors') + '?page=2')
+        # Follow the next cursor and confirm the second page has (exactly) remaining 3 items
+        resp = self.client.get(reverse('authors'))
+        resp = self.client.get(resp.context['page_obj'].next_url)
         self.assertEqual(resp.status_code, 200)
         self.assertTrue('is_paginated' in resp.context)
         self.assertTrue(resp.context['is_paginated'] == True)
         self.assertTrue(len(resp.context['author_list']) == 3)
+        self.assertFalse(resp.context['page_obj'].has_next())
+
+    def test_previous_cursor_returns_first_page(self):
+        first = self.client.get(reverse('authors'))
+        second = self.client.get(first.context['page_obj'].next_url)
+        resp = self.client.get(second.context['page_obj'].previous_url)
+        self.assertEqual(list(resp.context['author_list']), list(first.context['author_list']))
+
+    def test_invalid_cursor_is_not_found(self):
+        resp = self.client.get(reverse('authors') + '?cursor=garbage')
+        self.assertEqual(resp.status_code, 404)
+
+
+class BookDetailViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        test_author = Author.objects.create(first_name='John', last_name='Smith')
+        test_language = Language.objects.create(name='English')
+        cls.test_book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG',
+                                            author=test_author, language=test_language)
+        cls.test_book.genre.set([Genre.objects.create(name='Fantasy'), Genre.objects.create(name='Horror')])
+        BookInstance.objects.create(book=cls.test_book, imprint='Unlikely Imprint, 2016', status='a')
+
+    def setUp(self):
+        # Rendered fragments outlive the test transactions.
+        cache.clear()
+
+    def test_view_uses_correct_template(self):
+        resp = self.client.get(reverse('book-detail', args=[self.test_book.pk]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTemplateUsed(resp, 'catalog/book_detail.html')
+        self.assertContains(resp, 'Fantasy')
+
+    def test_query_count_does_not_depend_on_number_of_copies(self):
+        # Modification times, book, genres, copies.
+        with self.assertNumQueries(4):
+            self.client.get(reverse('book-detail', args=[self.test_book.pk]))
+
+        for copy_num in range(20):
+            BookInstance.objects.create(book=self.test_book, imprint='Imprint %s' % copy_num,
+                                        due_back=datetime.date.today(), status='o')
+
+        with self.assertNumQueries(4):
+            resp = self.client.get(reverse('book-detail', args=[self.test_book.pk]))
+        self.assertContains(resp, 'On loan', count=20)
+
+
+class AuthorDetailViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.test_author = Author.objects.create(first_name='John', last_name='Smith')
+        test_book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG',
+                                        author=cls.test_author)
+        BookInstance.objects.create(book=test_book, imprint='Unlikely Imprint, 2016', status='a')
+        BookInstance.objects.create(book=test_book, imprint='Unlikely Imprint, 2016', status='o')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_books_are_annotated_with_copy_counts(self):
+        resp = self.client.get(reverse('author-detail', args=[self.test_author.pk]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTemplateUsed(resp, 'catalog/author_detail.html')
+
+        book = resp.context['book_list'][0]
+        self.assertEqual(book.num_copies, 2)
+        self.assertEqual(book.num_copies_available, 1)
+
+    def test_query_count_does_not_depend_on_number_of_books(self):
+        # Modification times, author, books with their copy counts.
+        with self.assertNumQueries(3):
+            self.client.get(reverse('author-detail', args=[self.test_author.pk]))
+
+        for book_num in range(10):
+            book = Book.objects.create(title='Book %s' % book_num, summary='My book summary', isbn='ABCDEFG',
+                                       author=self.test_author)
+            BookInstance.objects.create(book=book, imprint='Unlikely Imprint, 2016', status='a')
+
+        with self.assertNumQueries(3):
+            resp = self.client.get(reverse('author-detail', args=[self.test_author.pk]))
+        self.assertEqual(len(resp.context['book_list']), 11)
 
 
 class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
@@ -169,6 +256,37 @@ class LoanedBookInstancesByUserListViewTest(TestCase):
         last_date = datetime.date.today()
         for copy in resp.context['bookinstance_list']:
             self.assertTrue(last_date <= copy.due_back)
+            last_date = copy.due_back
+
+    def test_cursor_pages_cover_every_loan_once(self):
+        for copy in BookInstance.objects.all():
+            copy.status = 'o'
+            copy.save()
+        # Copies without a due date sort where the database puts NULLs: first on SQLite, last on PostgreSQL.
+        undated = list(BookInstance.objects.filter(borrower__username='testuser1').values_list('pk', flat=True)[:3])
+        BookInstance.objects.filter(pk__in=undated).update(due_back=None)
+
+        login = self.client.login(username='testuser1', password='12345')
+        seen = []
+        url = reverse('my-borrowed')
+        while url:
+            resp = self.client.get(url)
+            seen.extend(copy.pk for copy in resp.context['bookinstance_list'])
+            url = resp.context['page_obj'].next_url
+
+        expected = BookInstance.objects.filter(borrower__username='testuser1', status='o')
+        self.assertEqual(sorted(seen), sorted(expected.values_list('pk', flat=True)))
+        undated_seen = seen[-len(undated):] if connection.features.nulls_order_largest else seen[:len(undated)]
+        self.assertEqual(sorted(undated_seen), sorted(undated))
+
+        # Walking back from the last page lists the same copies in the same order.
+        seen_backwards = [copy.pk for copy in resp.context['bookinstance_list']]
+        url = resp.context['page_obj'].previous_url
+        while url:
+            resp = self.client.get(url)
+            seen_backwards[:0] = [copy.pk for copy in resp.context['bookinstance_list']]
+            url = resp.context['page_obj'].previous_url
+        self.assertEqual(seen_backwards, seen)
 
 
 class RenewBookInstancesViewTest(TestCase):
@@ -214,7 +332,7 @@ class RenewBookInstancesViewTest(TestCase):
         login = self.client.login(username='testuser2', password='12345')
         valid_date_in_future = datetime.date.today() + datetime.timedelta(weeks=2)
         resp = self.client.post(reverse('renew-book-librarian', kwargs={'pk': self.test_bookinstance1.pk, }),
-                                {'renewal_date': valid_date_in_future})
+                                {'renewal_date': valid_date_in_future, 'version': self.test_bookinstance1.version})
         self.assertRedirects(resp, reverse('all-borrowed'))
 
     def test_form_invalid_renewal_date_past(self):
@@ -292,3 +410,137 @@ class AuthorCreateViewTest(TestCase):
 
 
             self.assertRedirects(resp, reverse('author_detail', kwargs={'pk': self.test_author.pk, }))
+
+
+class BulkCirculationViewTest(TestCase):
+
+    def setUp(self):
+        test_user1 = User.objects.create_user(username='testuser1', password='12345')
+        test_user2 = User.objects.create_user(username='testuser2', password='12345')
+        permission = Permission.objects.get(name='Set book as returned')
+        test_user2.user_permissions.add(permission)
+
+        test_book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG')
+        self.available = [BookInstance.objects.create(book=test_book, imprint='Imprint', status='a')
+                          for _ in range(3)]
+        self.on_loan = BookInstance.objects.create(book=test_book, imprint='Imprint', status='o',
+                                                   borrower=test_user1, due_back=datetime.date.today())
+
+    def post(self, data):
+        return self.client.post(reverse('bulk-circulation'), json.dumps(data), content_type='application/json')
+
+    def test_forbidden_without_permission(self):
+        self.client.login(username='testuser1', password='12345')
+        resp = self.post({'action': 'check_in', 'copies': [str(self.on_loan.pk)]})
+        self.assertEqual(resp.status_code, 403)
+
+    def test_check_out_in_a_fixed_number_of_queries(self):
+        self.client.login(username='testuser2', password='12345')
+        copies = [str(copy.pk) for copy in self.available] + [str(self.on_loan.pk), 'not-a-uuid']
+
+        # User, permissions (2), borrower, savepoint, read, update, book counters, authors of
+        # the books (for fragment versions), release: whatever the number of copies. The
+        # session comes from the cache (cached_db).
+        with self.assertNumQueries(10):
+            resp = self.post({'action': 'check_out', 'copies': copies, 'borrower': 'testuser1'})
+
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(data['updated'], 3)
+        self.assertEqual([item['result'] for item in data['results']],
+                         ['ok', 'ok', 'ok', 'wrong status: o', 'invalid id'])
+
+        due_back = datetime.date.today() + datetime.timedelta(weeks=3)
+        for copy in self.available:
+            copy.refresh_from_db()
+            self.assertEqual((copy.status, copy.borrower.username, copy.due_back), ('o', 'testuser1', due_back))
+
+    def test_check_in_and_renew(self):
+        self.client.login(username='testuser2', password='12345')
+        renewal_date = datetime.date.today() + datetime.timedelta(weeks=2)
+
+        resp = self.post({'action': 'renew', 'copies': [str(self.on_loan.pk)], 'due_back': str(renewal_date)})
+        self.assertEqual(resp.json()['updated'], 1)
+        self.on_loan.refresh_from_db()
+        self.assertEqual(self.on_loan.due_back, renewal_date)
+
+        resp = self.post({'action': 'check_in', 'copies': [str(self.on_loan.pk)]})
+        self.assertEqual(resp.json()['updated'], 1)
+        self.on_loan.refresh_from_db()
+        self.assertEqual((self.on_loan.status, self.on_loan.borrower, self.on_loan.due_back), ('a', None, None))
+
+    def test_invalid_requests(self):
+        self.client.login(username='testuser2', password='12345')
+        too_late = datetime.date.today() + datetime.timedelta(weeks=5)
+
+        self.assertEqual(self.post({'action': 'burn', 'copies': []}).status_code, 400)
+        self.assertEqual(self.post({'action': 'check_out', 'copies': []}).status_code, 400)
+        self.assertEqual(self.post({'action': 'check_in', 'copies': 'abc'}).status_code, 400)
+        resp = self.post({'action': 'renew', 'copies': [str(self.on_loan.pk)], 'due_back': str(too_late)})
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()['error'], 'Invalid date - renewal more than 4 weeks ahead')
+
+
+class OverdueReportViewTest(TestCase):
+
+    def setUp(self):
+        test_user1 = User.objects.create_user(username='testuser1', password='12345')
+        test_user2 = User.objects.create_user(username='testuser2', password='12345')
+        permission = Permission.objects.get(name='Set book as returned')
+        test_user2.user_permissions.add(permission)
+
+        self.test_book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG')
+        today = datetime.date.today()
+        for days in (3, 10):
+            BookInstance.objects.create(book=self.test_book, imprint='Imprint', status='o', borrower=test_user1,
+                                        due_back=today - datetime.timedelta(days=days))
+        # Neither overdue nor on loan.
+        BookInstance.objects.create(book=self.test_book, imprint='Imprint', status='o', borrower=test_user1,
+                                    due_back=today)
+        BookInstance.objects.create(book=self.test_book, imprint='Imprint', status='a',
+                                    due_back=today - datetime.timedelta(days=1))
+
+    def test_redirect_without_permission(self):
+        self.client.login(username='testuser1', password='12345')
+        resp = self.client.get(reverse('overdue'))
+        self.assertEqual(resp.status_code, 302)
+
+    def test_summary_by_borrower_and_book(self):
+        self.client.login(username='testuser2', password='12345')
+        resp = self.client.get(reverse('overdue'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTemplateUsed(resp, 'catalog/overdue_report.html')
+
+        by_borrower = list(resp.context['by_borrower'])
+        self.assertEqual(len(by_borrower), 1)
+        self.assertEqual(by_borrower[0]['borrower__username'], 'testuser1')
+        self.assertEqual(by_borrower[0]['copies'], 2)
+        self.assertEqual(by_borrower[0]['oldest_due_back'], datetime.date.today() - datetime.timedelta(days=10))
+        self.assertEqual(resp.context['by_book'][0]['copies'], 2)
+        self.assertEqual(resp.context['by_days'], [{'band': '1 to 7 days', 'copies': 1},
+                                                   {'band': '8 to 30 days', 'copies': 1}])
+
+    def test_borrowers_are_limited(self):
+        today = datetime.date.today()
+        for number in range(55):
+            borrower = User.objects.create_user(username='borrower%s' % number, password='12345')
+            BookInstance.objects.create(book=self.test_book, imprint='Imprint', status='o', borrower=borrower,
+                                        due_back=today - datetime.timedelta(days=100))
+        self.client.login(username='testuser2', password='12345')
+        resp = self.client.get(reverse('overdue'))
+        self.assertEqual(len(resp.context['by_borrower']), 50)
+        self.assertEqual(resp.context['by_days'][-1], {'band': 'More than 90 days', 'copies': 55})
+
+    def test_csv_export_streams_overdue_loans(self):
+        self.client.login(username='testuser2', password='12345')
+        resp = self.client.get(reverse('overdue-csv'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp['Content-Type'], 'text/csv')
+
+        lines = b''.join(resp.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'copy,book,borrower,due_back,days_overdue')
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].endswith(',Book Title,testuser1,%s,10' % (
+            datetime.date.today() - datetime.timedelta(days=10))))
+        self.assertTrue(lines[2].endswith(',3'))
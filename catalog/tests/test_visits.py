@@ -0,0 +1,69 @@
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import visits
+from catalog.models import VisitCount
+
+
+@override_settings(VISIT_COUNTER='buffered', VISIT_FLUSH_SIZE=100, VISIT_FLUSH_INTERVAL=3600,
+                   SESSION_ENGINE='django.contrib.sessions.backends.db')
+class BufferedVisitsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        visits.buffer.clear()
+
+    def tearDown(self):
+        visits.buffer.clear()
+
+    def visit(self):
+        return self.client.get(reverse('index')).context['num_visits']
+
+    def test_visits_are_counted(self):
+        self.assertEqual([self.visit() for _ in range(3)], [0, 1, 2])
+        self.assertFalse(VisitCount.objects.exists())
+
+        self.assertEqual(visits.buffer.flush(), 1)
+        self.assertEqual(VisitCount.objects.get().count, 3)
+        self.assertEqual(self.visit(), 3)
+
+    def test_no_session_is_written(self):
+        self.visit()
+        self.visit()
+        self.assertFalse(Session.objects.exists())
+        self.assertNotIn('sessionid', self.client.cookies)
+
+    def test_visitor_without_cookie_is_not_buffered(self):
+        self.visit()
+        self.client.cookies.clear()
+        self.assertEqual(self.visit(), 0)
+        self.assertEqual(visits.buffer.pending, {})
+
+    def test_tampered_cookie_counts_as_new_visitor(self):
+        self.visit()
+        self.client.cookies[visits.COOKIE_NAME] = 'forged'
+        self.assertEqual(self.visit(), 0)
+
+    def test_buffer_is_written_in_one_batch(self):
+        with self.settings(VISIT_FLUSH_SIZE=3):
+            for visitor in ('a', 'b'):
+                visits.buffer.add(visitor)
+            visits.buffer.add('a')
+            VisitCount.objects.create(visitor='c', count=4)
+            with self.assertNumQueries(5):
+                # Savepoint, insert of the new rows, one update per increment, release.
+                visits.buffer.add('c')
+        self.assertEqual(visits.buffer.pending, {})
+        self.assertEqual(dict(VisitCount.objects.values_list('visitor', 'count')), {'a': 3, 'b': 2, 'c': 5})
+
+
+@override_settings(VISIT_COUNTER='session')
+class SessionVisitsTest(TestCase):
+
+    def test_visits_are_counted_in_the_session(self):
+        counts = [self.client.get(reverse('index')).context['num_visits'] for _ in range(3)]
+        self.assertEqual(counts, [0, 1, 2])
+        self.assertEqual(self.client.session['num_visits'], 3)
+        self.assertFalse(VisitCount.objects.exists())
@@ -0,0 +1,45 @@
+import copy
+import os
+
+from django.conf import settings
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.test import SimpleTestCase, override_settings
+
+from catalog.warmup import template_names, warm_up_templates
+
+
+def templates_with_loaders(cached):
+    # The default depends on DEBUG (settings.TEMPLATE_CACHE).
+    templates = copy.deepcopy(settings.TEMPLATES)
+    loaders = settings.TEMPLATE_LOADERS
+    templates[0]['OPTIONS']['loaders'] = [('django.template.loaders.cached.Loader', loaders)] if cached else loaders
+    return templates
+
+
+class TemplateWarmUpTest(SimpleTestCase):
+
+    def cached_loader(self):
+        engine = engines.all()[0].engine
+        return next(loader for loader in engine.template_loaders if isinstance(loader, CachedLoader))
+
+    def test_template_dirs_do_not_depend_on_the_working_directory(self):
+        for directory in settings.TEMPLATES[0]['DIRS']:
+            self.assertTrue(os.path.isabs(directory))
+            self.assertTrue(os.path.isdir(directory))
+
+    @override_settings(TEMPLATES=templates_with_loaders(cached=True))
+    def test_catalog_and_registration_templates_are_compiled(self):
+        names = template_names()
+        self.assertIn('base_generic.html', names)
+        self.assertIn('catalog/book_list.html', names)
+        self.assertIn('registration/login.html', names)
+
+        loader = self.cached_loader()
+        self.assertEqual(warm_up_templates(), len(names))
+        self.assertTrue(set(names) <= set(loader.get_template_cache))
+
+    @override_settings(TEMPLATES=templates_with_loaders(cached=False))
+    def test_nothing_is_compiled_without_the_cached_loader(self):
+        with self.assertLogs('catalog.warmup', 'WARNING'):
+            self.assertEqual(warm_up_templates(), 0)
@@ -7,6 +7,7 @@ urlpatterns = [
     url(r'^$', views.index, name='index'),
 
     url(r'^books/$', views.BookListView.as_view(), name='books'),
+    url(r'^search/$', views.book_search, name='search'),
     url(r'^book/(?P<pk>\d+)$', views.BookDetailView.as_view(), name='book-detail'),
 
     url(r'^authors/$', views.AuthorListView.as_view(), name='authors'),
@@ -18,6 +19,18 @@ urlpatterns = [
 
 urlpatterns += [
     url(r'^book/(?P<pk>[-\w]+)/renew/$', views.renew_book_librarian, name='renew-book-librarian'),
+    url(r'^circulation/bulk/$', views.bulk_circulation, name='bulk-circulation'),
+    url(r'^overdue/$', views.overdue_report, name='overdue'),
+    url(r'^overdue\.csv$', views.overdue_report_csv, name='overdue-csv'),
+    url(r'^book/(?P<pk>\d+)/hold/$', views.place_hold, name='place-hold'),
+    url(r'^hold/(?P<pk>\d+)/cancel/$', views.cancel_hold, name='cancel-hold'),
+    url(r'^import/$', views.catalog_import, name='catalog-import'),
+    url(r'^export/$', views.catalog_export, name='catalog-export'),
+]
+
+urlpatterns += [
+    url(r'^api/v1/(?P<resource>[a-z]+)/$', views.api_list, name='api-list'),
+    url(r'^api/v1/(?P<resource>[a-z]+)/(?P<pk>[-\w]+)/$', views.api_detail, name='api-detail'),
 ]
 
 urlpatterns += [
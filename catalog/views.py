@@ -5,19 +5,35 @@ from django.views.generic.detail import SingleObjectMixin
 from django.views.generic.edit import CreateView, UpdateView, DeleteView, FormMixin
 
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.contrib.auth.decorators import permission_required
+from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.backends import ModelBackend
 
 from django.core.exceptions import PermissionDenied
 
-from django.http import HttpResponseRedirect, HttpRequest
+from django.http import HttpResponse, HttpResponseRedirect, HttpRequest, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
 
 from django.urls import reverse, reverse_lazy
 
-from .forms import RenewBookForm
-from .models import Book, Author, BookInstance, Genre, Language
+from django.db.models import Count, IntegerField, Max, OuterRef, Q, Subquery
 
+from .forms import RenewBookForm, CatalogImportForm
+from . import api, circulation, exporting, holds, importing, reports, visits
+from .exporting import Echo
+from .concurrency import ConflictError, update_copy
+from .conditional import ConditionalGetMixin
+from .pagination import CursorPaginationMixin, CursorPage
+from .fragments import VersionedFragmentsMixin
+from .search import search_books
+from .models import Book, Author, BookInstance, Genre, Language, Hold
+from .stats import get_library_stats, SELECTION_KEY_WORD
+
+from django.contrib.auth.models import User
+
+import csv
 import datetime
+import io
+import json
 
 
 # Create your views here.
@@ -26,75 +42,161 @@ def index(request):
     """
     Функция отображения для домашней страницы сайта.
     """
-    # Генерация "количеств" некоторых главных объектов
-    num_books = Book.objects.all().count()
-    num_instances = BookInstance.objects.all().count()
-    # Доступные книги (статус = 'a')
-    num_instances_available = BookInstance.objects.filter(status__exact='a').count()
-    num_authors = Author.objects.count()  # Метод 'all()' применен по умолчанию.
-    num_genre = Genre.objects.count()
-    num_lang = Language.objects.count()
-
-    key_word = 'dry'
-    num_book_selection = Book.objects.filter(title__icontains = key_word).count()
-
-    # Number of visits to this view, as counted in the session variable.
-    num_visits = request.session.get('num_visits', 0)
-    request.session['num_visits'] = num_visits + 1
+    # Счётчики главных объектов: один запрос при промахе кэша, ноль в остальное время
+    stats = get_library_stats()
+
+    # Number of visits to this view: buffered and written in batches (see catalog.visits),
+    # or counted in the session variable, which saves the session on every visit.
+    new_visitor = None
+    if visits.is_buffered():
+        num_visits, new_visitor = visits.record_visit(request)
+    else:
+        num_visits = request.session.get('num_visits', 0)
+        request.session['num_visits'] = num_visits + 1
 
     # Отрисовка HTML-шаблона index.html с данными внутри
     # переменной контекста context
-    return render(
+    response = render(
         request,
         'index.html',
-        context={'num_books': num_books, 'num_instances': num_instances,
-                 'num_instances_available': num_instances_available, 'num_authors': num_authors,
-                 'num_genre': num_genre, 'num_book_selection': num_book_selection, 'key_word': key_word,
-                 'num_lang': num_lang, 'num_visits':num_visits},
+        context=dict(stats, key_word=SELECTION_KEY_WORD, num_visits=num_visits),
     )
+    if new_visitor:
+        visits.set_visitor_cookie(response, new_visitor)
+    return response
+
+
+def book_search(request):
+    """
+    View function for full-text search over book titles, summaries, authors and genres.
+    """
+    query = request.GET.get('q', '').strip()
+    page_size = 10
+    try:
+        page_number = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page_number = 1
 
+    # One extra id tells whether there is a next page, without counting all matches.
+    book_ids = search_books(query, limit=page_size + 1, offset=(page_number - 1) * page_size)
+    has_next = len(book_ids) > page_size
+    book_ids = book_ids[:page_size]
 
-class BookListView(generic.ListView, LoginRequiredMixin):
+    books = Book.objects.select_related('author').in_bulk(book_ids)
+    book_list = [books[pk] for pk in book_ids if pk in books]
+
+    def page_url(number):
+        params = request.GET.copy()
+        params['page'] = number
+        return '{0}?{1}'.format(request.path, params.urlencode())
+
+    page = CursorPage(book_list,
+                      next_url=page_url(page_number + 1) if has_next else None,
+                      previous_url=page_url(page_number - 1) if page_number > 1 else None)
+
+    return render(request, 'catalog/book_search.html', {
+        'query': query, 'book_list': book_list, 'page_obj': page, 'is_paginated': page.has_other_pages(),
+    })
+
+
+class BookListView(ConditionalGetMixin, VersionedFragmentsMixin, CursorPaginationMixin, generic.ListView,
+                   LoginRequiredMixin):
     permission_required = 'catalog.can_mark_returned'
 
-    model = Book
+    queryset = Book.objects.select_related('author')
     paginate_by = 5
+    cursor_ordering = ('title', 'pk')
+    # Deleting a row of the page would move Last-Modified backwards (see catalog.conditional).
+    send_last_modified = False
+    # The rows show their author.
+    modification_fields = ('pk', 'updated_at', 'author__updated_at')
 
-class BookDetailView(generic.DetailView):
-    model = Book
 
+class BookDetailView(ConditionalGetMixin, VersionedFragmentsMixin, generic.DetailView):
+    model = Book
 
-class AuthorListView(generic.ListView, LoginRequiredMixin):
+    def get_queryset(self):
+        return Book.objects.select_related('author', 'language')
+
+    def get_modification_rows(self):
+        # The book, its author and its copies, in one query.
+        copies = BookInstance.objects.filter(book=OuterRef('pk')).order_by().values('book')
+        return Book.objects.filter(pk=self.kwargs[self.pk_url_kwarg]).values_list(
+            'updated_at', 'author__updated_at',
+            Subquery(copies.annotate(latest=Max('updated_at')).values('latest')),
+            Subquery(copies.annotate(count=Count('pk')).values('count')),
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Evaluated by the template only when its cached fragment is stale:
+        # four queries in total whatever the number of copies, two when cached.
+        context['genre_list'] = self.object.genre.all()
+        context['copy_list'] = self.object.bookinstance_set.only('id', 'book_id', 'imprint', 'due_back', 'status')
+        return context
+
+
+class AuthorListView(ConditionalGetMixin, VersionedFragmentsMixin, CursorPaginationMixin, generic.ListView,
+                     LoginRequiredMixin):
     permission_required = 'catalog.can_mark_returned'
 
     model = Author
     paginate_by = 10
+    cursor_ordering = ('last_name', 'first_name', 'pk')
+    # Deleting a row of the page would move Last-Modified backwards (see catalog.conditional).
+    send_last_modified = False
+
 
-class AuthorDetailView(generic.DetailView):
+class AuthorDetailView(ConditionalGetMixin, VersionedFragmentsMixin, generic.DetailView):
     model = Author
 
+    def get_modification_rows(self):
+        # The author, their books and the books' copies, in one query.
+        return Author.objects.filter(pk=self.kwargs[self.pk_url_kwarg]).values_list(
+            'updated_at', Max('book__updated_at'), Max('book__bookinstance__updated_at'),
+            Count('book', distinct=True), Count('book__bookinstance'),
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Copy counts are stored on the books (see catalog.availability).
+        # Lazy, so a cached fragment skips the query.
+        context['book_list'] = self.object.book_set.order_by('title')
+        return context
 
-class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
+
+class LoanedBooksByUserListView(LoginRequiredMixin, CursorPaginationMixin, generic.ListView):
     """
     Generic class-based view listing books on loan to current user.
     """
     model = BookInstance
     template_name = 'catalog/bookinstance_list_borrowed_user.html'
     paginate_by = 5
+    cursor_ordering = ('due_back', 'pk')
 
     def get_queryset(self):
-        return BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='o').order_by('due_back')
+        return BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='o').select_related('book')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Open holds, with the number of waiting holds placed before each one.
+        ahead = (Hold.objects.filter(book=OuterRef('book'), status='w', created_at__lt=OuterRef('created_at'))
+                 .order_by().values('book').annotate(count=Count('pk')).values('count'))
+        context['hold_list'] = (Hold.objects.filter(borrower=self.request.user, status__in=holds.OPEN_STATUSES)
+                                .select_related('book').annotate(ahead=Subquery(ahead, output_field=IntegerField())))
+        return context
 
 
-class AllLoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
+class AllLoanedBooksByUserListView(LoginRequiredMixin, CursorPaginationMixin, generic.ListView):
 
     model = BookInstance
     permission_required = 'catalog.can_mark_returned'
     template_name = 'catalog/bookinstance_list_all_borrowed_user.html'
     paginate_by = 5
+    cursor_ordering = ('due_back', 'pk')
 
     def get_queryset(self):
-        return BookInstance.objects.filter(status__exact='o').order_by('due_back')
+        return BookInstance.objects.filter(status__exact='o').select_related('book', 'borrower')
 
 
 
@@ -113,9 +215,21 @@ def renew_book_librarian(request, pk):
 
         # Check if the form is valid:
         if form.is_valid():
-            # process the data in form.cleaned_data as required (here we just write it to the model due_back field)
-            book_inst.due_back = form.cleaned_data['renewal_date']
-            book_inst.save()
+            # Write only due_back, and only if nobody changed the copy since the form was loaded.
+            try:
+                if form.cleaned_data['version'] is None:
+                    # Without the version it was filled in for, the form could overwrite anything.
+                    raise ConflictError('This copy may have been changed since you loaded it.')
+                # Renewed, so no longer overdue (the nightly sweep flags overdue copies, see catalog.jobs).
+                update_copy(book_inst, form.cleaned_data['version'], due_back=form.cleaned_data['renewal_date'],
+                            overdue_flagged_on=None)
+            except ConflictError as e:
+                # Show the copy as it is now, with a form for its current version.
+                book_inst = get_object_or_404(BookInstance, pk=pk)
+                form = RenewBookForm(initial={'renewal_date': form.cleaned_data['renewal_date'],
+                                              'version': book_inst.version})
+                return render(request, 'catalog/book_renew_librarian.html',
+                              {'form': form, 'bookinst': book_inst, 'conflict': str(e)}, status=409)
 
             # redirect to a new URL:
             return HttpResponseRedirect(reverse('all-borrowed') )
@@ -123,11 +237,194 @@ def renew_book_librarian(request, pk):
     # If this is a GET (or any other method) create the default form.
     else:
         proposed_renewal_date = datetime.date.today() + datetime.timedelta(weeks=3)
-        form = RenewBookForm(initial={'renewal_date': proposed_renewal_date,})
+        form = RenewBookForm(initial={'renewal_date': proposed_renewal_date, 'version': book_inst.version})
 
     return render(request, 'catalog/book_renew_librarian.html', {'form': form, 'bookinst':book_inst})
 
 
+@require_POST
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+def bulk_circulation(request):
+    """
+    View function checking out, checking in or renewing a batch of copies in one transaction.
+
+    Expects a JSON body such as
+    {"action": "check_out", "copies": ["<uuid>", ...], "borrower": "<username>", "due_back": "2019-07-01"},
+    where "action" is one of "check_out", "check_in" or "renew", "borrower" is
+    only used by "check_out" and "due_back" is optional (3 weeks from today).
+    """
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+        if not isinstance(data, dict):
+            raise ValueError('Expected a JSON object.')
+    except ValueError as e:
+        return JsonResponse({'error': 'Invalid JSON: %s' % e}, status=400)
+
+    borrower = None
+    if data.get('borrower'):
+        borrower = User.objects.filter(username=data['borrower']).first()
+        if borrower is None:
+            return JsonResponse({'error': 'Unknown borrower "%s".' % data['borrower']}, status=400)
+
+    due_back = None
+    if data.get('due_back'):
+        # Same rules as a single renewal.
+        form = RenewBookForm({'renewal_date': data['due_back']})
+        if not form.is_valid():
+            return JsonResponse({'error': form.errors['renewal_date'][0]}, status=400)
+        due_back = form.cleaned_data['renewal_date']
+
+    try:
+        updated, results = circulation.apply(data.get('action'), data.get('copies'), borrower, due_back)
+    except circulation.CirculationError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({'action': data['action'], 'updated': updated, 'results': results})
+
+
+@require_POST
+@login_required
+def place_hold(request, pk):
+    """
+    View function putting the current user in the queue for a book.
+    """
+    book = get_object_or_404(Book, pk=pk)
+    try:
+        holds.place_hold(book, request.user)
+    except holds.HoldError:
+        # Already queued: the hold is listed on the same page.
+        pass
+    return HttpResponseRedirect(reverse('my-borrowed'))
+
+
+@require_POST
+@login_required
+def cancel_hold(request, pk):
+    """
+    View function cancelling one of the current user's holds.
+    """
+    hold = get_object_or_404(Hold, pk=pk, borrower=request.user)
+    try:
+        holds.cancel_hold(hold)
+    except holds.HoldError:
+        pass
+    return HttpResponseRedirect(reverse('my-borrowed'))
+
+
+@permission_required('catalog.can_mark_returned')
+def catalog_import(request):
+    """
+    View function importing books and copies from an uploaded CSV or JSONL file.
+    """
+    result = None
+    if request.method == 'POST':
+        form = CatalogImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            # Read a line at a time, whether the upload is in memory or in a temporary file.
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            try:
+                file_format = form.cleaned_data['format'] or importing.guess_format(upload.name)
+                result = importing.import_catalog(importing.read_records(stream, file_format))
+            except importing.ImportFormatError as e:
+                form.add_error('file', str(e))
+            except UnicodeDecodeError:
+                form.add_error('file', 'The file is not UTF-8 text.')
+            finally:
+                stream.detach()
+    else:
+        form = CatalogImportForm()
+
+    return render(request, 'catalog/catalog_import.html', {'form': form, 'result': result})
+
+
+def _api_response(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params={'separators': (',', ':')})
+
+
+def api_list(request, resource):
+    """
+    View function listing a catalogue resource as JSON, a page at a time (see catalog.api).
+    """
+    def page_url(cursor):
+        params = request.GET.copy()
+        params.pop('cursor', None)
+        if cursor:
+            params['cursor'] = cursor
+        return request.build_absolute_uri('{0}?{1}'.format(request.path, params.urlencode()))
+
+    if resource not in api.RESOURCES:
+        return _api_response({'error': 'Not found.'}, status=404)
+    try:
+        return _api_response(api.list_page(resource, request.GET, page_url))
+    except api.ApiError as e:
+        return _api_response({'error': str(e)}, status=400)
+
+
+def api_detail(request, resource, pk):
+    """
+    View function returning one object of a catalogue resource as JSON.
+    """
+    if resource not in api.RESOURCES:
+        return _api_response({'error': 'Not found.'}, status=404)
+    try:
+        data = api.detail(resource, pk, request.GET)
+    except api.ApiError as e:
+        return _api_response({'error': str(e)}, status=400)
+    if data is None:
+        return _api_response({'error': 'Not found.'}, status=404)
+    return _api_response(data)
+
+
+@permission_required('catalog.can_mark_returned')
+def overdue_report(request):
+    """
+    View function summarizing overdue loans by days overdue, by borrower and by book.
+    The borrower and book tables show the first 50 rows; the CSV has every loan.
+    """
+    return render(request, 'catalog/overdue_report.html', {
+        'by_days': reports.overdue_by_days(),
+        'by_borrower': reports.overdue_by_borrower()[:50],
+        'by_book': reports.overdue_by_book()[:50],
+    })
+
+
+@permission_required('catalog.can_mark_returned')
+def overdue_report_csv(request):
+    """
+    View function streaming every overdue loan as CSV, in constant memory.
+    """
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse((writer.writerow(row) for row in reports.overdue_csv_rows()),
+                                     content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="overdue-{0}.csv"'.format(datetime.date.today())
+    return response
+
+
+EXPORT_CONTENT_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+@permission_required('catalog.can_mark_returned')
+def catalog_export(request):
+    """
+    View function streaming the whole catalogue as CSV or JSON Lines (?format=),
+    gzip-compressed with ?gzip=1, in constant memory.
+    """
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in EXPORT_CONTENT_TYPES:
+        return HttpResponse('Unknown format.', status=400, content_type='text/plain')
+    compress = request.GET.get('gzip') == '1'
+
+    filename = 'catalog-{0}.{1}'.format(datetime.date.today(), file_format)
+    if compress:
+        filename += '.gz'
+    response = StreamingHttpResponse(exporting.encode(exporting.export_lines(file_format), compress=compress),
+                                     content_type='application/gzip' if compress else
+                                     EXPORT_CONTENT_TYPES[file_format] + '; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="{0}"'.format(filename)
+    return response
+
+
 # Author redaction
 
 class AuthorCreate(CreateView):
@@ -180,7 +477,7 @@ class BookCreate(CreateView):
 
 class BookUpdate(UpdateView):
     model = Book
-    fields = ['first_name','last_name','date_of_birth','date_of_death']
+    fields = ['title','author','summary','isbn','genre','language']
 
     def get(self, request, *args, **kwargs):
         self.object = SingleObjectMixin.get_object(self)
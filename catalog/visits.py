@@ -0,0 +1,160 @@
+"""
+Home page visit counter, without a write per visit.
+
+Each visitor is recognised by a random identifier kept in a signed cookie,
+set on the first visit; nothing is stored for that visit, so clients that
+never send the cookie back (crawlers, most bots) cost no write at all. The
+later visits are added to an in-process buffer, and the buffer is written in
+one batch, a few statements whatever the number of visitors, once it holds
+VISIT_FLUSH_SIZE visitors or VISIT_FLUSH_INTERVAL seconds after the last
+batch, and when the process exits.
+
+The counts stored are read through the ``queries`` cache, so a returning
+visitor usually costs no query either. A process shows its own pending
+visits on top of the stored count; those of other processes appear once
+they are written.
+
+With settings.VISIT_COUNTER = 'session' the index view counts in the
+session instead, as it used to.
+"""
+import atexit
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .caching import NamedCache
+from .models import VisitCount
+
+
+logger = logging.getLogger(__name__)
+
+COOKIE_NAME = 'visitor'
+COOKIE_SALT = 'catalog.visits'
+COOKIE_MAX_AGE = 365 * 24 * 60 * 60
+
+cache = NamedCache('queries')
+
+CACHE_KEY_PREFIX = 'catalog:visits:'
+CACHE_TIMEOUT = 60 * 60
+
+
+def is_buffered():
+    return getattr(settings, 'VISIT_COUNTER', 'buffered') != 'session'
+
+
+class VisitBuffer:
+    """
+    Visits not written yet, {visitor: number of visits}, shared by the threads of the process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.last_flush = time.monotonic()
+
+    def add(self, visitor):
+        """
+        Buffers a visit, and writes the buffer if it is due.
+        """
+        with self.lock:
+            self.pending[visitor] = self.pending.get(visitor, 0) + 1
+            due = (len(self.pending) >= getattr(settings, 'VISIT_FLUSH_SIZE', 100)
+                   or time.monotonic() - self.last_flush >= getattr(settings, 'VISIT_FLUSH_INTERVAL', 60))
+        if due:
+            self.flush()
+
+    def get(self, visitor):
+        with self.lock:
+            return self.pending.get(visitor, 0)
+
+    def flush(self):
+        """
+        Writes the buffered visits and returns the number of visitors written.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.last_flush = time.monotonic()
+        if not pending:
+            return 0
+        try:
+            write(pending)
+        except Exception:
+            logger.exception('Could not write the visits of %s visitors.', len(pending))
+            # Kept for the next batch.
+            with self.lock:
+                for visitor, visits in pending.items():
+                    self.pending[visitor] = self.pending.get(visitor, 0) + visits
+            return 0
+        return len(pending)
+
+    def clear(self):
+        with self.lock:
+            self.pending.clear()
+            self.last_flush = time.monotonic()
+
+
+buffer = VisitBuffer()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        buffer.flush()
+    except Exception:
+        # The database may be gone already.
+        pass
+
+
+def write(pending):
+    """
+    Adds {visitor: number of visits} to the stored counts.
+    """
+    now = timezone.now()
+    by_visits = {}
+    for visitor, visits in pending.items():
+        by_visits.setdefault(visits, []).append(visitor)
+    with transaction.atomic():
+        # New visitors get their row, counting the first visit (count defaults to 1).
+        VisitCount.objects.bulk_create([VisitCount(visitor=visitor) for visitor in pending], ignore_conflicts=True)
+        # One UPDATE per distinct number of visits, most often just one.
+        for visits, visitors in by_visits.items():
+            VisitCount.objects.filter(visitor__in=visitors).update(count=F('count') + visits, updated_at=now)
+    cache.delete_many([CACHE_KEY_PREFIX + visitor for visitor in pending])
+
+
+def stored_count(visitor):
+    """
+    Returns the number of visits stored for the visitor, from the cache when possible.
+    """
+    key = CACHE_KEY_PREFIX + visitor
+    count = cache.get(key)
+    if count is None:
+        count = VisitCount.objects.filter(visitor=visitor).values_list('count', flat=True).first() or 0
+        cache.set(key, count, CACHE_TIMEOUT)
+    return count
+
+
+def record_visit(request):
+    """
+    Counts the request's visit and returns (number of earlier visits, new visitor id).
+    The new visitor id, None for a returning visitor, goes in the response
+    cookie (see set_visitor_cookie).
+    """
+    visitor = request.get_signed_cookie(COOKIE_NAME, default=None, salt=COOKIE_SALT)
+    if visitor is None:
+        return 0, uuid.uuid4().hex
+    # Without a stored row, the first visit is only known from the cookie.
+    num_visits = max(stored_count(visitor), 1) + buffer.get(visitor)
+    buffer.add(visitor)
+    return num_visits, None
+
+
+def set_visitor_cookie(response, visitor):
+    response.set_signed_cookie(COOKIE_NAME, visitor, salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE,
+                               httponly=True, samesite='Lax')
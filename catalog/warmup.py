@@ -0,0 +1,73 @@
+"""
+Template warm-up at worker boot.
+
+With the cached template loader (settings.TEMPLATE_CACHE), each template is
+read and compiled by the first request rendering it, then kept for the life
+of the process. warm_up_templates() compiles the catalog and registration
+templates ahead of time, so the first requests of a new worker do not pay
+for it; locallibrary.wsgi calls it when settings.TEMPLATE_WARMUP is set.
+Run by the master process of ``gunicorn --preload``, it is done once and
+the compiled templates are shared by the forked workers.
+"""
+import logging
+import os
+import time
+
+from django.apps import apps
+from django.template import TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+from django.template.loaders.cached import Loader as CachedLoader
+
+
+logger = logging.getLogger(__name__)
+
+
+def template_names():
+    """
+    Returns the names of the templates of the catalog app and of the
+    registration templates of the project.
+    """
+    # (template directory, subdirectory to compile)
+    sources = [(os.path.join(apps.get_app_config('catalog').path, 'templates'), '')]
+    for engine in engines.all():
+        if isinstance(engine, DjangoTemplates):
+            sources.extend((directory, 'registration') for directory in engine.engine.dirs)
+
+    names = set()
+    for base, subdirectory in sources:
+        for directory, _, files in os.walk(os.path.join(base, subdirectory)):
+            names.update(os.path.relpath(os.path.join(directory, name), base).replace(os.sep, '/')
+                         for name in files if name.endswith(('.html', '.txt')))
+    return sorted(names)
+
+
+def warm_up_templates():
+    """
+    Compiles the templates into the cache of every Django template engine
+    using the cached loader, and returns the number of templates compiled;
+    warns when there is no such engine.
+    """
+    names = template_names()
+    start = time.perf_counter()
+    count = 0
+    cached = False
+    for engine in engines.all():
+        if not isinstance(engine, DjangoTemplates):
+            continue
+        if not any(isinstance(loader, CachedLoader) for loader in engine.engine.template_loaders):
+            # Nothing would be kept.
+            continue
+        cached = True
+        for name in names:
+            try:
+                engine.engine.get_template(name)
+            except TemplateSyntaxError:
+                logger.exception('Could not compile template %s.', name)
+                continue
+            count += 1
+    if not cached:
+        logger.warning('Template warm-up skipped: no template engine uses the cached loader '
+                       '(set DJANGO_TEMPLATE_CACHE=true).')
+        return 0
+    logger.info('Compiled %s templates in %.1f ms.', count, (time.perf_counter() - start) * 1000)
+    return count
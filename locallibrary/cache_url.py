@@ -0,0 +1,94 @@
+"""
+CACHES from environment variables, one URL per cache, as dj_database_url
+does for DATABASES.
+
+    locmem://[name]                      local memory of the process
+    file:///var/tmp/django_cache         files in a directory
+    db://table_name                      a table (manage.py createcachetable)
+    memcached://host:port[,host:port]    memcached, with python-memcached
+    pylibmc://host:port[,host:port]      memcached, with pylibmc
+    redis://host:port/db                 redis, with django-redis
+    dummy://                             no caching
+
+Query parameters: ``timeout`` (seconds, or ``none``), ``key_prefix``,
+and ``max_entries``/``cull_frequency`` for the locmem, file and db caches.
+
+Every backend counts its hits and misses (see catalog.caching). The
+named caches use the default cache, under their own key prefix, unless
+their own variable is set.
+"""
+from urllib.parse import parse_qsl, unquote, urlparse
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+BACKENDS = {
+    'locmem': 'catalog.caching.LocMemCache',
+    'file': 'catalog.caching.FileBasedCache',
+    'db': 'catalog.caching.DatabaseCache',
+    'memcached': 'catalog.caching.MemcachedCache',
+    'pylibmc': 'catalog.caching.PyLibMCCache',
+    'redis': 'catalog.caching.RedisCache',
+    'dummy': 'catalog.caching.DummyCache',
+}
+
+# Cache alias -> environment variable holding its URL.
+NAMED_CACHES = (
+    ('default', 'CACHE_URL'),
+    ('sessions', 'SESSION_CACHE_URL'),
+    # The alias the {% cache %} template tag uses when it exists.
+    ('template_fragments', 'TEMPLATE_CACHE_URL'),
+    ('queries', 'QUERY_CACHE_URL'),
+)
+
+
+def parse(url, alias='default'):
+    """
+    Returns the CACHES entry described by the URL.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in BACKENDS:
+        raise ValueError('Unknown cache scheme "%s" in %s.' % (parsed.scheme, url))
+
+    config = {'BACKEND': BACKENDS[parsed.scheme], 'ALIAS': alias}
+    if parsed.scheme == 'file':
+        config['LOCATION'] = unquote(parsed.path)
+    elif parsed.scheme in ('memcached', 'pylibmc'):
+        config['LOCATION'] = parsed.netloc.split(',')
+    elif parsed.scheme == 'redis':
+        try:
+            import django_redis  # noqa: F401
+        except ImportError:
+            # Otherwise the first use of the cache fails, far from the setting.
+            raise ImproperlyConfigured('%s needs django-redis: pip install django-redis.' % url)
+        config['LOCATION'] = parsed._replace(query='').geturl()
+    elif parsed.scheme != 'dummy':
+        config['LOCATION'] = unquote(parsed.netloc)
+
+    for name, value in parse_qsl(parsed.query):
+        if name == 'timeout':
+            config['TIMEOUT'] = None if value.lower() == 'none' else int(value)
+        elif name == 'key_prefix':
+            config['KEY_PREFIX'] = value
+        elif name in ('max_entries', 'cull_frequency') and parsed.scheme in ('locmem', 'file', 'db'):
+            config.setdefault('OPTIONS', {})[name.upper()] = int(value)
+        else:
+            raise ValueError('Unknown cache option "%s" in %s.' % (name, url))
+    return config
+
+
+def caches(environ, default='locmem://'):
+    """
+    Returns CACHES for NAMED_CACHES, from the URLs in ``environ``.
+    """
+    default_url = environ.get('CACHE_URL', default)
+    result = {}
+    for alias, variable in NAMED_CACHES:
+        if environ.get(variable):
+            result[alias] = parse(environ[variable], alias)
+        else:
+            result[alias] = parse(default_url, alias)
+            if alias != 'default':
+                # Same storage as the default cache, keys apart.
+                result[alias]['KEY_PREFIX'] = (result[alias].get('KEY_PREFIX', '') + ':' + alias).lstrip(':')
+    return result
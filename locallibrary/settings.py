@@ -45,6 +45,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    # After WhiteNoise, so static files are not measured.
+    'catalog.instrumentation.InstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -55,11 +57,27 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'locallibrary.urls'
 
+# Templates are compiled once per process and kept by the cached loader, except
+# with DEBUG, as Django does: the development server does not reset the cached
+# loader, so edited templates are read again on every render instead.
+# DEBUG is on unless DJANGO_DEBUG is set to something else than "false", so by
+# default the cache is off; the Procfile turns it on for deployment with
+# DJANGO_TEMPLATE_CACHE=true (true or false overrides the default).
+# DJANGO_TEMPLATE_WARMUP=true compiles the catalog and registration templates
+# when the WSGI application loads (see catalog.warmup).
+TEMPLATE_CACHE = os.environ.get('DJANGO_TEMPLATE_CACHE', str(not DEBUG)).lower() == 'true'
+TEMPLATE_WARMUP = os.environ.get('DJANGO_TEMPLATE_WARMUP', 'false').lower() == 'true'
+
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': ['./templates', './catalog/templates',],
-        'APP_DIRS': True,
+        # DjangoTemplates, timing rendering for catalog.instrumentation.
+        'BACKEND': 'catalog.instrumentation.InstrumentedDjangoTemplates',
+        'DIRS': [os.path.join(BASE_DIR, 'templates'), os.path.join(BASE_DIR, 'catalog', 'templates')],
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -67,6 +85,8 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'loaders': [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)] if TEMPLATE_CACHE
+                       else TEMPLATE_LOADERS,
         },
     },
 ]
@@ -123,6 +143,44 @@ LOGIN_REDIRECT_URL = '/'
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Caches (see locallibrary.cache_url): the default cache from $CACHE_URL, e.g.
+# locmem://, file:///var/tmp/django_cache, memcached://127.0.0.1:11211 (python-memcached;
+# manage.py run_cache_server is a stand-in for development), redis://127.0.0.1:6379/1
+# (django-redis), and the sessions, template_fragments and queries caches from
+# $SESSION_CACHE_URL, $TEMPLATE_CACHE_URL and $QUERY_CACHE_URL, or the default cache.
+from . import cache_url
+CACHES = cache_url.caches(os.environ)
+
+# Sessions: 'cached_db' reads them from the cache and writes the database only
+# when a session changes; 'signed_cookies' keeps them in the browser, no storage.
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + os.environ.get('DJANGO_SESSION_BACKEND', 'cached_db')
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Home page visit counter (see catalog.visits): 'buffered', written in batches
+# of VISIT_FLUSH_SIZE visitors or every VISIT_FLUSH_INTERVAL seconds, or
+# 'session', one session write per visit.
+VISIT_COUNTER = os.environ.get('DJANGO_VISIT_COUNTER', 'buffered')
+VISIT_FLUSH_SIZE = int(os.environ.get('DJANGO_VISIT_FLUSH_SIZE', 100))
+VISIT_FLUSH_INTERVAL = int(os.environ.get('DJANGO_VISIT_FLUSH_INTERVAL', 60))
+
+# Per-request instrumentation (see catalog.instrumentation): Prometheus
+# metrics at /metrics, and the log level of the per-request JSON lines (INFO).
+METRICS_ENABLED = os.environ.get('DJANGO_METRICS', 'false').lower() == 'true'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'catalog': {
+            'handlers': ['console'],
+            'level': os.environ.get('CATALOG_LOG_LEVEL', 'WARNING'),
+        },
+    },
+}
+
 # Heroku: Update database configuration from $DATABASE_URL.
 import dj_database_url
 db_from_env = dj_database_url.config(conn_max_age=500)
@@ -20,9 +20,12 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.conf.urls import url
 
+from catalog.instrumentation import metrics_view
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 urlpatterns += [
@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/2.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locallibrary.settings')
 
 application = get_wsgi_application()
+
+if settings.TEMPLATE_WARMUP:
+    # Compile the templates now rather than in the first requests.
+    from catalog.warmup import warm_up_templates
+    warm_up_templates()